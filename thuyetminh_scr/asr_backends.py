@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Backend nhận dạng giọng nói cho pipeline thuyết minh
+- openai-whisper: PyTorch, fp32 trên CPU
+- faster-whisper: CTranslate2, mặc định lượng tử hóa int8 trên CPU
+Mọi backend trả về cùng định dạng segment của openai-whisper (id, seek, start, end, text, ...)
+nên các stage dịch/TTS/ghép video không phụ thuộc backend.
+Ngôn ngữ nguồn được nhận diện trên 30 giây đầu trước khi nhận dạng cả file.
+"""
+
+import contextlib
+import os
+import time
+
+from audio_stream import SAMPLE_RATE
+from model_registry import ASR_BACKEND, ASR_COMPUTE_TYPE, default_device, model_registry
+
+# Ngôn ngữ nguồn: "auto" nhận diện trên DETECT_SECONDS giây đầu, hoặc mã cố định ("en", "vi")
+ASR_LANGUAGE = os.environ.get("ASR_LANGUAGE", "auto")
+DETECT_SECONDS = 30
+# Nhận diện không chắc chắn (xác suất thấp hơn ngưỡng) thì dùng ngôn ngữ mặc định như trước
+MIN_LANGUAGE_PROBABILITY = float(os.environ.get("ASR_MIN_LANGUAGE_PROBABILITY", "0.5"))
+DEFAULT_LANGUAGE = "en"
+
+# Các trường segment của openai-whisper mà faster-whisper cũng có
+SEGMENT_FIELDS = ("seek", "start", "end", "text", "tokens", "temperature",
+                  "avg_logprob", "compression_ratio", "no_speech_prob")
+WORD_FIELDS = ("start", "end", "word", "probability")
+
+# Backend không dùng chung một instance model giữa các luồng được (hook kv-cache của openai-whisper)
+SERIALIZED_BACKENDS = {"openai-whisper"}
+
+
+def _run_openai_whisper(model, audio, language, **options):
+    return model.transcribe(audio, language=language, **options)["segments"]
+
+
+def _run_faster_whisper(model, audio, language, **options):
+    # faster-whisper trả về generator, nhận dạng chỉ chạy khi đọc hết segment
+    segments, _ = model.transcribe(audio, language=language, **options)
+    return [segment_to_dict(segment, index) for index, segment in enumerate(segments)]
+
+
+def segment_to_dict(segment, index):
+    """Đổi Segment của faster-whisper sang dict như openai-whisper (id bắt đầu từ 0)"""
+    item = {"id": index}
+    for field in SEGMENT_FIELDS:
+        if hasattr(segment, field):
+            value = getattr(segment, field)
+            item[field] = list(value) if field == "tokens" else value
+    words = getattr(segment, "words", None)
+    if words:
+        item["words"] = [{field: getattr(word, field) for field in WORD_FIELDS if hasattr(word, field)}
+                         for word in words]
+    return item
+
+
+def _detect_openai_whisper(model, audio):
+    import whisper
+    n_mels = getattr(model.dims, "n_mels", 80)
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    language = max(probs, key=probs.get)
+    return language, probs[language]
+
+
+def _detect_faster_whisper(model, audio):
+    # Ngôn ngữ được nhận diện ngay khi gọi, segment (generator) không được decode
+    _, info = model.transcribe(audio, language=None)
+    return info.language, info.language_probability
+
+
+RUNNERS = {
+    "openai-whisper": _run_openai_whisper,
+    "faster-whisper": _run_faster_whisper,
+}
+
+DETECTORS = {
+    "openai-whisper": _detect_openai_whisper,
+    "faster-whisper": _detect_faster_whisper,
+}
+
+
+def register_backend(backend, runner, loader=None, detector=None):
+    """Đăng ký backend mới: runner(model, audio, language, **options) -> list segment dict,
+    detector(model, audio) -> (mã ngôn ngữ, xác suất)"""
+    RUNNERS[backend] = runner
+    if loader is not None:
+        model_registry.register_loader(backend, loader)
+    if detector is not None:
+        DETECTORS[backend] = detector
+
+
+def model_lock(model, backend):
+    """Lock dùng model của registry, backend dùng song song được thì không khóa"""
+    if backend in SERIALIZED_BACKENDS:
+        return model_registry.lock_for(model)
+    return contextlib.nullcontext()
+
+
+def transcribe_with_model(model, backend, audio, language="en", **options):
+    """Nhận dạng bằng model đã load của backend, trả về list segment dict"""
+    if backend not in RUNNERS:
+        raise ValueError(f"Unknown ASR backend: {backend}")
+    with model_lock(model, backend):
+        return RUNNERS[backend](model, audio, language, **options)
+
+
+def get_model(model_size="base", backend=ASR_BACKEND, device=None, compute_type=ASR_COMPUTE_TYPE):
+    return model_registry.get(backend, model_size, device, compute_type)
+
+
+def transcribe(audio, model_size="base", backend=ASR_BACKEND, language="en", device=None,
+               compute_type=ASR_COMPUTE_TYPE, **options):
+    """Nhận dạng audio (mảng float32 16 kHz hoặc đường dẫn file)"""
+    model = get_model(model_size, backend, device, compute_type)
+    return transcribe_with_model(model, backend, audio, language, **options)
+
+
+def detect_language_with_model(model, backend, audio, seconds=DETECT_SECONDS):
+    """Nhận diện ngôn ngữ trên `seconds` giây đầu của mảng audio float32 16 kHz
+
+    Trả về dict language, probability, detect_seconds; nhận diện không chắc chắn thì
+    language là DEFAULT_LANGUAGE, detected là ngôn ngữ model đoán và fallback=True.
+    """
+    if backend not in DETECTORS:
+        raise ValueError(f"No language detection for ASR backend: {backend}")
+    start = time.perf_counter()
+    with model_lock(model, backend):
+        language, probability = DETECTORS[backend](model, audio[:int(seconds * SAMPLE_RATE)])
+    result = {
+        "language": language,
+        "probability": round(float(probability), 3),
+        "detect_seconds": round(time.perf_counter() - start, 3),
+    }
+    if probability < MIN_LANGUAGE_PROBABILITY:
+        result.update(language=DEFAULT_LANGUAGE, detected=language, fallback=True)
+    return result
+
+
+def detect_language(audio, model_size="base", backend=ASR_BACKEND, compute_type=ASR_COMPUTE_TYPE,
+                    language=ASR_LANGUAGE):
+    """Ngôn ngữ nguồn của audio: language khác "auto" thì dùng luôn, không nhận diện"""
+    if language and language != "auto":
+        return {"language": language, "forced": True}
+    model = get_model(model_size, backend, compute_type=compute_type)
+    return detect_language_with_model(model, backend, audio)
+
+
+def asr_model_id(model_size="base", backend=ASR_BACKEND, compute_type=ASR_COMPUTE_TYPE):
+    """Tên model dùng trong key cache: openai-whisper giữ nguyên tên size như trước"""
+    if backend == "openai-whisper":
+        return model_size
+    _, _, _, compute_type = model_registry.make_key(backend, model_size, default_device(), compute_type)
+    return f"{backend}-{model_size}-{compute_type}"
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Ghép các clip thuyết minh vào timeline bằng NumPy
+Mỗi clip chỉ decode một lần và cộng vào buffer cấp phát sẵn, encode kết quả một lần
+(hoặc đẩy thẳng PCM vào ffmpeg để ghép với video mà không qua file audio trung gian).
+Clip dài hơn khoảng trống tới clip kế tiếp được nén thời gian (WSOLA, giữ cao độ) trong
+giới hạn tốc độ đọc tối đa.
+"""
+
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MIX_SAMPLE_RATE = int(os.environ.get("MIX_SAMPLE_RATE", "24000"))
+DECODE_WORKERS = int(os.environ.get("MIX_DECODE_WORKERS", "4"))
+# Tốc độ đọc tối đa khi nén clip cho vừa khoảng trống (1: không nén, clip chồng lên clip sau)
+MAX_TEMPO = float(os.environ.get("NARRATOR_MAX_TEMPO", "1.5"))
+# Clip chỉ dài hơn khoảng trống chưa tới mức này thì không cần nén
+FIT_TOLERANCE_SECONDS = 0.05
+
+
+def decode_clip(path, sample_rate=MIX_SAMPLE_RATE):
+    """Decode file audio thành mảng float32 mono trong [-1, 1]"""
+    command = [
+        "ffmpeg", "-v", "error",
+        "-i", path,
+        "-f", "s16le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "pipe:1"
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def time_stretch(audio, rate, sample_rate=MIX_SAMPLE_RATE, frame_ms=30, tolerance_ms=5):
+    """Đổi tốc độ đọc `rate` lần (rate > 1: nhanh hơn, ngắn hơn) mà không đổi cao độ (WSOLA)
+
+    Mỗi frame đầu ra lấy frame đầu vào quanh vị trí lý tưởng, lệch trong ±tolerance_ms để
+    khớp dạng sóng với phần nối tiếp tự nhiên của frame trước, rồi overlap-add với cửa sổ Hann.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    if abs(rate - 1.0) < 1e-3 or len(audio) < 2 * frame:
+        return audio.astype(np.float32, copy=True)
+    hop = frame // 2
+    tolerance = int(sample_rate * tolerance_ms / 1000)
+    # Hann tuần hoàn: các cửa sổ chồng 50% cộng lại bằng 1
+    window = np.hanning(frame + 1)[:frame].astype(np.float32)
+
+    out_length = int(len(audio) / rate)
+    n_frames = out_length // hop + 1
+    padded = np.concatenate([np.zeros(tolerance, dtype=np.float32), audio.astype(np.float32),
+                             np.zeros(2 * frame + tolerance + int(hop * rate), dtype=np.float32)])
+    output = np.zeros(n_frames * hop + frame, dtype=np.float32)
+
+    previous = tolerance
+    for k in range(n_frames):
+        ideal = int(k * hop * rate) + tolerance
+        if k == 0:
+            position = ideal
+        else:
+            natural = padded[previous + hop:previous + hop + frame]
+            region = padded[ideal - tolerance:ideal + tolerance + frame]
+            position = ideal - tolerance + int(np.argmax(np.correlate(region, natural, mode="valid")))
+        output[k * hop:k * hop + frame] += padded[position:position + frame] * window
+        previous = position
+    return output[:out_length]
+
+
+def slot_durations(metadata, total_duration):
+    """Khoảng trống (giây) của từng clip: từ start tới start của clip kế tiếp
+
+    Clip cuối được tới hết total_duration (hoặc end của nó nếu muộn hơn).
+    """
+    order = sorted(range(len(metadata)), key=lambda i: metadata[i]["start"])
+    slots = [0.0] * len(metadata)
+    for position, i in enumerate(order):
+        start = metadata[i]["start"]
+        if position + 1 < len(order):
+            slot_end = metadata[order[position + 1]]["start"]
+        else:
+            slot_end = max(total_duration, metadata[i].get("end", start))
+        slots[i] = slot_end - start
+    return slots
+
+
+def fit_clip(clip, slot, sample_rate=MIX_SAMPLE_RATE, max_tempo=MAX_TEMPO):
+    """Nén clip cho vừa khoảng trống slot (giây), không nhanh hơn max_tempo lần
+
+    Trả về (clip, thông tin: duration, slot, tempo, overflow trước/sau khi nén).
+    """
+    duration = len(clip) / sample_rate
+    overflow = duration - slot
+    tempo = 1.0
+    if overflow > FIT_TOLERANCE_SECONDS and slot > 0:
+        tempo = min(duration / slot, max_tempo)
+        clip = time_stretch(clip, tempo, sample_rate)
+    return clip, {
+        "duration": duration,
+        "slot": slot,
+        "tempo": tempo,
+        "overflow_before": max(0.0, overflow),
+        "overflow_after": max(0.0, len(clip) / sample_rate - slot),
+    }
+
+
+def fit_stats(results):
+    """Thống kê tràn khoảng trống của các clip trước/sau khi nén"""
+    def overflowing(key):
+        return [r[key] for r in results if r[key] > FIT_TOLERANCE_SECONDS]
+
+    before, after = overflowing("overflow_before"), overflowing("overflow_after")
+    return {
+        "clips": len(results),
+        "overflowing_before": len(before),
+        "overflowing_after": len(after),
+        "stretched": sum(1 for r in results if r["tempo"] > 1.0),
+        "max_tempo": round(max((r["tempo"] for r in results), default=1.0), 3),
+        "overflow_seconds_before": round(sum(before), 3),
+        "overflow_seconds_after": round(sum(after), 3),
+    }
+
+
+def build_timeline(metadata, total_duration, sample_rate=MIX_SAMPLE_RATE, max_workers=DECODE_WORKERS,
+                   max_tempo=1.0):
+    """Cộng các clip vào buffer float32 tại vị trí `start` của từng clip
+
+    Trả về (buffer, stats). Phần clip vượt quá total_duration bị cắt như khi overlay bằng pydub.
+    stats gồm overlap_seconds: tổng thời gian clip còn đọc khi clip sau đã bắt đầu.
+    max_tempo > 1: clip dài hơn khoảng trống được nén (fit_clip), timeline kéo dài tới hết
+    clip cuối thay vì cắt đuôi, stats["fit"] là thống kê tràn khoảng trống (fit_stats).
+    """
+    total_samples = int(total_duration * sample_rate)
+    timeline = np.zeros(total_samples, dtype=np.float32)
+    spans = []
+    fitting = max_tempo > 1.0
+    slots = slot_durations(metadata, total_duration) if fitting else None
+    fit_results = []
+
+    def load(index):
+        clip = decode_clip(metadata[index]["file"], sample_rate)
+        if fitting:
+            clip, result = fit_clip(clip, slots[index], sample_rate, max_tempo)
+            fit_results.append(result)
+        return clip
+
+    # Decode (và nén) song song (mỗi clip một tiến trình ffmpeg), cộng tuần tự vào buffer
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        clips = executor.map(load, range(len(metadata)))
+        for item, clip in zip(metadata, clips):
+            offset = int(item["start"] * sample_rate)
+            spans.append((offset, offset + len(clip)))
+            if fitting and offset + len(clip) > len(timeline):
+                timeline = np.concatenate(
+                    [timeline, np.zeros(offset + len(clip) - len(timeline), dtype=np.float32)])
+            if offset >= len(timeline):
+                continue
+            end = min(offset + len(clip), len(timeline))
+            timeline[offset:end] += clip[:end - offset]
+
+    # Chống vỡ tiếng ở đoạn các clip chồng lên nhau
+    clipped = int(np.count_nonzero(np.abs(timeline) > 1.0))
+    np.clip(timeline, -1.0, 1.0, out=timeline)
+
+    spans.sort()
+    overlaps = [end - next_start for (_, end), (next_start, _) in zip(spans, spans[1:]) if end > next_start]
+
+    stats = {"clips": len(metadata), "samples": len(timeline), "clipped_samples": clipped,
+             "overlapping_clips": len(overlaps),
+             "overlap_seconds": round(sum(overlaps) / sample_rate, 3)}
+    if fitting:
+        stats["fit"] = fit_stats(fit_results)
+    return timeline, stats
+
+
+def to_pcm16(timeline):
+    """Chuyển buffer float32 thành bytes PCM s16le"""
+    return (timeline * 32767.0).astype("<i2").tobytes()
+
+
+def _pcm_input_args(sample_rate):
+    return ["-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0"]
+
+
+def probe_duration(path):
+    """Thời lượng (giây) của file media theo ffprobe, None nếu không đọc được"""
+    try:
+        result = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                                 "-of", "default=noprint_wrappers=1:nokey=1", path],
+                                capture_output=True, text=True, check=True)
+        return float(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def _run_ffmpeg_with_pcm(command, timeline, chunk_seconds=10, sample_rate=MIX_SAMPLE_RATE, total_samples=0):
+    """Chạy ffmpeg và đẩy buffer vào stdin theo từng đoạn (không tạo bản copy PCM toàn bộ)
+
+    total_samples dài hơn buffer thì đẩy thêm im lặng cho đủ.
+    """
+    chunk = chunk_seconds * sample_rate
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            for start in range(0, len(timeline), chunk):
+                process.stdin.write(to_pcm16(timeline[start:start + chunk]))
+            for start in range(len(timeline), total_samples, chunk):
+                process.stdin.write(bytes(2 * min(chunk, total_samples - start)))
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+        returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(returncode, command,
+                                                stderr=stderr.read().decode("utf-8", "replace"))
+
+
+def encode_timeline(timeline, output_path, sample_rate=MIX_SAMPLE_RATE):
+    """Encode buffer ra file (định dạng theo đuôi file) bằng một lần gọi ffmpeg"""
+    command = ["ffmpeg", "-y", "-v", "error"] + _pcm_input_args(sample_rate) + [output_path]
+    _run_ffmpeg_with_pcm(command, timeline, sample_rate=sample_rate)
+    return output_path
+
+
+def mux_timeline_with_video(timeline, video_path, output_path, sample_rate=MIX_SAMPLE_RATE,
+                            audio_bitrate=None):
+    """Ghép buffer thuyết minh vào video trong một tiến trình ffmpeg
+
+    PCM đi thẳng qua stdin và được encode AAC một lần, video giữ nguyên (-c:v copy),
+    không tạo file audio trung gian.
+    """
+    # Mặc định để ffmpeg tự chọn bitrate AAC như cách hai bước cũ
+    bitrate_args = ["-b:a", audio_bitrate] if audio_bitrate else []
+    command = (["ffmpeg", "-y", "-v", "error", "-i", video_path]
+               + _pcm_input_args(sample_rate)
+               + ["-map", "0:v:0", "-map", "1:a:0",
+                  "-c:v", "copy",
+                  "-c:a", "aac"] + bitrate_args
+               + ["-shortest", output_path])
+    # Thuyết minh kết thúc sớm hơn video: đẩy thêm im lặng tới hết video để -shortest không
+    # cắt mất đuôi video (apad vô hạn cùng -c:v copy làm ffmpeg không dừng)
+    duration = probe_duration(video_path)
+    total_samples = int(duration * sample_rate) if duration else 0
+    _run_ffmpeg_with_pcm(command, timeline, sample_rate=sample_rate, total_samples=total_samples)
+    return output_path
+
+
+def mux_audio_file_with_video(video_path, audio_path, output_path):
+    """Ghép file audio có sẵn vào video (cách hai bước cũ)"""
+    # Audio ngắn hơn video: đệm im lặng tới hết video để -shortest không cắt mất đuôi video
+    duration = probe_duration(video_path)
+    pad_args = ["-af", f"apad=whole_dur={duration}"] if duration else []
+    command = [
+        "ffmpeg", "-y",
+        "-i", video_path,
+        "-i", audio_path,
+        "-c:v", "copy",
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+    ] + pad_args + [
+        "-shortest",
+        output_path
+    ]
+    subprocess.run(command, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    return output_path
+
+
+def mix_timeline(metadata, total_duration, output_path, sample_rate=MIX_SAMPLE_RATE, max_tempo=1.0,
+                 stats=None):
+    """Ghép các clip theo timeline rồi encode ra output_path (stats nhận thống kê của timeline)"""
+    timeline, timeline_stats = build_timeline(metadata, total_duration, sample_rate, max_tempo=max_tempo)
+    if timeline_stats["clipped_samples"]:
+        print(f"Clipped {timeline_stats['clipped_samples']} samples where voice segments overlap")
+    if stats is not None:
+        stats.update(timeline_stats)
+    return encode_timeline(timeline, output_path, sample_rate)
+
+
+def mix_timeline_pydub(metadata, total_duration, output_path):
+    """Cách ghép cũ bằng pydub overlay (mỗi clip copy lại toàn bộ timeline)"""
+    from pydub import AudioSegment
+
+    timeline = AudioSegment.silent(duration=int(total_duration * 1000))
+
+    for item in metadata:
+        voice = AudioSegment.from_file(item["file"])
+        start = int(item["start"] * 1000)
+        timeline = timeline.overlay(voice, position=start)
+
+    timeline.export(output_path, format="mp3")
+    return output_path
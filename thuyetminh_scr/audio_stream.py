@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Đọc audio dạng luồng: ffmpeg decode ra PCM 16 kHz theo từng đoạn
+và cắt thành các cửa sổ cho Whisper tại điểm yên lặng nhất
+"""
+
+import subprocess
+
+import numpy as np
+
+# Whisper làm việc với audio mono 16 kHz
+SAMPLE_RATE = 16000
+
+
+def _ffmpeg_decode_command(source, sample_rate=SAMPLE_RATE, http_headers=None, start_seconds=0):
+    command = ["ffmpeg", "-v", "error", "-nostdin"]
+    if http_headers:
+        header_lines = "".join(f"{key}: {value}\r\n" for key, value in http_headers.items())
+        command += ["-headers", header_lines]
+    if start_seconds:
+        command += ["-ss", f"{start_seconds:.3f}"]
+    command += [
+        "-i", source,
+        "-vn",
+        "-f", "s16le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "pipe:1"
+    ]
+    return command
+
+
+def iter_audio_chunks(source, chunk_seconds=5.0, sample_rate=SAMPLE_RATE, http_headers=None,
+                      start_seconds=0):
+    """Sinh các đoạn audio float32 dài chunk_seconds khi ffmpeg decode tới đâu
+
+    source có thể là đường dẫn file hoặc URL (ffmpeg đọc trực tiếp qua HTTP).
+    Ném CalledProcessError nếu ffmpeg lỗi.
+    """
+    command = _ffmpeg_decode_command(source, sample_rate, http_headers, start_seconds)
+    chunk_bytes = int(chunk_seconds * sample_rate) * 2
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    try:
+        pending = b""
+        while True:
+            data = process.stdout.read(chunk_bytes - len(pending))
+            if not data:
+                break
+            pending += data
+            if len(pending) >= chunk_bytes:
+                yield np.frombuffer(pending, dtype="<i2").astype(np.float32) / 32768.0
+                pending = b""
+        if len(pending) >= 2:
+            pending = pending[:len(pending) - len(pending) % 2]
+            yield np.frombuffer(pending, dtype="<i2").astype(np.float32) / 32768.0
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command,
+                                            stderr=stderr.decode("utf-8", "replace"))
+
+
+def load_audio(source, sample_rate=SAMPLE_RATE, http_headers=None, start_seconds=0):
+    """Decode toàn bộ audio thành mảng float32 mono trong bộ nhớ (không ghi file WAV)
+
+    ffmpeg ghi PCM 16-bit ra stdout, mảng trả về đưa thẳng vào model.transcribe.
+    Audio rất dài nên đọc từng đoạn bằng iter_audio_chunks. Ném CalledProcessError nếu ffmpeg lỗi.
+    """
+    command = _ffmpeg_decode_command(source, sample_rate, http_headers, start_seconds)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, command,
+                                            stderr=result.stderr.decode("utf-8", "replace"))
+    pcm = result.stdout[:len(result.stdout) - len(result.stdout) % 2]
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def frame_energy(audio, sample_rate=SAMPLE_RATE, frame_ms=20):
+    """Năng lượng RMS của từng frame frame_ms"""
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def find_quiet_cut(audio, target_seconds, search_seconds, sample_rate=SAMPLE_RATE, frame_ms=20):
+    """Tìm vị trí (sample) yên lặng nhất trong [target - search, target]"""
+    frame = int(sample_rate * frame_ms / 1000)
+    start = max(0, int((target_seconds - search_seconds) * sample_rate))
+    end = min(len(audio), int(target_seconds * sample_rate))
+    energy = frame_energy(audio[start:end], sample_rate, frame_ms)
+    if len(energy) == 0:
+        return end
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+def iter_speech_windows(chunks, window_seconds=30.0, search_seconds=5.0, sample_rate=SAMPLE_RATE,
+                        start_seconds=0):
+    """Gom các đoạn audio thành cửa sổ <= window_seconds, cắt tại điểm yên lặng
+
+    Sinh (offset giây của cửa sổ trong toàn bộ audio, mảng audio của cửa sổ).
+    """
+    window_samples = int(window_seconds * sample_rate)
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = int(start_seconds * sample_rate)
+
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, chunk])
+        while len(buffer) >= window_samples:
+            cut = find_quiet_cut(buffer, window_seconds, search_seconds, sample_rate)
+            cut = max(cut, sample_rate)
+            yield offset / sample_rate, buffer[:cut]
+            buffer = buffer[cut:]
+            offset += cut
+
+    if len(buffer):
+        yield offset / sample_rate, buffer
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Nhận dạng nhiều file trong một batch khi hàng đợi có nhiều job đang chờ
+Audio của mọi file được cắt thành các cửa sổ <= 30 giây tại khoảng lặng, cửa sổ của các file
+khác nhau được pad và ghép thành batch mel đi qua encoder/decoder của một model duy nhất,
+segment được trả về theo từng file với timestamp trong file đó.
+"""
+
+import os
+
+from asr_backends import ASR_BACKEND, get_model, model_lock, transcribe_with_model
+from audio_stream import SAMPLE_RATE
+from parallel_transcribe import split_on_silence
+
+# Số cửa sổ 30 giây decode cùng lúc
+BATCH_SIZE = int(os.environ.get("TRANSCRIBE_BATCH_SIZE", "8"))
+# Độ dài cửa sổ của Whisper
+WINDOW_SECONDS = 30.0
+# Mỗi timestamp token cách nhau 20 ms
+TIME_PRECISION = 0.02
+# Ngưỡng bỏ cửa sổ không có tiếng nói giống openai-whisper
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+# Ngưỡng decode lại với temperature cao hơn giống openai-whisper (lặp từ, logprob thấp)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+
+def plan_windows(audios, window_seconds=WINDOW_SECONDS, sample_rate=SAMPLE_RATE):
+    """Danh sách (chỉ số file, sample bắt đầu, sample kết thúc) của mọi cửa sổ có tiếng nói"""
+    windows = []
+    for index, audio in enumerate(audios):
+        for start, end in split_on_silence(audio, sample_rate, window_seconds):
+            windows.append((index, start, end))
+    return windows
+
+
+def tokens_to_segments(tokens, timestamp_begin, eot, decode, offset=0.0, duration=WINDOW_SECONDS):
+    """Tách token của một cửa sổ thành segment theo cặp timestamp token
+
+    Whisper sinh dạng <|0.00|> câu 1 <|2.50|><|2.50|> câu 2 <|5.00|>; câu cuối chưa có
+    timestamp kết thúc thì kết thúc ở cuối cửa sổ. Timestamp cộng thêm offset (giây).
+    """
+    segments = []
+    start = 0.0
+    text_tokens = []
+
+    def close(end):
+        text = decode(text_tokens)
+        if text.strip():
+            segments.append({
+                "start": round(offset + start, 3),
+                "end": round(offset + max(start, min(end, duration)), 3),
+                "text": text,
+                "tokens": list(text_tokens),
+            })
+
+    for token in tokens:
+        if token >= timestamp_begin:
+            time = (token - timestamp_begin) * TIME_PRECISION
+            if text_tokens:
+                close(time)
+                text_tokens = []
+            start = time
+        elif token < eot:
+            text_tokens.append(token)
+    if text_tokens:
+        close(duration)
+    return segments
+
+
+def needs_fallback(segments):
+    """Cửa sổ decode một lần (temperature 0) không đạt ngưỡng chất lượng của transcribe()"""
+    return any(seg.get("compression_ratio", 0.0) > COMPRESSION_RATIO_THRESHOLD
+               or seg.get("avg_logprob", 0.0) < LOGPROB_THRESHOLD for seg in segments)
+
+
+def _decode_openai_whisper(model, windows, language):
+    """Decode một batch cửa sổ audio, trả về list segment của từng cửa sổ"""
+    import torch
+    import whisper
+    from whisper.audio import log_mel_spectrogram, pad_or_trim
+    from whisper.tokenizer import get_tokenizer
+
+    n_mels = getattr(model.dims, "n_mels", 80)
+    mels = torch.stack([
+        log_mel_spectrogram(pad_or_trim(torch.from_numpy(audio)), n_mels) for audio in windows
+    ]).to(model.device)
+    options = whisper.DecodingOptions(language=language, task="transcribe",
+                                      fp16=model.device.type == "cuda")
+    results = whisper.decode(model, mels, options)
+
+    kwargs = {"num_languages": model.num_languages} if hasattr(model, "num_languages") else {}
+    tokenizer = get_tokenizer(model.is_multilingual, language=language, task="transcribe", **kwargs)
+    window_segments = []
+    for audio, result in zip(windows, results):
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            window_segments.append([])
+            continue
+        segments = tokens_to_segments(result.tokens, tokenizer.timestamp_begin, tokenizer.eot,
+                                      tokenizer.decode, duration=len(audio) / SAMPLE_RATE)
+        for seg in segments:
+            seg.update(temperature=result.temperature, avg_logprob=result.avg_logprob,
+                       compression_ratio=result.compression_ratio, no_speech_prob=result.no_speech_prob)
+        window_segments.append(segments)
+    return window_segments
+
+
+def iter_transcribe_files(audios, model_size="base", backend=ASR_BACKEND, batch_size=BATCH_SIZE,
+                          language="en", decode_batch=None):
+    """Nhận dạng nhiều mảng audio float32 16 kHz, yield (chỉ số file, segment) khi file xong
+
+    decode_batch(model, windows, language) thay cho decoder của openai-whisper. Backend khác
+    không có API decode theo batch nên các file được nhận dạng lần lượt với cùng một model.
+    Cửa sổ không đạt ngưỡng (needs_fallback) được nhận dạng lại riêng bằng transcribe của
+    backend (temperature fallback), nên segment lưu cache có cùng chất lượng như transcribe().
+    """
+    model = get_model(model_size, backend)
+    if decode_batch is None:
+        if backend != "openai-whisper":
+            for index, audio in enumerate(audios):
+                yield index, transcribe_with_model(model, backend, audio, language)
+            return
+        decode_batch = _decode_openai_whisper
+
+    windows = plan_windows(audios)
+    remaining = [0] * len(audios)
+    for index, _, _ in windows:
+        remaining[index] += 1
+    results = [[] for _ in audios]
+    # File không có cửa sổ nào (im lặng) xong ngay
+    for index, count in enumerate(remaining):
+        if count == 0:
+            yield index, []
+
+    for batch_start in range(0, len(windows), batch_size):
+        batch = windows[batch_start:batch_start + batch_size]
+        with model_lock(model, backend):
+            decoded = decode_batch(model, [audios[i][a:b] for i, a, b in batch], language)
+        for (index, start, end), segments in zip(batch, decoded):
+            if needs_fallback(segments):
+                segments = transcribe_with_model(model, backend, audios[index][start:end], language)
+            offset = start / SAMPLE_RATE
+            for seg in segments:
+                seg = dict(seg, start=round(seg["start"] + offset, 3), end=round(seg["end"] + offset, 3))
+                seg["id"] = len(results[index])
+                seg["seek"] = int(round(offset * 100))
+                results[index].append(seg)
+            remaining[index] -= 1
+            if remaining[index] == 0:
+                yield index, results[index]
+
+
+def transcribe_batch(audios, model_size="base", backend=ASR_BACKEND, batch_size=BATCH_SIZE, language="en"):
+    """Như iter_transcribe_files nhưng trả về list segment theo thứ tự file"""
+    results = [None] * len(audios)
+    for index, segments in iter_transcribe_files(audios, model_size, backend, batch_size, language):
+        results[index] = segments
+    return results
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark các backend nhận dạng giọng nói trên CPU: tốc độ (thời gian, hệ số realtime)
+và độ chính xác (WER so với transcript tham chiếu). Cần ffmpeg và backend tương ứng.
+Không có --reference thì lấy kết quả của backend đầu tiên làm tham chiếu.
+Ví dụ: python benchmark_asr.py --input lecture.mp4 --model base \\
+           --backends openai-whisper,faster-whisper:int8,faster-whisper:float32
+"""
+
+import argparse
+import re
+import time
+
+from asr_backends import get_model, transcribe_with_model
+from audio_stream import SAMPLE_RATE, load_audio
+
+
+def normalize_words(text):
+    """Chữ thường, bỏ dấu câu để so sánh theo từ"""
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """WER = (thay thế + xóa + chèn) / số từ tham chiếu, tính bằng khoảng cách Levenshtein"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def parse_backend(spec):
+    """"faster-whisper:int8" -> ("faster-whisper", "int8")"""
+    backend, _, compute_type = spec.partition(":")
+    return backend, compute_type or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend nhận dạng giọng nói")
+    parser.add_argument("--input", required=True, help="File audio/video để nhận dạng")
+    parser.add_argument("--reference", help="File transcript tham chiếu (text)")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--backends", default="openai-whisper,faster-whisper:int8",
+                        help="Danh sách backend[:compute_type], cách nhau bởi dấu phẩy")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    audio = load_audio(args.input)
+    duration = len(audio) / SAMPLE_RATE
+    reference = None
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = f.read()
+    print(f"{duration:.0f}s audio, model {args.model}")
+
+    for spec in args.backends.split(","):
+        backend, compute_type = parse_backend(spec)
+        start = time.perf_counter()
+        model = get_model(args.model, backend, device="cpu", compute_type=compute_type)
+        load_time = time.perf_counter() - start
+
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            segments = transcribe_with_model(model, backend, audio, language="en")
+            times.append(time.perf_counter() - start)
+        best = min(times)
+
+        text = " ".join(seg["text"] for seg in segments)
+        if reference is None:
+            reference = text
+        wer = word_error_rate(reference, text)
+        print(f"{spec:24s}: load {load_time:.1f}s, best {best:.1f}s, "
+              f"{duration / best:.2f}x realtime, {len(segments)} segments, WER {wer:.1%}")
+
+
+if __name__ == "__main__":
+    main()
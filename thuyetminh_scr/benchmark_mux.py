@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark bước ghép thuyết minh vào video: hai bước (combined_voice.mp3 rồi ffmpeg mux)
+so với một bước (PCM đi thẳng vào ffmpeg). Cần ffmpeg.
+Ví dụ: python benchmark_mux.py --segments 150 --duration 600
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from audio_mixer import build_timeline, mix_timeline, mux_audio_file_with_video, mux_timeline_with_video
+from benchmark_timeline import make_fake_segments
+
+
+def make_fake_video(path, duration):
+    """Tạo video test (không có audio) dài `duration` giây"""
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc=size=640x360:rate=25:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        path
+    ]
+    subprocess.run(command, check=True)
+    return path
+
+
+def two_pass(metadata, duration, video_path, work_dir):
+    voice_path = mix_timeline(metadata, duration, os.path.join(work_dir, "combined_voice.mp3"))
+    output_path = mux_audio_file_with_video(video_path, voice_path,
+                                            os.path.join(work_dir, "two_pass.mp4"))
+    # File trung gian được ghi một lần và đọc lại một lần
+    return output_path, 2 * os.path.getsize(voice_path)
+
+
+def single_pass(metadata, duration, video_path, work_dir):
+    timeline, _ = build_timeline(metadata, duration)
+    output_path = mux_timeline_with_video(timeline, video_path,
+                                          os.path.join(work_dir, "single_pass.mp4"))
+    return output_path, 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ghép thuyết minh vào video")
+    parser.add_argument("--segments", type=int, default=150)
+    parser.add_argument("--duration", type=float, default=600.0, help="Độ dài video (giây)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"Generating {args.duration:.0f}s test video and {args.segments} clips...")
+        video_path = make_fake_video(os.path.join(work_dir, "video.mp4"), args.duration)
+        metadata = make_fake_segments(work_dir, args.segments, args.duration)
+
+        for name, func in [("two-pass", two_pass), ("single-pass", single_pass)]:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                output_path, intermediate_io = func(metadata, args.duration, video_path, work_dir)
+                times.append(time.perf_counter() - start)
+            print(f"{name:12s}: best {min(times):.2f}s, "
+                  f"intermediate disk I/O {intermediate_io / 1024:.0f} KB, "
+                  f"output {os.path.getsize(output_path) / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark ghép timeline: NumPy (audio_mixer) so với pydub overlay
+Cần ffmpeg và pydub. Ví dụ: python benchmark_timeline.py --segments 150 --duration 600
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from audio_mixer import MIX_SAMPLE_RATE, build_timeline, encode_timeline, mix_timeline, mix_timeline_pydub
+
+
+def make_fake_segments(work_dir, segments, duration, sample_rate=MIX_SAMPLE_RATE, seed=0):
+    """Tạo các clip MP3 tone ngẫu nhiên 1-4 giây rải đều trên timeline"""
+    rng = np.random.default_rng(seed)
+    metadata = []
+    slot = duration / segments
+    for i in range(segments):
+        length = rng.uniform(1.0, 4.0)
+        t = np.arange(int(length * sample_rate)) / sample_rate
+        tone = 0.3 * np.sin(2 * np.pi * rng.uniform(150, 400) * t).astype(np.float32)
+        path = os.path.join(work_dir, f"voice_{i}.mp3")
+        encode_timeline(tone, path, sample_rate)
+        metadata.append({"file": path, "start": i * slot, "end": i * slot + length})
+    return metadata
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ghép timeline audio")
+    parser.add_argument("--segments", type=int, default=150)
+    parser.add_argument("--duration", type=float, default=600.0, help="Độ dài timeline (giây)")
+    parser.add_argument("--skip-pydub", action="store_true", help="Bỏ qua đường pydub (rất chậm với video dài)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"Generating {args.segments} clips over {args.duration:.0f}s...")
+        metadata = make_fake_segments(work_dir, args.segments, args.duration)
+
+        build_time = timed(build_timeline, metadata, args.duration)
+        numpy_time = timed(mix_timeline, metadata, args.duration,
+                           os.path.join(work_dir, "numpy.mp3"))
+        print(f"numpy : {numpy_time:.2f}s total ({build_time:.2f}s decode + mix, rest is encode)")
+
+        if not args.skip_pydub:
+            pydub_time = timed(mix_timeline_pydub, metadata, args.duration,
+                               os.path.join(work_dir, "pydub.mp3"))
+            print(f"pydub : {pydub_time:.2f}s total")
+            print(f"speedup: {pydub_time / numpy_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
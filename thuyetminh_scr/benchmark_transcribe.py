@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark nhận dạng giọng nói trên CPU: một lần model.transcribe cho cả file so với
+cắt theo khoảng lặng và chạy song song trên N tiến trình. Cần ffmpeg và openai-whisper.
+Ví dụ: python benchmark_transcribe.py --input lecture.mp4 --model base --workers 1,2,4
+"""
+
+import argparse
+import os
+import time
+
+from audio_stream import SAMPLE_RATE, load_audio
+from parallel_transcribe import ParallelTranscriber, split_on_silence
+
+
+def single_call(audio, model_size):
+    from model_registry import model_registry
+    model = model_registry.get("openai-whisper", model_size, device="cpu")
+    return model.transcribe(audio, language="en")["segments"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark nhận dạng song song theo khoảng lặng")
+    parser.add_argument("--input", required=True, help="File audio/video để nhận dạng")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--workers", default="1,2,4", help="Danh sách số tiến trình, cách nhau bởi dấu phẩy")
+    parser.add_argument("--chunk-seconds", type=float, default=120.0)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    audio = load_audio(args.input)
+    duration = len(audio) / SAMPLE_RATE
+    chunks = split_on_silence(audio, SAMPLE_RATE, args.chunk_seconds)
+    speech = sum(b - a for a, b in chunks) / SAMPLE_RATE
+    print(f"{duration:.0f}s audio, {os.cpu_count()} CPUs, {len(chunks)} chunks "
+          f"with {speech:.0f}s speech")
+
+    # Load model trước để chỉ đo thời gian nhận dạng
+    single_call(audio[:SAMPLE_RATE], args.model)
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        segments = single_call(audio, args.model)
+        times.append(time.perf_counter() - start)
+    baseline = min(times)
+    print(f"{'single-call':14s}: best {baseline:.1f}s, {duration / baseline:.2f}x realtime, "
+          f"{len(segments)} segments")
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        transcriber = ParallelTranscriber(args.model, workers, chunk_seconds=args.chunk_seconds)
+        try:
+            # Khởi động pool và load model ở mọi tiến trình
+            transcriber.transcribe(audio[:SAMPLE_RATE * 2])
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                segments = transcriber.transcribe(audio)
+                times.append(time.perf_counter() - start)
+        finally:
+            transcriber.shutdown()
+        best = min(times)
+        print(f"{f'{workers} workers':14s}: best {best:.1f}s, {duration / best:.2f}x realtime, "
+              f"speedup {baseline / best:.2f}x, {len(segments)} segments")
+
+
+if __name__ == "__main__":
+    main()
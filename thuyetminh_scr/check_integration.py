@@ -140,23 +140,25 @@ def check_clear_status():
     print("\nChecking data clearing status:")
     print("=" * 60)
 
+    from video_manager import (ARTIFACT_DIRS, ARTIFACT_MAX_AGE_DAYS,
+                               ARTIFACT_MAX_MB, CLEAR_ON_START)
+
     print("IMPORTANT NOTES:")
-    print("  * Each time you run Streamlit app, all old data will be deleted")
-    print("  * All videos, audio, voice_segments will be removed")
-    print("  * Start with empty directory")
-    print("  * Ensure no data conflicts")
+    if CLEAR_ON_START:
+        print("  * VIDEO_MANAGER_CLEAR_ON_START=1: all old data will be deleted on startup")
+    else:
+        print("  * Processed videos are kept between runs")
+        print("  * Missing files and orphan files are reconciled on startup")
+    print(f"  * Scratch files older than {ARTIFACT_MAX_AGE_DAYS} days "
+          f"or above {ARTIFACT_MAX_MB} MB in total are removed")
 
     # Kiểm tra thư mục hiện tại
-    print("\nDirectories that will be deleted on startup:")
-    clear_dirs = ["video_data", "videos",
-                  "video_transform", "audio", "voice_segments"]
-
-    for dir_name in clear_dirs:
+    print("\nScratch directories:")
+    for dir_name in ARTIFACT_DIRS:
         dir_path = Path(dir_name)
         if dir_path.exists():
             file_count = len(list(dir_path.glob("*")))
-            print(
-                f"  DELETE {dir_name}/ - {file_count} files (will be deleted)")
+            print(f"  {dir_name}/ - {file_count} files")
         else:
             print(f"  OK {dir_name}/ - Not exists (safe)")
 
@@ -179,7 +181,7 @@ def main():
     print("System check completed!")
     print("\nSuggestions:")
     print("  * Run 'streamlit run streamlit_app.py' to start app")
-    print("  * App will automatically clear old data and start fresh")
+    print("  * App keeps processed videos and cleans up stale scratch files")
     print("  * Use 'Manage Videos' tab to view details")
 
 
@@ -1,4 +1,6 @@
+import copy
 import os
+import threading
 import uuid
 import yt_dlp
 import re
@@ -11,27 +13,148 @@ def sanitize_filename(name):
     return name
 
 
-def download_youtube_video(url, output_dir="videos"):
+VIDEO_FORMAT = 'best[ext=mp4]'
+
+# Trường của format đã chọn được giữ lại trong metadata
+FORMAT_FIELDS = ('format_id', 'ext', 'vcodec', 'acodec', 'width', 'height', 'fps', 'tbr', 'filesize')
+
+
+def resolve_video_info(url, video_format=VIDEO_FORMAT):
+    """Lấy metadata và format đã chọn (có URL stream trực tiếp) mà không tải"""
+    ydl_opts = {
+        'format': video_format,
+        'quiet': True,
+        'noplaylist': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def get_stream_source(info):
+    """Lấy (URL, HTTP headers) của stream có audio trong info đã resolve"""
+    formats = info.get('requested_formats') or [info]
+    for fmt in formats:
+        if fmt.get('acodec') not in (None, 'none') and fmt.get('url'):
+            return fmt['url'], fmt.get('http_headers') or {}
+    return info.get('url'), info.get('http_headers') or {}
+
+
+def download_from_info(info, output_dir="videos", video_format=VIDEO_FORMAT, suffix="", ext="mp4"):
+    """Tải video từ info đã resolve, không gọi lại bước lấy metadata"""
     os.makedirs(output_dir, exist_ok=True)
 
-    try:
-        # Lấy thông tin video (chỉ metadata, không tải)
-        info = yt_dlp.YoutubeDL(
-            {'quiet': True}).extract_info(url, download=False)
-        video_title = info.get('title', f"video_{str(uuid.uuid4())}")
-        safe_title = sanitize_filename(video_title)
-        output_path = os.path.join(output_dir, f"{safe_title}.mp4")
-
-        ydl_opts = {
-            'format': 'best[ext=mp4]',
-            'outtmpl': output_path,
-            'quiet': True,
-            'noplaylist': True,
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+    video_title = info.get('title', f"video_{str(uuid.uuid4())}")
+    safe_title = sanitize_filename(video_title)
+    output_path = os.path.join(output_dir, f"{safe_title}{suffix}.{ext}")
+
+    ydl_opts = {
+        'format': video_format,
+        'outtmpl': output_path,
+        'quiet': True,
+        'noplaylist': True,
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.process_ie_result(info, download=True)
+
+    return output_path
+
+
+def select_audio_format(info):
+    """Chọn format chỉ có audio trong info đã resolve (ưu tiên m4a, bitrate cao), None nếu không có"""
+    audio_formats = [
+        fmt for fmt in info.get('formats') or []
+        if fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none') and fmt.get('url')
+    ]
+    if not audio_formats:
+        return None
+    return max(audio_formats, key=lambda fmt: (fmt.get('ext') == 'm4a', fmt.get('abr') or fmt.get('tbr') or 0))
+
+
+class AudioFirstDownload:
+    """Tải stream audio trước (nhỏ, đủ cho nhận dạng giọng nói), rồi tải video ở luồng nền
 
+    Metadata chỉ lấy một lần, cả hai lần tải dùng lại info đã resolve. Pipeline nhận
+    dạng từ audio_path trong lúc video đang tải, gọi wait_video() trước bước ghép video.
+    """
+
+    def __init__(self, url, output_dir="videos", video_format=VIDEO_FORMAT):
+        self.url = url
+        self.output_dir = output_dir
+        self.video_format = video_format
+        self.info = None
+        self.metadata = None
+        self.audio_path = None
+        self._video_path = None
+        self._video_error = None
+        self._thread = None
+
+    def start(self):
+        """Tải xong audio thì trả về (video tiếp tục tải), ném lỗi nếu không có stream audio riêng"""
+        self.info = resolve_video_info(self.url, self.video_format)
+        self.metadata = video_metadata(self.info)
+
+        audio_format = select_audio_format(self.info)
+        if audio_format is None:
+            raise ValueError("No audio-only format available")
+        # process_ie_result sửa info được truyền vào nên mỗi lần tải dùng một bản sao
+        self.audio_path = download_from_info(copy.deepcopy(self.info), self.output_dir,
+                                             audio_format['format_id'], suffix=".audio",
+                                             ext=audio_format.get('ext') or 'm4a')
+
+        self._thread = threading.Thread(target=self._download_video, daemon=True)
+        self._thread.start()
+        return self
+
+    def _download_video(self):
+        try:
+            self._video_path = download_from_info(copy.deepcopy(self.info), self.output_dir,
+                                                  self.video_format)
+        except Exception as e:
+            self._video_error = e
+
+    def wait_video(self, timeout=None):
+        """Chờ video tải xong, trả về đường dẫn (ném lại lỗi của luồng tải nếu có)"""
+        self._thread.join(timeout)
+        if self._video_error is not None:
+            raise self._video_error
+        return self._video_path
+
+
+# Các trường do video_metadata() trả về
+VIDEO_INFO_FIELDS = ('youtube_id', 'title', 'duration', 'uploader', 'upload_date', 'webpage_url',
+                     'format_id', 'formats', 'available_formats')
+
+
+def video_metadata(info):
+    """Metadata gọn lấy từ info đã resolve để lưu cùng video trong VideoManager"""
+    formats = info.get('requested_formats') or [info]
+    return {
+        'youtube_id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'uploader': info.get('uploader'),
+        'upload_date': info.get('upload_date'),
+        'webpage_url': info.get('webpage_url'),
+        'format_id': info.get('format_id'),
+        'formats': [{field: fmt.get(field) for field in FORMAT_FIELDS} for fmt in formats],
+        'available_formats': len(info.get('formats') or []),
+    }
+
+
+def download_video(url, output_dir="videos", video_format=VIDEO_FORMAT):
+    """Lấy metadata một lần rồi tải từ chính info đó
+
+    Trả về (đường dẫn file, metadata) với metadata dạng video_metadata().
+    """
+    info = resolve_video_info(url, video_format)
+    output_path = download_from_info(info, output_dir, video_format)
+    return output_path, video_metadata(info)
+
+
+def download_youtube_video(url, output_dir="videos"):
+    try:
+        output_path, _ = download_video(url, output_dir)
         return output_path
 
     except Exception as e:
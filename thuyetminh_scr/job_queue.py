@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Hàng đợi job thuyết minh lưu trong SQLite (dùng chung giữa giao diện và các worker)
+Mỗi job ghi lại stage hiện tại và tiến độ, thời lượng trung bình của từng stage
+được lưu lại để ước lượng thời gian còn lại (ETA)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Đường dẫn tương đối tính từ thư mục mã nguồn: UI và worker mở cùng một hàng đợi
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_JOB_DB = os.path.join(BASE_DIR, os.environ.get("JOB_QUEUE_PATH", "cache/jobs.db"))
+
+# Các stage của pipeline theo thứ tự, kèm thời lượng ước lượng khi chưa có lịch sử
+STAGES = ["download", "extract", "detect", "transcribe", "tts", "mux"]
+DEFAULT_STAGE_SECONDS = {"download": 30, "extract": 5, "detect": 3, "transcribe": 120, "tts": 90, "mux": 15}
+
+STAGE_LABELS = {
+    "queued": "Đang chờ",
+    "download": "Tải video",
+    "extract": "Tách audio",
+    "detect": "Nhận diện ngôn ngữ",
+    "transcribe": "Nhận dạng giọng nói",
+    "tts": "Dịch và tạo giọng đọc",
+    "mux": "Ghép video",
+}
+
+# Trọng số cho giá trị mới khi cập nhật thời lượng trung bình của stage
+EMA_ALPHA = 0.3
+
+# Worker báo còn sống định kỳ, job quá STALE_SECONDS không có heartbeat được chạy lại
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 60
+# Job làm worker dừng (crash) quá số lần này thì đánh dấu lỗi thay vì chạy lại mãi
+MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+
+def format_eta(seconds):
+    """ETA dạng "3 phút 20 giây" để hiển thị"""
+    if seconds is None:
+        return "không rõ"
+    seconds = int(round(seconds))
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes} phút {seconds} giây" if minutes else f"{seconds} giây"
+
+
+class JobQueue:
+    def __init__(self, db_path=DEFAULT_JOB_DB):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # Mở kết nối lười: mỗi tiến trình worker tự mở kết nối của mình
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    youtube_url TEXT NOT NULL,
+                    voice TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    stage_progress REAL NOT NULL DEFAULT 0,
+                    stage_started REAL,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    worker TEXT,
+                    heartbeat REAL,
+                    video_id TEXT,
+                    error TEXT,
+                    info TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Hàng đợi tạo trước khi có cột info (thông tin pipeline ghi lại, JSON)
+            # và attempts (số lần worker nhận job)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "info" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN info TEXT")
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_stats (
+                    stage TEXT PRIMARY KEY,
+                    runs INTEGER NOT NULL,
+                    avg_seconds REAL NOT NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def submit(self, youtube_url, voice):
+        """Thêm job vào hàng đợi, trả về job_id"""
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs(id, youtube_url, voice, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, youtube_url, voice, time.time()))
+        return job_id
+
+    def claim(self, worker):
+        """Lấy job cũ nhất đang chờ và đánh dấu đang chạy, trả về None nếu hàng đợi trống"""
+        jobs = self.claim_batch(worker, 1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, worker, limit):
+        """Lấy tối đa limit job cũ nhất đang chờ (nhận dạng theo batch), trả về list job"""
+        with self._lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE giữ khóa ghi nên hai worker không nhận cùng một job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT ?",
+                    (limit,)).fetchall()
+                now = time.time()
+                conn.executemany(
+                    "UPDATE jobs SET status = 'running', worker = ?, started = ?, heartbeat = ?, "
+                    "stage = NULL, stage_progress = 0, stage_started = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    [(worker, now, now, now, row["id"]) for row in rows])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [self.get(row["id"]) for row in rows]
+
+    def _record_stage(self, conn, stage, seconds):
+        conn.execute(
+            "INSERT INTO stage_stats(stage, runs, avg_seconds) VALUES (?, 1, ?) "
+            "ON CONFLICT(stage) DO UPDATE SET runs = runs + 1, "
+            "avg_seconds = avg_seconds * ? + excluded.avg_seconds * ?",
+            (stage, seconds, 1 - EMA_ALPHA, EMA_ALPHA))
+
+    def update_progress(self, job_id, stage, fraction=0.0):
+        """Cập nhật stage hiện tại và tiến độ (0..1) trong stage đó"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT stage, stage_started FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+            if row is None:
+                return
+            if row["stage"] != stage:
+                # Sang stage mới: lưu thời lượng stage vừa xong cho lần ước lượng sau
+                if row["stage"]:
+                    self._record_stage(conn, row["stage"], now - row["stage_started"])
+                conn.execute(
+                    "UPDATE jobs SET stage = ?, stage_progress = ?, stage_started = ? WHERE id = ?",
+                    (stage, fraction, now, job_id))
+            else:
+                conn.execute("UPDATE jobs SET stage_progress = ? WHERE id = ?", (fraction, job_id))
+
+    def _finish(self, job_id, status, video_id=None, error=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT stage, stage_started FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+            if row is not None and row["stage"] and status == "completed":
+                self._record_stage(conn, row["stage"], now - row["stage_started"])
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, video_id = ?, error = ?, "
+                "stage_progress = CASE WHEN ? = 'completed' THEN 1 ELSE stage_progress END "
+                "WHERE id = ?",
+                (status, now, video_id, error, status, job_id))
+
+    def complete(self, job_id, video_id):
+        self._finish(job_id, "completed", video_id=video_id)
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error=error)
+
+    def set_info(self, job_id, **fields):
+        """Ghi thêm thông tin của job (ví dụ ngôn ngữ nhận diện được), gộp với thông tin đã có"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT info FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None:
+                    info = {**json.loads(row["info"] or "{}"), **fields}
+                    conn.execute("UPDATE jobs SET info = ? WHERE id = ?",
+                                 (json.dumps(info, ensure_ascii=False), job_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id):
+        with self._lock:
+            self._connect().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def requeue_stale(self, max_age=STALE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """Đưa các job mà worker đã dừng (mất heartbeat) về hàng đợi, trả về số job
+
+        Job đã làm worker dừng max_attempts lần được đánh dấu lỗi.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished = ?, "
+                    "error = 'Worker stopped during the job ' || attempts || ' times' "
+                    "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                    (now, now - max_age, max_attempts))
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, stage = NULL, "
+                    "stage_progress = 0 WHERE status = 'running' AND heartbeat < ?",
+                    (now - max_age,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def stage_estimates(self):
+        """Thời lượng ước lượng (giây) của từng stage"""
+        with self._lock:
+            rows = self._connect().execute("SELECT stage, avg_seconds FROM stage_stats").fetchall()
+        estimates = dict(DEFAULT_STAGE_SECONDS)
+        estimates.update({row["stage"]: row["avg_seconds"] for row in rows})
+        return estimates
+
+    def _with_eta(self, job, estimates):
+        """Thêm ETA (giây) và tiến độ tổng (0..1) cho job"""
+        job["info"] = json.loads(job["info"] or "{}")
+        total = sum(estimates[stage] for stage in STAGES)
+        if job["status"] == "completed":
+            job["eta_seconds"], job["overall_progress"] = 0.0, 1.0
+            return job
+        if job["status"] != "running" or job["stage"] not in STAGES:
+            job["eta_seconds"] = total if job["status"] == "queued" else None
+            job["overall_progress"] = 0.0
+            return job
+
+        index = STAGES.index(job["stage"])
+        expected = estimates[job["stage"]]
+        elapsed = time.time() - job["stage_started"]
+        fraction = job["stage_progress"]
+        if fraction > 0:
+            # Có tiến độ trong stage: ngoại suy từ tốc độ hiện tại
+            remaining = elapsed / fraction - elapsed
+        else:
+            remaining = max(expected - elapsed, 0.0)
+            fraction = min(elapsed / expected, 0.95) if expected else 0.0
+        later = sum(estimates[stage] for stage in STAGES[index + 1:])
+        done = sum(estimates[stage] for stage in STAGES[:index]) + expected * fraction
+
+        job["eta_seconds"] = remaining + later
+        job["overall_progress"] = min(done / total, 0.99) if total else 0.0
+        return job
+
+    def get(self, job_id):
+        """Lấy thông tin job kèm ETA"""
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return self._with_eta(dict(row), self.stage_estimates())
+
+    def list_jobs(self, limit=20, statuses=None):
+        """Các job mới nhất (lọc theo trạng thái nếu có)"""
+        query = "SELECT * FROM jobs"
+        params = []
+        if statuses:
+            query += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params += list(statuses)
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        estimates = self.stage_estimates()
+        return [self._with_eta(dict(row), estimates) for row in rows]
+
+    def get_stats(self):
+        """Số job theo trạng thái"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        stats = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        stats.update({row["status"]: row["n"] for row in rows})
+        return stats
+
+
+# Hàng đợi dùng chung cho toàn tiến trình
+job_queue = JobQueue()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Worker chạy pipeline thuyết minh cho các job trong hàng đợi
+Mỗi worker là một tiến trình riêng, load model Whisper một lần và dùng lại cho mọi job.
+Chạy độc lập: python job_worker.py --workers 2
+"""
+
+import argparse
+import atexit
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+from job_queue import DEFAULT_JOB_DB, HEARTBEAT_SECONDS, JobQueue
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+# Số job lấy cùng lúc khi hàng đợi còn nhiều job: nhận dạng cả batch qua một model (1: từng job)
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", "1"))
+POLL_INTERVAL = 1.0
+
+
+def keep_alive(queue, job_ids):
+    """Gửi heartbeat cho các job ở luồng nền, set() Event trả về để dừng"""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            for job_id in job_ids:
+                queue.heartbeat(job_id)
+
+    threading.Thread(target=beat, daemon=True).start()
+    return stop
+
+
+def run_job(job, queue):
+    """Chạy pipeline cho một job và ghi kết quả vào hàng đợi"""
+    from thuyetminh_sync import pipeline
+
+    def progress(stage, fraction=0.0):
+        queue.update_progress(job["id"], stage, fraction)
+
+    # Báo còn sống trong lúc các stage dài (nhận dạng giọng nói) chưa cập nhật tiến độ
+    stop = keep_alive(queue, [job["id"]])
+    try:
+        video_id = pipeline(job["youtube_url"], job["voice"], progress=progress,
+                            report=lambda **fields: queue.set_info(job["id"], **fields))
+    except Exception as e:
+        traceback.print_exc()
+        queue.fail(job["id"], str(e))
+        return None
+    finally:
+        stop.set()
+
+    if video_id:
+        queue.complete(job["id"], video_id)
+    else:
+        queue.fail(job["id"], "Pipeline failed")
+    return video_id
+
+
+def run_batch(jobs, queue):
+    """Nhận dạng các job trong một batch rồi chạy pipeline từng job (dùng segment đã có)"""
+    from thuyetminh_sync import prefetch_transcripts
+
+    def progress(index, stage, fraction=0.0):
+        queue.update_progress(jobs[index]["id"], stage, fraction)
+
+    # Job đang chờ tới lượt cũng phải báo còn sống để không bị đưa lại hàng đợi
+    stop = keep_alive(queue, [job["id"] for job in jobs])
+    try:
+        try:
+            prefetch_transcripts([job["youtube_url"] for job in jobs], progress=progress)
+        except Exception:
+            # Pipeline của từng job tự tải và nhận dạng lại
+            traceback.print_exc()
+        return [run_job(job, queue) for job in jobs]
+    finally:
+        stop.set()
+
+
+def worker_loop(name, db_path=DEFAULT_JOB_DB, poll_interval=POLL_INTERVAL, max_jobs=None,
+                batch_size=JOB_BATCH_SIZE):
+    """Lấy job từ hàng đợi và chạy lần lượt cho tới khi đủ max_jobs (None = chạy mãi)"""
+    from model_registry import model_registry
+    model_registry.warm_up()
+
+    queue = JobQueue(db_path)
+    done = 0
+    print(f"Worker {name} started")
+    while max_jobs is None or done < max_jobs:
+        queue.requeue_stale()
+        limit = batch_size if max_jobs is None else min(batch_size, max_jobs - done)
+        jobs = queue.claim_batch(name, max(1, limit))
+        if not jobs:
+            time.sleep(poll_interval)
+            continue
+        if len(jobs) > 1:
+            print(f"Worker {name} processing {len(jobs)} jobs in one batch")
+            run_batch(jobs, queue)
+        else:
+            print(f"Worker {name} processing job {jobs[0]['id']}: {jobs[0]['youtube_url']}")
+            run_job(jobs[0], queue)
+        done += len(jobs)
+
+
+class WorkerPool:
+    def __init__(self, workers=JOB_WORKERS, db_path=DEFAULT_JOB_DB):
+        self.workers = workers
+        self.db_path = db_path
+        self.processes = []
+
+    def start(self):
+        # spawn để tiến trình con không kế thừa kết nối SQLite/model của tiến trình cha
+        context = multiprocessing.get_context("spawn")
+        host = socket.gethostname()
+        for i in range(self.workers):
+            # Không dùng daemon: job worker cần tạo pool tiến trình con để nhận dạng song song,
+            # thay vào đó dừng các worker khi tiến trình chính thoát
+            process = context.Process(target=worker_loop, args=(f"{host}-{os.getpid()}-{i}", self.db_path))
+            process.start()
+            self.processes.append(process)
+        atexit.register(self.stop)
+        return self
+
+    def alive(self):
+        return sum(1 for process in self.processes if process.is_alive())
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+    def join(self):
+        for process in self.processes:
+            process.join()
+
+
+_pool = None
+
+
+def start_worker_pool(workers=JOB_WORKERS, db_path=DEFAULT_JOB_DB):
+    """Khởi động pool worker một lần cho tiến trình hiện tại (workers=0: worker chạy riêng)"""
+    global _pool
+    if _pool is None and workers > 0:
+        _pool = WorkerPool(workers, db_path).start()
+    return _pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy worker xử lý hàng đợi thuyết minh")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    parser.add_argument("--db", default=DEFAULT_JOB_DB)
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.db).start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
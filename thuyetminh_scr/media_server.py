@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+HTTP server nhỏ phát video đã quản lý bởi VideoManager, hỗ trợ Range request
+Dữ liệu đi thẳng từ file ra socket bằng sendfile nên mỗi người xem chỉ tốn bộ nhớ
+cỡ một chunk, giao diện nhúng URL thay vì gửi cả file qua websocket của Streamlit
+"""
+
+import os
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+MEDIA_HOST = os.environ.get("MEDIA_SERVER_HOST", "127.0.0.1")
+MEDIA_PORT = int(os.environ.get("MEDIA_SERVER_PORT", "8765"))
+# URL trình duyệt dùng để truy cập server (khi chạy sau reverse proxy / máy khác)
+MEDIA_BASE_URL = os.environ.get("MEDIA_BASE_URL")
+
+VIDEO_TYPES = ("original", "transformed")
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """Đổi header Range (một khoảng) thành (start, end) bao gồm cả end
+
+    Trả về None nếu không có Range hoặc Range không hợp lệ (phát cả file),
+    ném ValueError nếu khoảng nằm ngoài file (416).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # bytes=-N: N byte cuối
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _default_resolver(video_id, video_type):
+    from video_manager import video_manager
+
+    original_path, transformed_path = video_manager.get_video_paths(video_id)
+    return original_path if video_type == "original" else transformed_path
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    server_version = "NarratorMedia/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _send_error(self, code, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, send_body):
+        # URL dạng /videos/<video_id>/<original|transformed>[?download=1&filename=...]
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if len(parts) != 3 or parts[0] != "videos" or parts[2] not in VIDEO_TYPES:
+            return self._send_error(404)
+
+        path = self.server.resolver(parts[1], parts[2])
+        if not path or not os.path.isfile(path):
+            return self._send_error(404)
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send_error(304, {"ETag": etag})
+
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            return self._send_error(416, {"Content-Range": f"bytes */{size}"})
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(stat.st_mtime, usegmt=True))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        query = parse_qs(url.query)
+        if query.get("download") == ["1"]:
+            filename = os.path.basename(query.get("filename", [path])[0])
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+        self.end_headers()
+
+        self.server.count(range_request=bool(byte_range))
+        if not send_body or not length:
+            return
+
+        try:
+            with open(path, "rb") as f:
+                # socket.sendfile dùng os.sendfile (zero-copy) nếu hệ điều hành hỗ trợ,
+                # ngược lại đọc/gửi từng chunk
+                sent = self.connection.sendfile(f, offset=start, count=length)
+            self.server.count(bytes_sent=sent)
+        except (BrokenPipeError, ConnectionResetError):
+            # Trình duyệt hủy request khi tua video
+            self.close_connection = True
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host=MEDIA_HOST, port=MEDIA_PORT, resolver=None, base_url=MEDIA_BASE_URL):
+        super().__init__((host, port), MediaRequestHandler)
+        self.resolver = resolver or _default_resolver
+        self.base_url = (base_url or f"http://{host}:{self.server_address[1]}").rstrip("/")
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "range_requests": 0, "bytes_sent": 0}
+
+    def count(self, range_request=None, bytes_sent=0):
+        with self._stats_lock:
+            if range_request is not None:
+                self.stats["requests"] += 1
+                self.stats["range_requests"] += int(range_request)
+            self.stats["bytes_sent"] += bytes_sent
+
+    def url_for(self, video_id, video_type="original", download=False, filename=None):
+        url = f"{self.base_url}/videos/{quote(video_id)}/{video_type}"
+        if download:
+            url += "?download=1"
+            if filename:
+                url += f"&filename={quote(filename)}"
+        return url
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="media-server", daemon=True)
+        thread.start()
+        return self
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_media_server(host=MEDIA_HOST, port=MEDIA_PORT):
+    """Khởi động media server một lần cho tiến trình hiện tại"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                server = MediaServer(host, port)
+            except OSError:
+                # Cổng đã bị chiếm (ví dụ chạy hai app cùng lúc): để hệ điều hành chọn cổng
+                server = MediaServer(host, 0)
+            _server = server.start()
+    return _server
+
+
+def get_video_url(video_id, video_type="original", download=False, filename=None):
+    """URL phát (hoặc tải xuống) video, khởi động server nếu chưa chạy"""
+    return start_media_server().url_for(video_id, video_type, download, filename)
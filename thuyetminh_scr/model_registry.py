@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Registry dùng chung cho các model Whisper trong toàn tiến trình
+Load lười, giữ model trong RAM và loại bỏ theo LRU khi vượt ngân sách bộ nhớ
+Mỗi model có lock riêng (lock_for) để các luồng dùng chung một model lần lượt
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# Số tham số (triệu) của từng kích thước model, dùng để ước lượng RAM
+MODEL_PARAMS_M = {
+    "tiny": 39,
+    "tiny.en": 39,
+    "base": 74,
+    "base.en": 74,
+    "small": 244,
+    "small.en": 244,
+    "medium": 769,
+    "medium.en": 769,
+    "large": 1550,
+    "large-v1": 1550,
+    "large-v2": 1550,
+    "large-v3": 1550,
+    "turbo": 809,
+}
+
+# Số byte cho mỗi tham số theo compute type
+BYTES_PER_PARAM = {
+    "float32": 4,
+    "default": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "int8": 1,
+}
+
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get("WHISPER_MODEL_MEMORY_MB", "4096"))
+
+# Backend ASR của pipeline thuyết minh: "openai-whisper" hoặc "faster-whisper" (CTranslate2)
+ASR_BACKEND = os.environ.get("ASR_BACKEND", "openai-whisper")
+# Compute type của faster-whisper, mặc định lượng tử hóa int8 (int8_float16 trên GPU)
+ASR_COMPUTE_TYPE = os.environ.get("ASR_COMPUTE_TYPE") or None
+FASTER_WHISPER_COMPUTE_TYPES = {"cpu": "int8", "cuda": "int8_float16"}
+
+# Model pipeline thuyết minh dùng mặc định
+DEFAULT_WARMUP = f"{ASR_BACKEND}:base"
+
+
+def default_device():
+    """Chọn cuda nếu có GPU, ngược lại dùng cpu"""
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+def _load_openai_whisper(model_size, device, compute_type):
+    import whisper
+    return whisper.load_model(model_size, device=device)
+
+
+def _load_faster_whisper(model_size, device, compute_type):
+    from faster_whisper import WhisperModel
+    return WhisperModel(model_size, device=device, compute_type=compute_type)
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self.loaders = {
+            "openai-whisper": _load_openai_whisper,
+            "faster-whisper": _load_faster_whisper,
+        }
+
+        # key -> (model, ước lượng MB, lock dùng model), thứ tự = thứ tự dùng gần nhất
+        self._models = OrderedDict()
+        self._key_locks = {}
+        # model -> lock của model đã bị loại hoặc không load qua registry; tham chiếu yếu:
+        # entry tự mất khi model được giải phóng, không giữ model trong RAM
+        self._orphan_locks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._warmup_started = False
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "evictions": 0,
+            "load_time_total": 0.0,
+            "load_times": {},
+        }
+
+    def register_loader(self, backend, loader):
+        """Đăng ký hàm load cho một backend ASR mới"""
+        self.loaders[backend] = loader
+
+    def make_key(self, backend="openai-whisper", model_size="base", device=None, compute_type=None):
+        """Chuẩn hóa key (backend, size, device, compute type)"""
+        device = device or default_device()
+        if compute_type is None:
+            if backend == "openai-whisper":
+                compute_type = "float16" if device == "cuda" else "float32"
+            elif backend == "faster-whisper":
+                compute_type = ASR_COMPUTE_TYPE or FASTER_WHISPER_COMPUTE_TYPES.get(device, "int8")
+            else:
+                compute_type = "default"
+        return (backend, model_size, device, compute_type)
+
+    @staticmethod
+    def estimate_memory_mb(model_size, compute_type):
+        """Ước lượng dung lượng RAM (MB) của model"""
+        params_m = MODEL_PARAMS_M.get(model_size, MODEL_PARAMS_M["large"])
+        return params_m * BYTES_PER_PARAM.get(compute_type, 4)
+
+    def get(self, backend="openai-whisper", model_size="base", device=None, compute_type=None):
+        """Lấy model từ registry, load nếu chưa có"""
+        key = self.make_key(backend, model_size, device, compute_type)
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._models[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Mỗi key chỉ load một lần kể cả khi nhiều luồng gọi cùng lúc
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return self._models[key][0]
+                self.stats["misses"] += 1
+
+            if backend not in self.loaders:
+                raise ValueError(f"Unknown ASR backend: {backend}")
+
+            start = time.perf_counter()
+            model = self.loaders[backend](*key[1:])
+            elapsed = time.perf_counter() - start
+            size_mb = self.estimate_memory_mb(key[1], key[3])
+
+            with self._lock:
+                self.stats["loads"] += 1
+                self.stats["load_time_total"] += elapsed
+                self.stats["load_times"]["/".join(key)] = round(elapsed, 3)
+                self._models[key] = (model, size_mb, threading.RLock())
+                self._evict_over_budget(keep=key)
+
+            print(f"Loaded {backend} model '{key[1]}' on {key[2]} ({key[3]}) in {elapsed:.1f}s")
+            return model
+
+    def _evict_over_budget(self, keep):
+        # Gọi khi đang giữ self._lock
+        while self.memory_used_mb() > self.memory_budget_mb:
+            victim = next((k for k in self._models if k != keep), None)
+            if victim is None:
+                break
+            self._release(self._models.pop(victim))
+            self.stats["evictions"] += 1
+            print(f"Evicted model {'/'.join(victim)} from registry")
+
+    def memory_used_mb(self):
+        """Tổng RAM ước lượng của các model đang giữ"""
+        return sum(entry[1] for entry in self._models.values())
+
+    def _release(self, entry):
+        # Luồng còn đang dùng model bị loại vẫn khóa chung lock cũ
+        model, _, lock = entry
+        self._orphan_locks[model] = lock
+
+    def lock_for(self, model):
+        """Lock dùng chung của model, giữ lock trong lúc transcribe/decode
+
+        openai-whisper gắn hook kv-cache vào model khi decode nên hai luồng không được
+        dùng cùng một instance cùng lúc.
+        """
+        with self._lock:
+            for entry in self._models.values():
+                if entry[0] is model:
+                    return entry[2]
+            return self._orphan_locks.setdefault(model, threading.RLock())
+
+    def evict(self, backend="openai-whisper", model_size="base", device=None, compute_type=None):
+        """Bỏ một model khỏi registry"""
+        key = self.make_key(backend, model_size, device, compute_type)
+        with self._lock:
+            entry = self._models.pop(key, None)
+            if entry is None:
+                return False
+            self._release(entry)
+            return True
+
+    def clear(self):
+        """Bỏ toàn bộ model khỏi registry"""
+        with self._lock:
+            for entry in self._models.values():
+                self._release(entry)
+            self._models.clear()
+
+    def warm_up(self, specs=None, background=False):
+        """Load trước các model cần dùng khi khởi động
+
+        specs là list các dict tham số của get(), mặc định đọc từ
+        biến môi trường WHISPER_WARMUP dạng "openai-whisper:base,faster-whisper:small"
+        """
+        if specs is None:
+            specs = parse_warmup_spec(os.environ.get("WHISPER_WARMUP", DEFAULT_WARMUP))
+
+        def run():
+            for spec in specs:
+                try:
+                    self.get(**spec)
+                except Exception as e:
+                    print(f"Warm-up failed for {spec}: {e}")
+
+        if not background:
+            run()
+            return None
+
+        # Streamlit chạy lại script mỗi lần tương tác, chỉ warm-up một lần
+        with self._lock:
+            if self._warmup_started:
+                return None
+            self._warmup_started = True
+
+        thread = threading.Thread(target=run, name="whisper-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def get_stats(self):
+        """Lấy thống kê hit/miss/thời gian load của registry"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "load_times": dict(self.stats["load_times"]),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "loaded_models": ["/".join(k) for k in self._models],
+                "memory_used_mb": self.memory_used_mb(),
+                "memory_budget_mb": self.memory_budget_mb,
+            }
+
+
+def parse_warmup_spec(value):
+    """Chuyển chuỗi "backend:size[:device[:compute_type]],..." thành list spec"""
+    specs = []
+    for item in value.split(","):
+        parts = [p.strip() for p in item.strip().split(":")]
+        if not parts[0]:
+            continue
+        names = ["backend", "model_size", "device", "compute_type"]
+        specs.append({name: part for name, part in zip(names, parts) if part})
+    return specs
+
+
+# Instance dùng chung cho toàn tiến trình
+model_registry = ModelRegistry()
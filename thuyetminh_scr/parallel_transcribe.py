@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Nhận dạng giọng nói song song cho audio dài trên máy chỉ có CPU
+Audio được cắt tại các khoảng lặng (VAD theo năng lượng), đoạn không có tiếng nói bị bỏ qua,
+các đoạn còn lại chạy trên pool tiến trình (mỗi tiến trình load model một lần) rồi ghép
+segment lại với timestamp toàn cục.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from asr_backends import ASR_BACKEND, ASR_COMPUTE_TYPE, transcribe_with_model
+from audio_stream import SAMPLE_RATE, frame_energy
+
+# Số tiến trình nhận dạng (0/1: một lần model.transcribe cho cả file như cũ)
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "0"))
+# Độ dài mục tiêu của mỗi đoạn gửi cho một tiến trình
+CHUNK_SECONDS = float(os.environ.get("TRANSCRIBE_CHUNK_SECONDS", "120"))
+
+FRAME_MS = 30
+MIN_SILENCE_MS = 300
+# Giữ thêm một chút audio trước đoạn có tiếng nói để không mất âm đầu
+SPEECH_PAD_MS = 200
+
+
+def detect_speech(audio, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, threshold=None):
+    """Đánh dấu frame có tiếng nói theo năng lượng RMS
+
+    Ngưỡng mặc định tính từ mức nhiễu nền (phân vị 10%) và mức to nhất của audio.
+    """
+    energy = frame_energy(audio, sample_rate, frame_ms)
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool)
+    if threshold is None:
+        # Audio gần như không có khoảng lặng: nhiễu nền ước lượng quá cao, giới hạn ở 1/2 mức to nhất
+        noise = min(np.percentile(energy, 10) * 3, energy.max() * 0.5)
+        threshold = max(noise, energy.max() * 0.02, 1e-4)
+    return energy > threshold
+
+
+def _silence_runs(speech, start, end):
+    """Các khoảng lặng (frame_start, frame_end) trong speech[start:end]"""
+    padded = np.concatenate([[True], speech[start:end], [True]]).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return [(start + a, start + b) for a, b in zip(edges[::2], edges[1::2])]
+
+
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, target_seconds=CHUNK_SECONDS,
+                     min_silence_ms=MIN_SILENCE_MS, frame_ms=FRAME_MS, threshold=None):
+    """Chia audio thành các đoạn có tiếng nói dài khoảng target_seconds
+
+    Mỗi đoạn kết thúc ở giữa khoảng lặng dài nhất trong nửa sau của cửa sổ, không có
+    khoảng lặng nào đủ dài thì cắt ở frame yên lặng nhất. Khoảng lặng giữa các đoạn
+    bị bỏ qua. Trả về list (sample bắt đầu, sample kết thúc).
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    speech = detect_speech(audio, sample_rate, frame_ms, threshold)
+    n_frames = len(speech)
+    target = max(1, int(target_seconds * 1000 / frame_ms))
+    min_silence = max(1, int(min_silence_ms / frame_ms))
+    pad = int(SPEECH_PAD_MS / frame_ms)
+
+    chunks = []
+    i = 0
+    while i < n_frames:
+        # Bỏ khoảng lặng trước đoạn tiếp theo
+        while i < n_frames and not speech[i]:
+            i += 1
+        if i >= n_frames:
+            break
+        start = max(i - pad, chunks[-1][1] // frame if chunks else 0)
+
+        limit = start + target
+        if limit >= n_frames:
+            end = n_frames
+        else:
+            runs = [(b - a, a, b) for a, b in _silence_runs(speech, start + target // 2, limit)
+                    if b - a >= min_silence]
+            if runs:
+                _, a, b = max(runs)
+                end = (a + b) // 2
+            else:
+                window = frame_energy(audio[(limit - target // 4) * frame:limit * frame],
+                                      sample_rate, frame_ms)
+                end = limit - target // 4 + int(np.argmin(window)) if len(window) else limit
+            end = max(end, i + 1)
+
+        end_sample = len(audio) if end >= n_frames else end * frame
+        if speech[start:end].any():
+            chunks.append((start * frame, end_sample))
+        i = end
+    return chunks
+
+
+def stitch_segments(chunk_results):
+    """Ghép segment của các đoạn, đổi timestamp về thời gian trong toàn bộ audio
+
+    chunk_results là list (offset giây của đoạn, segment Whisper của đoạn) theo thứ tự.
+    """
+    stitched = []
+    for offset, segments in chunk_results:
+        for seg in segments:
+            seg = dict(seg)
+            seg["id"] = len(stitched)
+            seg["start"] = round(seg["start"] + offset, 3)
+            seg["end"] = round(seg["end"] + offset, 3)
+            if "seek" in seg:
+                # seek tính theo frame mel (100 frame/giây)
+                seg["seek"] = seg["seek"] + int(round(offset * 100))
+            if seg.get("words"):
+                seg["words"] = [
+                    {**word, "start": round(word["start"] + offset, 3),
+                     "end": round(word["end"] + offset, 3)}
+                    for word in seg["words"]
+                ]
+            stitched.append(seg)
+    return stitched
+
+
+# Trạng thái trong từng tiến trình của pool
+_worker_model = None
+_worker_backend = None
+
+
+def _exit_when_orphaned(parent_pid):
+    # Tiến trình cha bị kill (job worker dừng): tự thoát thay vì chờ việc mãi
+    while True:
+        time.sleep(2)
+        if os.getppid() != parent_pid:
+            os._exit(0)
+
+
+def _init_worker(backend, model_size, compute_type, threads, loader):
+    global _worker_model, _worker_backend
+    try:
+        import torch
+        # Chia số core cho các tiến trình, tránh mỗi tiến trình dùng hết core
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    threading.Thread(target=_exit_when_orphaned, args=(os.getppid(),), daemon=True).start()
+    _worker_backend = backend
+
+    if loader is not None:
+        _worker_model = loader(model_size)
+        return
+    from model_registry import model_registry
+    _worker_model = model_registry.get(backend, model_size, device="cpu", compute_type=compute_type)
+
+
+def _transcribe_chunk(audio, language, options):
+    return transcribe_with_model(_worker_model, _worker_backend, audio, language, **options)
+
+
+class ParallelTranscriber:
+    """Pool tiến trình nhận dạng, mỗi tiến trình giữ một model Whisper của backend
+
+    loader(model_size) thay cho model_registry khi cần model khác (phải pickle được).
+    """
+
+    def __init__(self, model_size="base", workers=TRANSCRIBE_WORKERS, backend=ASR_BACKEND,
+                 chunk_seconds=CHUNK_SECONDS, loader=None, compute_type=ASR_COMPUTE_TYPE):
+        self.model_size = model_size
+        self.loader = loader
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.compute_type = compute_type
+        self.chunk_seconds = chunk_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                # spawn: tiến trình con không kế thừa kết nối SQLite/model của tiến trình cha
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.backend, self.model_size, self.compute_type, threads, self.loader))
+            return self._executor
+
+    def transcribe(self, audio, language="en", **options):
+        """Nhận dạng mảng audio float32 16 kHz, trả về segment với timestamp toàn cục"""
+        chunks = split_on_silence(audio, SAMPLE_RATE, self.chunk_seconds)
+        if not chunks:
+            return []
+
+        executor = self._get_executor()
+        start = time.perf_counter()
+        # Ngữ cảnh câu trước không đi qua ranh giới đoạn nên mỗi đoạn nhận dạng độc lập
+        futures = [executor.submit(_transcribe_chunk, audio[a:b], language, options)
+                   for a, b in chunks]
+        segments = stitch_segments([(a / SAMPLE_RATE, future.result())
+                                    for (a, _), future in zip(chunks, futures)])
+
+        elapsed = time.perf_counter() - start
+        speech_seconds = sum(b - a for a, b in chunks) / SAMPLE_RATE
+        print(f"Transcribed {len(chunks)} chunks ({speech_seconds:.0f}s of "
+              f"{len(audio) / SAMPLE_RATE:.0f}s audio) on {self.workers} workers in {elapsed:.1f}s")
+        return segments
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+_transcribers = {}
+_transcribers_lock = threading.Lock()
+
+
+def get_transcriber(model_size="base", workers=TRANSCRIBE_WORKERS, backend=ASR_BACKEND):
+    """Pool dùng chung trong tiến trình (model ở các tiến trình con chỉ load một lần)"""
+    with _transcribers_lock:
+        key = (model_size, workers, backend)
+        if key not in _transcribers:
+            _transcribers[key] = ParallelTranscriber(model_size, workers, backend)
+        return _transcribers[key]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Cache kết quả pipeline thuyết minh
+- Key kết quả: (ID video YouTube, giọng đọc, model Whisper, phiên bản pipeline)
+- Artifact trung gian theo video: segment Whisper và ngôn ngữ nguồn (JSON) để chạy lại
+  với giọng khác không phải nhận dạng lại
+- Thống kê hit/miss theo từng stage, cộng dồn trong SQLite cho mọi tiến trình
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Tăng khi đổi cách nhận dạng/dịch/TTS/ghép video để không dùng lại kết quả cũ
+PIPELINE_VERSION = "4"
+# Tăng khi đổi cách nhận dạng (segment/ngôn ngữ đã lưu), đổi dịch/TTS/ghép video không cần nhận dạng lại
+TRANSCRIPT_VERSION = "1"
+
+# Đường dẫn tương đối tính từ thư mục mã nguồn (chatbot chạy từ thư mục khác vẫn dùng chung cache)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, os.environ.get("PIPELINE_CACHE_DIR", "cache/pipeline"))
+
+# Stage có thể bỏ qua nhờ cache ("result": cả pipeline)
+CACHE_STAGES = ["result", "download", "transcribe", "tts"]
+
+_YOUTUBE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def canonical_video_id(url):
+    """ID 11 ký tự của video YouTube trong URL (watch, youtu.be, shorts, embed, live)"""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    parts = [p for p in parsed.path.split("/") if p]
+    candidate = None
+    if host == "youtu.be" or host.endswith(".youtu.be"):
+        candidate = parts[0] if parts else None
+    elif host == "youtube.com" or host.endswith(".youtube.com"):
+        if parts[:1] == ["watch"]:
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            candidate = parts[1]
+    if candidate and _YOUTUBE_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def video_cache_id(url):
+    """ID dùng làm key cache: ID YouTube, hoặc hash của URL với nguồn khác"""
+    video_id = canonical_video_id(url)
+    if video_id:
+        return video_id
+    return "url_" + hashlib.sha256(url.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def result_key(video_key, voice, model_size, version=PIPELINE_VERSION, **settings):
+    """Cache key của video kết quả, settings là các tùy chọn làm đổi kết quả (ví dụ language="auto")"""
+    parts = [video_key, voice, model_size] + [f"{name}={settings[name]}" for name in sorted(settings)]
+    return ":".join(parts + [f"v{version}"])
+
+
+class PipelineCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # Mở kết nối lười để import module không tạo thư mục
+        if self._conn is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.cache_dir / "stats.db"), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_stats (
+                    stage TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def record(self, stage, hits=0, misses=0):
+        """Cộng dồn số lần bỏ qua (hit) / phải chạy (miss) một stage"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO stage_stats(stage, hits, misses) VALUES (?, ?, ?) "
+                "ON CONFLICT(stage) DO UPDATE SET hits = hits + excluded.hits, "
+                "misses = misses + excluded.misses", (stage, hits, misses))
+            conn.commit()
+
+    def get_stats(self):
+        """Hit/miss và hit rate của từng stage"""
+        with self._lock:
+            rows = self._connect().execute("SELECT stage, hits, misses FROM stage_stats").fetchall()
+        totals = {stage: (hits, misses) for stage, hits, misses in rows}
+        stats = {}
+        for stage in CACHE_STAGES:
+            hits, misses = totals.get(stage, (0, 0))
+            stats[stage] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        return stats
+
+    def _video_dir(self, video_key):
+        return self.cache_dir / video_key
+
+    def segments_path(self, video_key, model_size, version=TRANSCRIPT_VERSION):
+        return self._video_dir(video_key) / f"segments_{model_size}_v{version}.json"
+
+    def get_segments(self, video_key, model_size):
+        path = self.segments_path(video_key, model_size)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_segments(self, video_key, model_size, segments):
+        self._write_json(self.segments_path(video_key, model_size), segments)
+
+    def language_path(self, video_key, model_size, version=TRANSCRIPT_VERSION):
+        return self._video_dir(video_key) / f"language_{model_size}_v{version}.json"
+
+    def get_language(self, video_key, model_size):
+        """Ngôn ngữ nguồn đã nhận diện cùng segment (dict của asr_backends.detect_language)"""
+        try:
+            with open(self.language_path(video_key, model_size), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_language(self, video_key, model_size, language):
+        self._write_json(self.language_path(video_key, model_size), language)
+
+    def _write_json(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Ghi file tạm rồi đổi tên để tiến trình khác không đọc phải file dở
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+# Cache dùng chung cho toàn tiến trình
+pipeline_cache = PipelineCache()
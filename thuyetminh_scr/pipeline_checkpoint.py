@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Thư mục làm việc riêng cho từng lần chạy pipeline kèm manifest các stage đã xong
+Job lỗi hoặc bị dừng giữa chừng chạy lại sẽ tiếp tục từ stage cuối cùng đã hoàn thành,
+stage TTS tiếp tục từ segment cuối cùng đã sinh giọng (nhật ký tts_segments.jsonl).
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Đường dẫn tương đối tính từ thư mục mã nguồn: worker, app và dọn dẹp (video_manager) dùng chung
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = os.path.join(BASE_DIR, os.environ.get("PIPELINE_WORK_DIR", "work"))
+
+MANIFEST_FILE = "manifest.json"
+SEGMENT_JOURNAL = "tts_segments.jsonl"
+LOCK_FILE = ".lock"
+
+
+def workdir_for(key, root=WORK_DIR):
+    """Thư mục làm việc của một lần chạy, key thường là cache key của pipeline"""
+    return Path(root) / re.sub(r"[^A-Za-z0-9_.-]", "_", key)
+
+
+def _lock_file(file, blocking):
+    """Khóa độc quyền file đang mở, blocking=False thì trả về False nếu đang bị giữ"""
+    if fcntl is not None:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.5)
+
+
+class WorkdirLock:
+    """Khóa một thư mục làm việc giữa các job (kể cả ở tiến trình khác) cùng cache key
+    Hệ điều hành tự nhả khóa khi tiến trình giữ khóa bị dừng."""
+
+    def __init__(self, workdir):
+        self.workdir = Path(workdir)
+        self.path = self.workdir / LOCK_FILE
+        self.waited = False
+        self._file = None
+
+    def acquire(self):
+        while True:
+            self.workdir.mkdir(parents=True, exist_ok=True)
+            file = open(self.path, "a+b")
+            if not _lock_file(file, blocking=False):
+                if not self.waited:
+                    print(f"Waiting for another run using {self.workdir}...")
+                self.waited = True
+                _lock_file(file, blocking=True)
+            # Job trước đã xóa thư mục (cleanup) trong lúc chờ: khóa lại trên file mới
+            try:
+                same_file = os.path.samestat(os.fstat(file.fileno()), os.stat(self.path))
+            except OSError:
+                same_file = False
+            if same_file:
+                self._file = file
+                return self
+            file.close()
+
+    def release(self):
+        if self._file is not None:
+            if fcntl is None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class StageManifest:
+    def __init__(self, workdir, params):
+        """params xác định lần chạy (URL, giọng, model...), khác params thì bắt đầu lại
+        Giữ khóa thư mục làm việc tới khi release()/cleanup(): job cùng key phải chờ"""
+        self.workdir = Path(workdir)
+        self.manifest_path = self.workdir / MANIFEST_FILE
+        self.journal_path = self.workdir / SEGMENT_JOURNAL
+        self._lock = threading.Lock()
+        self.workdir_lock = WorkdirLock(self.workdir).acquire()
+        # True nếu đã phải chờ job khác cùng key (có thể kết quả đã có trong cache)
+        self.waited = self.workdir_lock.waited
+
+        self.data = None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if not self.data or self.data.get("params") != params:
+            self.reset(params)
+
+    def reset(self, params=None):
+        """Bỏ các stage đã lưu (bắt đầu lại từ đầu)"""
+        params = params if params is not None else self.data["params"]
+        self.data = {"params": params, "created": time.time(), "stages": {}}
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+        self._save()
+
+    def _save(self):
+        # Ghi file tạm rồi đổi tên: tiến trình bị dừng giữa chừng không để lại manifest hỏng
+        fd, tmp_path = tempfile.mkstemp(dir=self.workdir, prefix=f"{MANIFEST_FILE}.", suffix=".part")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def file_path(self, name):
+        return str(self.workdir / name)
+
+    def completed_stages(self):
+        return list(self.data["stages"])
+
+    def done(self, stage):
+        """Output của stage nếu stage đã hoàn thành, ngược lại None"""
+        entry = self.data["stages"].get(stage)
+        return entry["outputs"] if entry else None
+
+    def complete(self, stage, **outputs):
+        with self._lock:
+            self.data["stages"][stage] = {"outputs": outputs, "finished": time.time()}
+            self._save()
+
+    def invalidate(self, stage):
+        """Bỏ một stage (ví dụ output của nó không còn trên đĩa)"""
+        with self._lock:
+            if self.data["stages"].pop(stage, None) is not None:
+                self._save()
+
+    def append_segment(self, item):
+        """Ghi một segment TTS đã xong vào nhật ký (mỗi dòng một JSON)"""
+        line = json.dumps(item, ensure_ascii=False)
+        with self._lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+
+    def completed_segments(self):
+        """Các segment TTS đã xong theo index, bỏ dòng ghi dở và clip không còn file"""
+        segments = {}
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    if os.path.exists(item.get("file", "")):
+                        segments[item["index"]] = item
+        except OSError:
+            pass
+        return segments
+
+    def release(self):
+        """Nhả khóa thư mục làm việc (giữ lại các stage đã xong để chạy tiếp)"""
+        self.workdir_lock.release()
+
+    def cleanup(self):
+        """Xóa thư mục làm việc sau khi pipeline xong rồi nhả khóa"""
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
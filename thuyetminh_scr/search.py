@@ -2,15 +2,15 @@ from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import torch
 from open_clip import create_model_and_transforms, get_tokenizer
-from deep_translator import GoogleTranslator
+from translator import translate_text
 
 def search_by_text(text_query, frame_paths, features, model_name="ViT-B-32", device="cuda" if torch.cuda.is_available() else "cpu"):
     # Bước 1: Dịch tiếng Việt sang tiếng Anh
-    try:
-        translated = GoogleTranslator(source='vi', target='en').translate(text_query)
+    translated = translate_text(text_query, source='vi', target='en')
+    if translated:
         print(f"[Dịch] \"{text_query}\" → \"{translated}\"")
-    except Exception as e:
-        print("Lỗi dịch tự động, dùng nguyên bản:", e)
+    else:
+        print("Lỗi dịch tự động, dùng nguyên bản")
         translated = text_query
 
     # Bước 2: Load mô hình CLIP và tokenizer
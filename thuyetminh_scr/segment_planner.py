@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Lập kế hoạch các đoạn đọc cho TTS từ segment Whisper
+Segment ngắn liền nhau được gộp (ít request TTS hơn), segment dài được tách tại ranh giới
+câu rồi dấu phẩy, cuối cùng tại khoảng trắng (clip ngắn hơn, ít chồng lên đoạn sau).
+Mỗi đoạn giữ mốc thời gian của segment gốc: đoạn gộp bắt đầu ở segment đầu tiên,
+đoạn tách lấy mốc từ timestamp của từ (nếu có) hoặc chia theo số ký tự.
+"""
+
+import os
+import re
+
+# Độ dài mong muốn của mỗi đoạn gửi TTS (ký tự)
+TARGET_CHARS = int(os.environ.get("TTS_TARGET_CHARS", "150"))
+MIN_CHARS = int(os.environ.get("TTS_MIN_CHARS", "40"))
+MAX_CHARS = int(os.environ.get("TTS_MAX_CHARS", "250"))
+# Chỉ gộp hai segment khi khoảng lặng giữa chúng ngắn (cùng một mạch nói)
+MAX_MERGE_GAP = float(os.environ.get("TTS_MAX_MERGE_GAP", "0.8"))
+
+_SENTENCE_END = re.compile(r"[.!?…][\"')\]]*$")
+_CLAUSE_END = re.compile(r"[,;:—–-]$")
+
+
+def _boundary_rank(token):
+    """0: hết câu, 1: hết vế (dấu phẩy...), 2: chỉ là khoảng trắng"""
+    if _SENTENCE_END.search(token):
+        return 0
+    if _CLAUSE_END.search(token):
+        return 1
+    return 2
+
+
+def _piece_chars(tokens, begin, end):
+    return sum(len(t) for t in tokens[begin:end]) + max(0, end - begin - 1)
+
+
+def split_tokens(tokens, target_chars=TARGET_CHARS, max_chars=MAX_CHARS):
+    """Chia list từ thành các khoảng (begin, end) dài không quá max_chars
+
+    Ưu tiên cắt sau dấu hết câu, rồi dấu phẩy, rồi khoảng trắng; trong cùng loại chọn
+    chỗ cắt gần target_chars nhất.
+    """
+    pieces = []
+    begin = 0
+    n = len(tokens)
+    while _piece_chars(tokens, begin, n) > max_chars:
+        best = None
+        for cut in range(begin + 1, n):
+            length = _piece_chars(tokens, begin, cut)
+            if length > max_chars:
+                break
+            key = (_boundary_rank(tokens[cut - 1]), abs(length - target_chars))
+            if best is None or key < best[0]:
+                best = (key, cut)
+        # Một từ dài hơn max_chars: để nguyên từ đó
+        cut = best[1] if best else begin + 1
+        pieces.append((begin, cut))
+        begin = cut
+    if begin < n:
+        pieces.append((begin, n))
+    return pieces
+
+
+def split_segment(seg, target_chars=TARGET_CHARS, max_chars=MAX_CHARS):
+    """Tách một segment dài thành các đoạn, mốc thời gian theo từ hoặc theo số ký tự"""
+    tokens = seg["text"].split()
+    pieces = split_tokens(tokens, target_chars, max_chars)
+    if len(pieces) <= 1:
+        return [seg]
+
+    words = seg.get("words") or []
+    # Timestamp của từ chỉ dùng được khi Whisper tách từ giống cách tách khoảng trắng
+    use_words = len(words) == len(tokens)
+    total = _piece_chars(tokens, 0, len(tokens)) or 1
+    duration = seg["end"] - seg["start"]
+
+    def time_at(token_index):
+        return seg["start"] + duration * _piece_chars(tokens, 0, token_index) / total
+
+    parts = []
+    for begin, end in pieces:
+        if use_words:
+            start, stop = words[begin]["start"], words[end - 1]["end"]
+        else:
+            start, stop = time_at(begin), time_at(end)
+        parts.append({"start": round(start, 3), "end": round(stop, 3),
+                      "text": " ".join(tokens[begin:end]), "sources": list(seg.get("sources", []))})
+    return parts
+
+
+def plan_segments(segments, target_chars=TARGET_CHARS, min_chars=MIN_CHARS, max_chars=MAX_CHARS,
+                  max_gap=MAX_MERGE_GAP):
+    """Gộp/tách segment Whisper thành các đoạn đọc cho TTS
+
+    Trả về list dict start, end, text, sources (id các segment gốc), theo thứ tự thời gian.
+    """
+    units = []
+    for index, seg in enumerate(segments):
+        text = " ".join(seg["text"].split())
+        if not text:
+            continue
+        unit = {"start": seg["start"], "end": seg["end"], "text": text,
+                "sources": [seg.get("id", index)]}
+        if seg.get("words"):
+            unit["words"] = seg["words"]
+        units.extend(split_segment(unit, target_chars, max_chars))
+
+    planned = []
+    for unit in units:
+        unit.pop("words", None)
+        if planned:
+            current = planned[-1]
+            merged_chars = len(current["text"]) + 1 + len(unit["text"])
+            gap = unit["start"] - current["end"]
+            # Gộp khi đoạn hiện tại còn ngắn, cả hai nằm trong cùng một mạch nói
+            # và đoạn gộp không dài quá: đoạn gộp vẫn bắt đầu ở mốc của segment đầu
+            short = len(current["text"]) < min_chars or len(unit["text"]) < min_chars
+            fits = merged_chars <= (max_chars if short else target_chars)
+            if gap <= max_gap and fits:
+                current["text"] += " " + unit["text"]
+                current["end"] = max(current["end"], unit["end"])
+                current["sources"] += [s for s in unit["sources"] if s not in current["sources"]]
+                continue
+        planned.append(unit)
+    return planned
+
+
+def plan_stats(segments, planned, min_chars=MIN_CHARS, max_chars=MAX_CHARS):
+    """Số request TTS trước/sau khi lập kế hoạch và phân bố độ dài đoạn"""
+    def lengths(items):
+        return [len(" ".join(item["text"].split())) for item in items if item["text"].strip()]
+
+    before, after = lengths(segments), lengths(planned)
+    return {
+        "segments": len(before),
+        "tts_requests": len(after),
+        "merged": sum(1 for item in planned if len(item["sources"]) > 1),
+        "split": sum(1 for count in _source_counts(planned).values() if count > 1),
+        "avg_chars_before": round(sum(before) / len(before), 1) if before else 0.0,
+        "avg_chars_after": round(sum(after) / len(after), 1) if after else 0.0,
+        "short_before": sum(1 for n in before if n < min_chars),
+        "short_after": sum(1 for n in after if n < min_chars),
+        "long_before": sum(1 for n in before if n > max_chars),
+        "long_after": sum(1 for n in after if n > max_chars),
+    }
+
+
+def _source_counts(planned):
+    counts = {}
+    for item in planned:
+        for source in item["sources"]:
+            counts[source] = counts.get(source, 0) + 1
+    return counts
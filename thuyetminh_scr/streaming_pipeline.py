@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Pipeline thuyết minh dạng luồng: tải video, decode audio, nhận dạng giọng nói và dịch/TTS
+chạy chồng lên nhau. ffmpeg đọc audio trực tiếp từ URL stream trong lúc video đang tải,
+Whisper xử lý từng cửa sổ ~30 giây và segment đã xong được đưa ngay sang dịch + TTS,
+nên thời gian hoàn thành tiến gần stage chậm nhất thay vì tổng các stage.
+"""
+
+import copy
+import json
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from audio_stream import SAMPLE_RATE, iter_audio_chunks, iter_speech_windows
+from downloader import resolve_video_info, get_stream_source, download_from_info, video_metadata
+from asr_backends import (ASR_BACKEND, ASR_LANGUAGE, asr_model_id, detect_language_with_model, get_model,
+                          transcribe_with_model)
+from pipeline_cache import pipeline_cache, video_cache_id
+from pipeline_checkpoint import WorkdirLock, workdir_for
+from segment_planner import plan_segments
+from thuyetminh_sync import (PLAN_TTS_SEGMENTS, merge_video_with_timeline, pipeline_result_key,
+                             translate_segments_to_vietnamese)
+from tts_client import AVAILABLE_VOICES, fpt_tts
+from video_manager import video_manager
+from voice_engine import generate_voice_segments_concurrently
+
+WINDOW_SECONDS = 30.0
+
+
+class StageTimer:
+    """Ghi thời điểm bắt đầu/kết thúc của từng stage để xem mức chồng lấn"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def start(self, name):
+        with self._lock:
+            self.stages.setdefault(name, [time.perf_counter(), None])
+
+    def stop(self, name):
+        with self._lock:
+            if name in self.stages:
+                self.stages[name][1] = time.perf_counter()
+
+    def summary(self):
+        """{stage: (bắt đầu sau bao nhiêu giây, thời lượng)}"""
+        now = time.perf_counter()
+        with self._lock:
+            return {name: (start - self.origin, (end or now) - start)
+                    for name, (start, end) in self.stages.items()}
+
+
+def transcribe_window(model, audio, offset, prompt=None, language="en", backend=ASR_BACKEND):
+    """Nhận dạng một cửa sổ audio, đổi timestamp sang thời gian của cả video"""
+    segments = transcribe_with_model(model, backend, audio, language, initial_prompt=prompt)
+    return [{
+        "start": seg["start"] + offset,
+        "end": seg["end"] + offset,
+        "text": seg["text"]
+    } for seg in segments if seg["text"].strip()]
+
+
+def _transcribe_stream(model, chunks, on_segments, progress, window_seconds=WINDOW_SECONDS,
+                       backend=ASR_BACKEND):
+    """Nhận dạng lần lượt các cửa sổ, progress["seconds"] là vị trí đã xử lý xong
+
+    progress["language"] chưa có thì ngôn ngữ được nhận diện trên cửa sổ đầu tiên.
+    """
+    prompt = None
+    windows = iter_speech_windows(chunks, window_seconds, start_seconds=progress["seconds"])
+    for offset, window in windows:
+        if progress.get("language") is None:
+            progress["language"] = detect_language_with_model(model, backend, window)
+            print(f"Source language: {progress['language']}")
+        segments = transcribe_window(model, window, offset, prompt,
+                                     language=progress["language"]["language"], backend=backend)
+        if segments:
+            on_segments(segments)
+            # Đưa phần cuối đoạn trước làm ngữ cảnh để câu bị cắt ngang vẫn liền mạch
+            prompt = " ".join(seg["text"] for seg in segments)[-200:]
+        progress["seconds"] = offset + len(window) / SAMPLE_RATE
+
+
+def streaming_pipeline(youtube_url, voice='giahuy', model_size="base", window_seconds=WINDOW_SECONDS,
+                       asr_backend=ASR_BACKEND, language=ASR_LANGUAGE, report=None):
+    # Kiểm tra giọng đọc hợp lệ
+    if voice not in AVAILABLE_VOICES:
+        print(f"Invalid voice: {voice}. Using default: giahuy")
+        voice = 'giahuy'
+
+    print(f"Starting streaming pipeline with voice: {voice} ({AVAILABLE_VOICES[voice]})")
+    video_key = video_cache_id(youtube_url)
+    asr_model = asr_model_id(model_size, asr_backend)
+    cache_key = pipeline_result_key(video_key, voice, asr_model, language)
+    # File trung gian nằm trong thư mục riêng, không ghi đè lần chạy khác;
+    # job cùng key chờ job đang giữ thư mục xong rồi dùng lại kết quả
+    workdir = workdir_for(f"{cache_key}_stream")
+    with WorkdirLock(workdir) as workdir_lock:
+        if workdir_lock.waited:
+            cached = video_manager.find_cached_result(cache_key)
+            if cached:
+                print(f"Cache hit after waiting ({cache_key}): {cached['id']}")
+                return cached["id"]
+        timer = StageTimer()
+
+        timer.start("resolve")
+        info = resolve_video_info(youtube_url)
+        timer.stop("resolve")
+
+        # Tải video ở luồng nền
+        download_result = {}
+
+        def download():
+            timer.start("download")
+            try:
+                # process_ie_result sửa info, luồng chính vẫn đọc info (stream URL, metadata)
+                download_result["path"] = download_from_info(copy.deepcopy(info), output_dir=str(workdir))
+            except Exception as e:
+                print(f"Download error: {e}")
+            finally:
+                timer.stop("download")
+
+        download_thread = threading.Thread(target=download, daemon=True)
+        download_thread.start()
+
+        # Dịch + TTS ở luồng nền, nhận segment theo từng nhóm
+        segment_queue = queue.Queue()
+        metadata = []
+
+        def narrate():
+            index = 0
+            while True:
+                group = segment_queue.get()
+                if group is None:
+                    break
+                timer.start("tts")
+                # Gộp/tách trong từng nhóm, nhóm sau chưa có khi nhóm trước được đọc
+                if PLAN_TTS_SEGMENTS:
+                    group = plan_segments(group)
+                metadata.extend(generate_voice_segments_concurrently(
+                    group, voice,
+                    translate=lambda texts: translate_segments_to_vietnamese(texts, source_language()),
+                    synthesize=fpt_tts,
+                    output_dir=str(workdir / "voice_segments"),
+                    index_offset=index
+                ))
+                index += len(group)
+            timer.stop("tts")
+
+        narrate_thread = threading.Thread(target=narrate, daemon=True)
+        narrate_thread.start()
+
+        segments = []
+
+        def on_segments(group):
+            segments.extend(group)
+            segment_queue.put(group)
+
+        model = get_model(model_size, asr_backend)
+        timer.start("transcribe")
+        progress = {"seconds": 0,
+                    "language": {"language": language, "forced": True} if language != "auto" else None}
+
+        def source_language():
+            # Nhóm segment đầu tiên chỉ được đưa sang sau khi đã nhận diện ngôn ngữ
+            return progress["language"]["language"]
+        stream_url, http_headers = get_stream_source(info)
+        streamed = False
+        if stream_url:
+            try:
+                print("Transcribing while downloading...")
+                chunks = iter_audio_chunks(stream_url, http_headers=http_headers)
+                _transcribe_stream(model, chunks, on_segments, progress, window_seconds, asr_backend)
+                streamed = True
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"Streaming audio failed: {e}")
+
+        if not streamed:
+            # Không đọc được stream trực tiếp: chờ file tải xong rồi đọc tiếp từ file
+            print(f"Continuing from downloaded file at {progress['seconds']:.0f}s")
+            download_thread.join()
+            if download_result.get("path"):
+                chunks = iter_audio_chunks(download_result["path"], start_seconds=progress["seconds"])
+                _transcribe_stream(model, chunks, on_segments, progress, window_seconds, asr_backend)
+        timer.stop("transcribe")
+
+        segment_queue.put(None)
+        download_thread.join()
+        narrate_thread.join()
+
+        video_path = download_result.get("path")
+        if not video_path:
+            print("Failed to download video")
+            return None
+        if not segments:
+            print("Failed to transcribe audio")
+            return None
+        if not metadata:
+            print("Failed to generate voice segments")
+            return None
+
+        # Segment được lưu để lần chạy sau (giọng khác) không phải nhận dạng lại
+        pipeline_cache.put_segments(video_key, asr_model, segments)
+        pipeline_cache.put_language(video_key, asr_model, progress["language"])
+        if report is not None:
+            translation = "skipped" if source_language() == "vi" else f"{source_language()}->vi"
+            report(language=progress["language"], translation=translation)
+        for stage in ("download", "transcribe"):
+            pipeline_cache.record(stage, misses=1)
+
+        # Thêm video gốc vào VideoManager
+        info_fields = video_metadata(info)
+        video_id = video_manager.add_video(video_path, youtube_url, title=info_fields.pop("title"),
+                                           voice=voice, move=True,
+                                           extra={"video_key": video_key, **info_fields})
+        if not video_id:
+            print("Failed to add video to manager")
+            return None
+
+        metadata.sort(key=lambda item: item["index"])
+        print("Saving metadata...")
+        with open("voice_segments_metadata.json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+        timer.start("mux")
+        total_duration = segments[-1]["end"]
+        video_path, _ = video_manager.get_video_paths(video_id)
+        timeline_stats = {}
+        final_video = merge_video_with_timeline(video_path, metadata, total_duration, output_dir=str(workdir),
+                                                stats=timeline_stats)
+        timer.stop("mux")
+        if report is not None:
+            report(overlapping_clips=timeline_stats["overlapping_clips"],
+                   overlap_seconds=timeline_stats["overlap_seconds"], slot_fit=timeline_stats.get("fit"))
+
+        # Thêm video đã thuyết minh vào VideoManager
+        success = video_manager.add_transformed_video(
+            video_id, final_video, voice, move=True,
+            extra={"cache_key": cache_key, "model_size": model_size, "asr_model": asr_model,
+                   "language": progress["language"], "timeline": timeline_stats})
+        if not success:
+            print("Failed to add transformed video to manager")
+            return None
+
+        # File kết quả đã được chuyển vào video_data/transformed
+        shutil.rmtree(workdir, ignore_errors=True)
+        _, final_video = video_manager.get_video_paths(video_id)
+
+        total = time.perf_counter() - timer.origin
+        for name, (start, duration) in timer.summary().items():
+            print(f"  {name:10s}: start +{start:6.1f}s, took {duration:6.1f}s")
+        print(f"Total {total:.1f}s")
+
+        print(f"Done! Final video with {voice} voiceover: {final_video}")
+        return video_id
@@ -8,8 +8,14 @@ import sys
 
 # Import các module cần thiết
 from downloader import download_youtube_video
-from thuyetminh_sync import pipeline, AVAILABLE_VOICES
-from video_manager import video_manager
+from tts_client import AVAILABLE_VOICES
+from video_manager import video_manager, startup as startup_video_data
+from job_queue import job_queue, format_eta, STAGE_LABELS
+from job_worker import start_worker_pool
+from media_server import get_video_url
+from translation_cache import translation_cache
+from tts_cache import tts_cache
+from pipeline_cache import pipeline_cache
 from streamlit_chatbot import StreamlitChatbot
 
 # Cấu hình trang
@@ -20,6 +26,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Đối chiếu dữ liệu video với file trên đĩa và dọn file trung gian (một lần, trước khi worker chạy)
+_report = startup_video_data()
+
+# Khởi động worker xử lý hàng đợi (một lần cho mỗi tiến trình Streamlit).
+# Worker load model Whisper sẵn nên job đầu tiên không phải chờ
+start_worker_pool()
+
 # CSS tùy chỉnh
 st.markdown("""
 <style>
@@ -76,7 +89,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Thông báo khởi động
-st.info("🚀 **Khởi động mới**: Mỗi lần chạy app sẽ xóa hết dữ liệu cũ và bắt đầu với thư mục trống!")
+if _report and _report.get("cleared"):
+    st.info("🚀 **Khởi động**: Đã xóa dữ liệu cũ (VIDEO_MANAGER_CLEAR_ON_START=1)")
+elif _report:
+    st.info(f"🚀 **Khởi động**: Giữ nguyên {_report['videos']} video đã có, "
+            f"đồng bộ với thư mục dữ liệu trong {_report['seconds']:.2f}s "
+            f"({_report['removed']} bản ghi mất file đã xóa, {_report['orphans_removed']} file thừa đã dọn)")
 
 # Sidebar
 with st.sidebar:
@@ -106,6 +124,33 @@ with st.sidebar:
         st.metric("Chưa xử lý", stats["original_only"])
         st.metric("Dung lượng (MB)", f"{stats['total_size_mb']:.1f}")
 
+    # Dung lượng không phải ghi lại nhờ đổi tên/link file thay vì copy
+    if stats["bytes_avoided_mb"]:
+        st.caption(f"Tránh copy {stats['bytes_avoided_mb']:.1f} MB video khi lưu")
+
+    # Hàng đợi xử lý
+    queue_stats = job_queue.get_stats()
+    st.metric("Hàng đợi", f"{queue_stats['running']} đang chạy / {queue_stats['queued']} chờ")
+
+    # Thống kê cache dịch
+    translation_stats = translation_cache.get_stats()
+    st.metric("Cache dịch (hit rate)", f"{translation_stats['hit_rate']:.0%}")
+    st.caption(
+        f"Tiết kiệm {translation_stats['bytes_saved'] / 1024:.1f} KB text gửi lên Google Translate")
+
+    # Thống kê cache audio TTS
+    tts_stats = tts_cache.get_stats()
+    st.metric("Cache TTS", f"{tts_stats['entries']} clip")
+    st.caption(
+        f"Tiết kiệm {tts_stats['api_calls_saved']} lượt gọi FPT.AI, {tts_stats['size_bytes'] / (1024*1024):.1f} MB")
+
+    # Thống kê cache kết quả pipeline
+    pipeline_stats = pipeline_cache.get_stats()
+    st.metric("Cache kết quả", f"{pipeline_stats['result']['hits']} video dùng lại")
+    st.caption(
+        f"Bỏ qua tải video {pipeline_stats['download']['hits']} lần, "
+        f"nhận dạng giọng nói {pipeline_stats['transcribe']['hits']} lần")
+
 # Layout chính với 2 cột
 col_main, col_chat = st.columns([2, 1])
 
@@ -146,43 +191,43 @@ with col_main:
                         st.session_state.confirm_delete = True
                         st.warning("⚠️ Nhấn lại để xác nhận xóa tất cả video!")
 
-        # Xử lý form
+        # Xử lý form: đưa job vào hàng đợi, worker chạy pipeline ở tiến trình riêng
         if submitted and youtube_url:
             if not youtube_url.startswith("https:"):
                 st.error("❌ Vui lòng nhập link YouTube hợp lệ!")
             else:
-                with st.spinner("🔄 Đang xử lý video..."):
-                    try:
-                        # Hiển thị thông tin giọng đọc được chọn
-                        st.info(
-                            f"🎭 Sử dụng giọng đọc: {AVAILABLE_VOICES[selected_voice]}")
-
-                        # Sử dụng hàm pipeline để xử lý toàn bộ quá trình
-                        st.info("🚀 Bắt đầu pipeline xử lý video...")
-
-                        # Gọi hàm pipeline từ thuyetminh_sync
-                        video_id = pipeline(youtube_url, selected_voice)
-
-                        if video_id:
-                            st.success("🎉 Hoàn thành tạo video thuyết minh!")
-                            st.balloons()
-
-                            # Hiển thị thông tin video
-                            video_info = video_manager.get_video_info(video_id)
-                            if video_info:
-                                st.info(f"📹 Video ID: {video_id}")
-                                st.info(f"📝 Tiêu đề: {video_info['title']}")
-                                st.info(
-                                    f"🎭 Giọng đọc: {AVAILABLE_VOICES.get(video_info.get('voice', 'giahuy'), 'Unknown')}")
-
-                            # Tự động refresh để hiển thị video mới
-                            st.rerun()
-                        else:
-                            st.error("❌ Lỗi trong quá trình xử lý video!")
-
-                    except Exception as e:
-                        st.error(f"❌ Lỗi: {str(e)}")
-                        st.exception(e)
+                job_id = job_queue.submit(youtube_url, selected_voice)
+                st.session_state.setdefault("job_ids", []).insert(0, job_id)
+                st.success(
+                    f"📥 Đã thêm vào hàng đợi (job {job_id}), giọng đọc: {AVAILABLE_VOICES[selected_voice]}")
+
+        # Tiến độ các job của phiên hiện tại
+        active_jobs = False
+        job_ids = st.session_state.get("job_ids", [])
+        if job_ids:
+            st.header("⏳ Tiến Độ Xử Lý")
+            for job_id in job_ids[:5]:
+                job = job_queue.get(job_id)
+                if not job:
+                    continue
+
+                if job["status"] in ("queued", "running"):
+                    active_jobs = True
+                    stage = STAGE_LABELS.get(job["stage"] or "queued", job["stage"])
+                    st.progress(job["overall_progress"], text=f"Job {job_id}: {stage}")
+                    st.caption(f"⏱️ Còn khoảng {format_eta(job['eta_seconds'])}")
+                    language = job["info"].get("language")
+                    if language:
+                        skipped = " (không cần dịch)" if job["info"].get("translation") == "skipped" else ""
+                        st.caption(f"🌐 Ngôn ngữ gốc: {language['language']}{skipped}")
+                elif job["status"] == "completed":
+                    st.success(f"🎉 Job {job_id} hoàn thành: {job['video_id']}")
+                    notified = st.session_state.setdefault("notified_jobs", set())
+                    if job_id not in notified:
+                        notified.add(job_id)
+                        st.balloons()
+                else:
+                    st.error(f"❌ Job {job_id} lỗi: {job['error']}")
 
         # Hiển thị video mới nhất
         latest_video = video_manager.get_latest_video()
@@ -215,10 +260,10 @@ with col_main:
 
             with video_tab1:
                 if latest_video["original_path"]:
-                    video_bytes = video_manager.get_video_bytes(
-                        latest_video["id"], "original")
-                    if video_bytes:
-                        st.video(video_bytes)
+                    # Trình duyệt tải video qua media server theo từng đoạn (Range),
+                    # không gửi cả file qua websocket của Streamlit
+                    if Path(latest_video["original_path"]).exists():
+                        st.video(get_video_url(latest_video["id"], "original"))
 
                         # Thông tin chi tiết video gốc
                         st.info(
@@ -232,10 +277,10 @@ with col_main:
 
             with video_tab2:
                 if latest_video.get("transformed_path"):
-                    video_bytes = video_manager.get_video_bytes(
-                        latest_video["id"], "transformed")
-                    if video_bytes:
-                        st.video(video_bytes)
+                    # Trình duyệt tải video qua media server theo từng đoạn (Range),
+                    # không gửi cả file qua websocket của Streamlit
+                    if Path(latest_video["transformed_path"]).exists():
+                        st.video(get_video_url(latest_video["id"], "transformed"))
 
                         # Thông tin chi tiết video thuyết minh
                         col1, col2, col3 = st.columns(3)
@@ -256,12 +301,9 @@ with col_main:
                                 f"📅 Hoàn thành: {latest_video['transformed_time'][:19]}")
 
                         # Nút tải xuống
-                        st.download_button(
-                            label="📥 Tải xuống video thuyết minh",
-                            data=video_bytes,
-                            file_name=f"narrated_{latest_video['title']}.mp4",
-                            mime="video/mp4"
-                        )
+                        st.link_button("📥 Tải xuống video thuyết minh",
+                                       get_video_url(latest_video["id"], "transformed", download=True,
+                                                     filename=f"narrated_{latest_video['title']}.mp4"))
                     else:
                         st.error("❌ Không thể đọc file video thuyết minh!")
                         st.info(
@@ -327,16 +369,10 @@ with col_main:
 
                         # Nút tải xuống nếu có video thuyết minh
                         if video.get("transformed_path"):
-                            video_bytes = video_manager.get_video_bytes(
-                                video["id"], "transformed")
-                            if video_bytes:
-                                st.download_button(
-                                    label="📥 Tải xuống",
-                                    data=video_bytes,
-                                    file_name=f"narrated_{video['title']}.mp4",
-                                    mime="video/mp4",
-                                    key=f"download_{i}"
-                                )
+                            if Path(video["transformed_path"]).exists():
+                                st.link_button("📥 Tải xuống",
+                                               get_video_url(video["id"], "transformed", download=True,
+                                                             filename=f"narrated_{video['title']}.mp4"))
 
 # Chatbot bên phải
 with col_chat:
@@ -355,6 +391,11 @@ st.markdown("---")
 st.markdown("""
 <div style="text-align: center; color: #666;">
     <p>🎬 AI Video Narrator - Tạo video thuyết minh tự động với AI</p>
-    <p>Mỗi lần chạy app sẽ bắt đầu với thư mục trống mới!</p>
+    <p>Video đã xử lý được giữ lại giữa các lần chạy app</p>
 </div>
 """, unsafe_allow_html=True)
+
+# Tự động cập nhật tiến độ khi còn job đang chạy
+if active_jobs:
+    time.sleep(2)
+    st.rerun()
@@ -107,7 +107,7 @@ class StreamlitChatbot:
             try:
                 from rag_engine import RAGEngine
                 from pinecone_db import PineconeDB
-                from deep_translator import GoogleTranslator
+                from translator import translate_text
 
                 # Khởi tạo RAG engine
                 rag = RAGEngine()
@@ -119,8 +119,8 @@ class StreamlitChatbot:
 
                 # Dịch sang tiếng Việt
                 response_en = result['response']
-                response_vi = GoogleTranslator(
-                    source='auto', target='vi').translate(response_en)
+                response_vi = translate_text(
+                    response_en, source='auto', target='vi') or response_en
 
                 os.chdir(original_dir)
                 return True, response_vi
@@ -1,23 +1,21 @@
-from faster_whisper import WhisperModel
-import subprocess
-import torch
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from underthesea import sent_tokenize
 import numpy as np
+from model_registry import model_registry
+from audio_stream import load_audio
 
 
-def extract_audio(video_path, audio_path="audio.wav"):
-    command = ['ffmpeg', '-y', '-i', video_path, '-vn',
-               '-acodec', 'pcm_s16le', '-ar', '16000', audio_path]
-    subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return audio_path
+def extract_audio(video_path):
+    # Giải mã audio vào bộ nhớ (float32 16 kHz), không ghi file WAV tạm
+    return load_audio(video_path)
 
 
-def transcribe_audio(audio_path, model_size='base'):
-    model = WhisperModel(
-        model_size, device="cuda" if torch.cuda.is_available() else "cpu")
-    segments, _ = model.transcribe(audio_path, beam_size=5, language="vi")
+def transcribe_audio(audio, model_size='base', language=None):
+    # language=None: faster-whisper nhận diện ngôn ngữ trên 30 giây đầu.
+    # Compute type mặc định của WhisperModel như trước, int8 chỉ dành cho ASR của pipeline thuyết minh
+    model = model_registry.get("faster-whisper", model_size, compute_type="default")
+    segments, _ = model.transcribe(audio, beam_size=5, language=language)
     full_text = " ".join([segment.text for segment in segments])
     return full_text
 
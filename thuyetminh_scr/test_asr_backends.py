@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script cho các backend nhận dạng giọng nói
+Dùng model giả lập (không cần openai-whisper/faster-whisper)
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from asr_backends import (asr_model_id, detect_language, detect_language_with_model, register_backend,
+                          segment_to_dict, transcribe_with_model)
+from benchmark_asr import word_error_rate
+from model_registry import model_registry
+
+# Cấu trúc giống faster_whisper.transcribe.Segment/Word
+Word = namedtuple("Word", "start end word probability")
+Segment = namedtuple("Segment", "id seek start end text tokens avg_logprob compression_ratio "
+                                "no_speech_prob words temperature")
+
+
+class FakeOpenAIWhisper:
+    def transcribe(self, audio, language="en", **options):
+        return {"segments": [
+            {"id": 0, "seek": 0, "start": 0.0, "end": 2.5, "text": " Hello world.", "tokens": [1, 2]},
+            {"id": 1, "seek": 0, "start": 2.5, "end": 4.0, "text": " Bye.", "tokens": [3]},
+        ]}
+
+
+class FakeFasterWhisper:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language="en", **options):
+        self.calls.append((language, options))
+        segments = (Segment(i + 1, 0, start, end, text, (i,), -0.2, 1.1, 0.01, None, 0.0)
+                    for i, (start, end, text) in enumerate([(0.0, 2.5, " Hello world."), (2.5, 4.0, " Bye.")]))
+        return segments, {"language": language}
+
+
+def test_backends_return_same_segment_format():
+    """start/end/text giống nhau giữa hai backend, id bắt đầu từ 0"""
+    print("🧪 Testing ASR backends...")
+    audio = np.zeros(16000 * 4, dtype=np.float32)
+    reference = transcribe_with_model(FakeOpenAIWhisper(), "openai-whisper", audio)
+    faster = FakeFasterWhisper()
+    segments = transcribe_with_model(faster, "faster-whisper", audio, initial_prompt="hi")
+
+    print(f"   Segments: {segments}")
+    assert faster.calls == [("en", {"initial_prompt": "hi"})]
+    assert [s["id"] for s in segments] == [0, 1]
+    for seg, ref in zip(segments, reference):
+        assert (seg["start"], seg["end"], seg["text"]) == (ref["start"], ref["end"], ref["text"])
+    assert segments[0]["tokens"] == [0]
+    assert "words" not in segments[0]
+
+
+class SlowOpenAIWhisper(FakeOpenAIWhisper):
+    """Đếm số lời gọi transcribe chạy cùng lúc trên một instance"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    def transcribe(self, audio, language="en", **options):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        self.active -= 1
+        return super().transcribe(audio, language, **options)
+
+
+def test_shared_openai_model_is_serialized():
+    """Nhiều luồng dùng chung một model openai-whisper thì chạy lần lượt"""
+    print("🧪 Testing shared model lock...")
+    model = SlowOpenAIWhisper()
+    audio = np.zeros(16000, dtype=np.float32)
+    threads = [threading.Thread(target=transcribe_with_model, args=(model, "openai-whisper", audio))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert model.max_active == 1
+
+
+def test_segment_words_converted():
+    segment = Segment(1, 0, 0.0, 1.0, " Hi there", (5, 6), -0.1, 1.0, 0.0,
+                      [Word(0.0, 0.4, " Hi", 0.9), Word(0.4, 1.0, " there", 0.8)], 0.0)
+    item = segment_to_dict(segment, 0)
+    assert item["words"] == [{"start": 0.0, "end": 0.4, "word": " Hi", "probability": 0.9},
+                             {"start": 0.4, "end": 1.0, "word": " there", "probability": 0.8}]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        transcribe_with_model(FakeOpenAIWhisper(), "no-such-backend", None)
+
+
+def test_model_id_and_default_compute_type():
+    """Key cache của openai-whisper không đổi, faster-whisper mặc định int8 trên CPU"""
+    assert asr_model_id("base", "openai-whisper") == "base"
+    assert model_registry.make_key("faster-whisper", "base", "cpu")[3] == "int8"
+    assert model_registry.make_key("faster-whisper", "base", "cuda")[3] == "int8_float16"
+    assert asr_model_id("small", "faster-whisper", "float32") == "faster-whisper-small-float32"
+
+
+class FakeLanguageModel:
+    def __init__(self, language, probability):
+        self.language, self.probability = language, probability
+        self.seen = []
+
+
+def fake_detector(model, audio):
+    model.seen.append(len(audio))
+    return model.language, model.probability
+
+
+def test_detect_language_on_first_window():
+    """Chỉ 30 giây đầu được đưa vào nhận diện, kết quả không chắc chắn dùng tiếng Anh"""
+    register_backend("fake-detect", runner=None, detector=fake_detector)
+    audio = np.zeros(16000 * 600, dtype=np.float32)
+
+    model = FakeLanguageModel("vi", 0.97)
+    result = detect_language_with_model(model, "fake-detect", audio)
+    assert model.seen == [16000 * 30]
+    assert result["language"] == "vi" and result["probability"] == 0.97
+    assert result["detect_seconds"] >= 0 and "fallback" not in result
+
+    unsure = detect_language_with_model(FakeLanguageModel("nn", 0.2), "fake-detect", audio)
+    assert unsure["language"] == "en" and unsure["detected"] == "nn" and unsure["fallback"]
+
+    # Chỉ định ngôn ngữ: không load model, không nhận diện
+    assert detect_language(audio, backend="fake-detect", language="vi") == {"language": "vi", "forced": True}
+
+
+def test_word_error_rate():
+    assert word_error_rate("Hello world, bye.", "hello world bye") == 0.0
+    assert word_error_rate("the cat sat", "the cat sat down") == 1 / 3
+    assert word_error_rate("the cat sat", "a cat") == 2 / 3
+
+
+if __name__ == "__main__":
+    test_backends_return_same_segment_format()
+    test_shared_openai_model_is_serialized()
+    test_segment_words_converted()
+    test_unknown_backend()
+    test_model_id_and_default_compute_type()
+    test_detect_language_on_first_window()
+    test_word_error_rate()
+    print("\n✅ ASR backend test completed!")
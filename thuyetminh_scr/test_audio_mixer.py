@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script cho audio_mixer (thay decode bằng clip giả; test ghép video cần ffmpeg)
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+import audio_mixer
+from audio_stream import SAMPLE_RATE, load_audio
+
+
+def run_with_fake_clips(clips, func):
+    """Thay decode_clip bằng clip tạo sẵn theo tên file"""
+    original = audio_mixer.decode_clip
+    audio_mixer.decode_clip = lambda path, sample_rate=None: clips[path]
+    try:
+        return func()
+    finally:
+        audio_mixer.decode_clip = original
+
+
+def test_clips_added_at_sample_offsets():
+    """Clip được cộng đúng vị trí, phần vượt timeline bị cắt"""
+    print("🧪 Testing timeline offsets...")
+    clips = {
+        "a.mp3": np.full(100, 0.25, dtype=np.float32),
+        "b.mp3": np.full(100, 0.5, dtype=np.float32),
+        "c.mp3": np.full(100, 0.1, dtype=np.float32),
+    }
+    metadata = [
+        {"file": "a.mp3", "start": 0.0},
+        {"file": "b.mp3", "start": 0.05},
+        {"file": "c.mp3", "start": 0.95},
+    ]
+
+    timeline, stats = run_with_fake_clips(
+        clips, lambda: audio_mixer.build_timeline(metadata, 1.0, sample_rate=1000))
+
+    assert len(timeline) == 1000
+    assert timeline.dtype == np.float32
+    assert np.allclose(timeline[:50], 0.25)
+    assert np.allclose(timeline[50:100], 0.75)
+    assert np.allclose(timeline[100:150], 0.5)
+    assert np.allclose(timeline[150:950], 0.0)
+    assert np.allclose(timeline[950:], 0.1)
+    assert stats["clipped_samples"] == 0
+    # a còn đọc 50 ms sau khi b bắt đầu
+    assert stats["overlapping_clips"] == 1
+    assert stats["overlap_seconds"] == 0.05
+
+
+def test_overlap_is_clipped():
+    """Chỗ chồng lên nhau vượt biên độ thì bị giới hạn trong [-1, 1]"""
+    print("🧪 Testing clipping protection...")
+    clips = {
+        "a.mp3": np.full(10, 0.8, dtype=np.float32),
+        "b.mp3": np.full(10, 0.8, dtype=np.float32),
+    }
+    metadata = [{"file": "a.mp3", "start": 0.0}, {"file": "b.mp3", "start": 0.005}]
+
+    timeline, stats = run_with_fake_clips(
+        clips, lambda: audio_mixer.build_timeline(metadata, 0.02, sample_rate=1000))
+
+    assert stats["clipped_samples"] == 5
+    assert timeline.max() == 1.0
+    pcm = np.frombuffer(audio_mixer.to_pcm16(timeline), dtype="<i2")
+    assert pcm.max() == 32767
+
+
+def test_time_stretch_keeps_pitch():
+    """WSOLA rút ngắn audio đúng tỉ lệ, giữ tần số và mức âm lượng"""
+    print("🧪 Testing time stretching...")
+    sample_rate = 16000
+    t = np.arange(sample_rate * 2) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+    stretched = audio_mixer.time_stretch(tone, 1.25, sample_rate)
+    assert len(stretched) == int(len(tone) / 1.25)
+    spectrum = np.abs(np.fft.rfft(stretched))
+    peak = np.fft.rfftfreq(len(stretched), 1 / sample_rate)[np.argmax(spectrum)]
+    print(f"   Peak frequency: {peak:.1f} Hz")
+    assert abs(peak - 220) < 2
+    middle = stretched[sample_rate // 4:-sample_rate // 4]
+    assert abs(np.sqrt((middle ** 2).mean()) - np.sqrt((tone ** 2).mean())) < 0.02
+
+
+def test_clips_fitted_to_slots():
+    """Clip dài hơn khoảng trống được nén (không quá max_tempo), clip cuối không bị cắt"""
+    print("🧪 Testing slot fitting...")
+    sample_rate = 8000
+    t = np.arange(sample_rate) / sample_rate
+    tone = (0.3 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+    clips = {"a.mp3": tone[:int(0.6 * sample_rate)], "b.mp3": tone[:int(0.9 * sample_rate)],
+             "c.mp3": tone[:int(0.5 * sample_rate)]}
+    # a vừa khoảng trống 1s, b cần nén 1.8 lần (vượt 1.5), c là clip cuối
+    metadata = [{"file": "a.mp3", "start": 0.0, "end": 0.6},
+                {"file": "b.mp3", "start": 1.0, "end": 1.5},
+                {"file": "c.mp3", "start": 1.5, "end": 1.8}]
+
+    timeline, stats = run_with_fake_clips(
+        clips, lambda: audio_mixer.build_timeline(metadata, 1.8, sample_rate=sample_rate, max_tempo=1.5))
+    fit = stats["fit"]
+    print(f"   Fit stats: {fit}")
+    assert fit["overflowing_before"] == 2
+    assert fit["stretched"] == 2
+    assert fit["max_tempo"] == 1.5
+    # b nén 1.5 lần còn 0.6s trong khoảng trống 0.5s, c còn 0.33s (lố dưới ngưỡng FIT_TOLERANCE)
+    assert fit["overflowing_after"] == 1
+    assert abs(fit["overflow_seconds_after"] - 0.1) < 0.01
+    assert abs(fit["overflow_seconds_before"] - 0.6) < 0.01
+    # Timeline kéo dài tới hết clip cuối thay vì cắt
+    assert len(timeline) == int(1.5 * sample_rate) + int(0.5 * sample_rate / 1.5)
+
+    # Mặc định không nén: thống kê như cũ
+    _, stats = run_with_fake_clips(clips, lambda: audio_mixer.build_timeline(metadata, 1.8, sample_rate=sample_rate))
+    assert "fit" not in stats and stats["samples"] == int(1.8 * sample_rate)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                    reason="cần ffmpeg")
+def test_mux_timeline_with_video():
+    """PCM qua stdin được ghép thành stream audio, thuyết minh ngắn hơn không cắt đuôi video"""
+    print("🧪 Testing single-pass mux...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = os.path.join(tmp_dir, "video.mp4")
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", "testsrc=size=64x64:rate=10",
+                        "-t", "2", "-c:v", "mpeg4", video_path], check=True)
+        t = np.arange(audio_mixer.MIX_SAMPLE_RATE) / audio_mixer.MIX_SAMPLE_RATE
+        timeline = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+        output_path = os.path.join(tmp_dir, "trans_video.mp4")
+        assert audio_mixer.mux_timeline_with_video(timeline, video_path, output_path) == output_path
+
+        duration = audio_mixer.probe_duration(output_path)
+        audio = load_audio(output_path)
+        print(f"   Duration: {duration:.2f}s, audio: {len(audio) / SAMPLE_RATE:.2f}s")
+        assert abs(duration - 2.0) < 0.2
+        assert abs(len(audio) / SAMPLE_RATE - 2.0) < 0.2
+        # 1 giây thuyết minh rồi im lặng tới hết video
+        assert np.abs(audio[SAMPLE_RATE // 4:SAMPLE_RATE * 3 // 4]).max() > 0.1
+        assert np.abs(audio[SAMPLE_RATE * 5 // 4:]).max() < 0.01
+
+
+def test_ffmpeg_error_is_raised():
+    """ffmpeg lỗi (kể cả đóng stdin sớm) thì báo CalledProcessError kèm stderr"""
+    command = [sys.executable, "-c",
+               "import sys; sys.stdin.buffer.read(10); sys.stderr.write('Invalid data'); sys.exit(3)"]
+    timeline = np.zeros(audio_mixer.MIX_SAMPLE_RATE * 30, dtype=np.float32)
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        audio_mixer._run_ffmpeg_with_pcm(command, timeline)
+    assert error.value.returncode == 3
+    assert "Invalid data" in error.value.stderr
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="cần ffmpeg")
+def test_mux_missing_video_fails():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with pytest.raises(subprocess.CalledProcessError):
+            audio_mixer.mux_timeline_with_video(np.zeros(1000, dtype=np.float32),
+                                                os.path.join(tmp_dir, "missing.mp4"),
+                                                os.path.join(tmp_dir, "out.mp4"))
+        assert not os.path.exists(os.path.join(tmp_dir, "out.mp4"))
+
+
+if __name__ == "__main__":
+    test_clips_added_at_sample_offsets()
+    test_overlap_is_clipped()
+    test_time_stretch_keeps_pitch()
+    test_clips_fitted_to_slots()
+    test_ffmpeg_error_is_raised()
+    print("\n✅ Audio mixer test completed!")
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import wave
+
+import numpy as np
+import pytest
+
+from audio_stream import SAMPLE_RATE, find_quiet_cut, iter_speech_windows, load_audio
+
+
+def tone(seconds, amplitude=0.5):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_find_quiet_cut_picks_silence():
+    audio = np.concatenate([tone(27), np.zeros(SAMPLE_RATE, dtype=np.float32), tone(5)])
+    cut = find_quiet_cut(audio, 30, 5)
+    assert 27 * SAMPLE_RATE <= cut <= 28 * SAMPLE_RATE
+
+
+def test_speech_windows_cover_stream_with_global_offsets():
+    audio = np.concatenate([tone(27), np.zeros(SAMPLE_RATE, dtype=np.float32), tone(40)])
+    chunks = [audio[i:i + 5 * SAMPLE_RATE] for i in range(0, len(audio), 5 * SAMPLE_RATE)]
+
+    windows = list(iter_speech_windows(chunks, window_seconds=30, search_seconds=5))
+
+    assert sum(len(w) for _, w in windows) == len(audio)
+    assert all(len(w) <= 30 * SAMPLE_RATE for _, w in windows)
+    offset = 0
+    for start, window in windows:
+        assert start == offset / SAMPLE_RATE
+        offset += len(window)
+    # Cửa sổ đầu được cắt trong khoảng lặng chứ không cắt ngang giọng nói
+    assert 27 <= windows[1][0] <= 28
+
+
+def test_speech_windows_start_offset():
+    windows = list(iter_speech_windows([tone(10)], window_seconds=30, start_seconds=42))
+    assert windows[0][0] == 42
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="cần ffmpeg")
+def test_load_audio_decodes_in_memory():
+    samples = (tone(3) * 32767).astype("<i2")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "tone.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(samples.tobytes())
+
+        audio = load_audio(path)
+        assert os.listdir(tmp_dir) == ["tone.wav"]
+
+    assert audio.dtype == np.float32
+    assert abs(len(audio) - len(samples)) <= 1
+    assert np.allclose(audio[:len(samples)], samples[:len(audio)] / 32768.0, atol=1e-3)
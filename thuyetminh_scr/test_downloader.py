@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script cho downloader: dùng info mẫu (rút gọn từ output của yt-dlp), không gọi mạng
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+import downloader
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "yt_dlp_info.json")
+
+
+def load_info():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeYoutubeDL:
+    """Thay yt_dlp.YoutubeDL: trả info mẫu, ghi file thay cho bước tải"""
+    calls = []
+
+    # Chặn bước tải video (format khác audio) cho tới khi test cho phép
+    video_gate = None
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=True):
+        self.calls.append(("extract_info", url, download))
+        return load_info()
+
+    def download(self, urls):
+        self.calls.append(("download", urls))
+
+    def process_ie_result(self, info, download=True):
+        self.calls.append(("process_ie_result", info["id"], download))
+        if self.video_gate is not None and self.opts["format"] != "140":
+            self.video_gate.wait(5)
+        with open(self.opts["outtmpl"], "wb") as f:
+            f.write(b"\0" * 16)
+        return info
+
+
+def test_video_metadata_from_fixture():
+    metadata = downloader.video_metadata(load_info())
+    assert set(metadata) == set(downloader.VIDEO_INFO_FIELDS)
+    assert metadata["youtube_id"] == "abcDEF12345"
+    assert metadata["duration"] == 754
+    assert metadata["available_formats"] == 4
+    assert metadata["formats"] == [{
+        "format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2",
+        "width": 640, "height": 360, "fps": 30, "tbr": 512.3, "filesize": 48295117,
+    }]
+    # Stream trực tiếp cho pipeline dạng luồng lấy từ cùng info
+    url, headers = downloader.get_stream_source(load_info())
+    assert url.endswith("itag=18") and "User-Agent" in headers
+
+
+def test_download_resolves_metadata_once(monkeypatch):
+    """Metadata chỉ lấy một lần, bước tải dùng lại info đã resolve"""
+    print("🧪 Testing single metadata extraction...")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    FakeYoutubeDL.calls = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path, metadata = downloader.download_video("https://youtu.be/abcDEF12345", tmp_dir)
+
+        assert os.path.basename(path) == "Intro_to_Neural_Networks__Lesson_1.mp4"
+        assert os.path.getsize(path) == 16
+        assert metadata["title"] == "Intro to Neural Networks: Lesson 1"
+        assert FakeYoutubeDL.calls == [
+            ("extract_info", "https://youtu.be/abcDEF12345", False),
+            ("process_ie_result", "abcDEF12345", True),
+        ]
+
+        FakeYoutubeDL.calls = []
+        assert downloader.download_youtube_video("https://youtu.be/abcDEF12345", tmp_dir) == path
+        assert [call[0] for call in FakeYoutubeDL.calls] == ["extract_info", "process_ie_result"]
+
+
+def test_select_audio_format():
+    info = load_info()
+    assert downloader.select_audio_format(info)["format_id"] == "140"
+    info["formats"] = [fmt for fmt in info["formats"] if fmt["vcodec"] != "none"]
+    assert downloader.select_audio_format(info) is None
+
+
+def test_audio_first_download(monkeypatch):
+    """Audio có trước khi video tải xong, metadata vẫn chỉ lấy một lần"""
+    print("🧪 Testing audio-first download...")
+    monkeypatch.setattr(downloader.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    FakeYoutubeDL.calls = []
+    FakeYoutubeDL.video_gate = threading.Event()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fetch = downloader.AudioFirstDownload("https://youtu.be/abcDEF12345", tmp_dir).start()
+            assert fetch.audio_path.endswith("Intro_to_Neural_Networks__Lesson_1.audio.m4a")
+            assert os.path.exists(fetch.audio_path)
+            assert fetch.metadata["youtube_id"] == "abcDEF12345"
+            # Video vẫn đang tải
+            assert fetch.wait_video(timeout=0.05) is None
+
+            FakeYoutubeDL.video_gate.set()
+            video_path = fetch.wait_video()
+            assert video_path.endswith("Intro_to_Neural_Networks__Lesson_1.mp4")
+            assert os.path.exists(video_path)
+            assert [call[0] for call in FakeYoutubeDL.calls].count("extract_info") == 1
+    finally:
+        FakeYoutubeDL.video_gate = None
+
+
+if __name__ == "__main__":
+    test_video_metadata_from_fixture()
+    test_select_audio_format()
+    print("\n✅ Downloader test completed!")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test script cho JobQueue (SQLite)
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from job_queue import JobQueue, DEFAULT_JOB_DB, DEFAULT_STAGE_SECONDS, format_eta
+
+
+def test_jobs_claimed_once_in_order():
+    """Nhiều worker (kết nối riêng) lấy job song song, mỗi job chỉ được nhận một lần"""
+    print("🧪 Testing concurrent claim...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "jobs.db")
+        queue = JobQueue(db_path)
+        submitted = [queue.submit(f"https://youtu.be/{i}", "giahuy") for i in range(20)]
+
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(name):
+            worker_queue = JobQueue(db_path)
+            while True:
+                job = worker_queue.claim(name)
+                if job is None:
+                    break
+                with lock:
+                    claimed.append(job["id"])
+
+        threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(claimed) == sorted(submitted)
+        assert queue.get_stats() == {"queued": 0, "running": 20, "completed": 0, "failed": 0}
+
+
+def test_claim_batch_oldest_first():
+    """Lấy nhiều job một lần theo thứ tự gửi, không lấy lại job đang chạy"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue = JobQueue(os.path.join(tmp_dir, "jobs.db"))
+        submitted = [queue.submit(f"https://youtu.be/{i}", "giahuy") for i in range(5)]
+
+        batch = queue.claim_batch("w0", 3)
+        assert [job["id"] for job in batch] == submitted[:3]
+        assert all(job["status"] == "running" and job["worker"] == "w0" for job in batch)
+        assert [job["id"] for job in queue.claim_batch("w1", 3)] == submitted[3:]
+        assert queue.claim_batch("w2", 3) == []
+        assert queue.claim("w2") is None
+
+
+def test_job_info_merged_and_migrated():
+    """Thông tin pipeline gộp dần vào job, hàng đợi cũ (chưa có cột info) được nâng cấp"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "jobs.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, youtube_url TEXT NOT NULL, voice TEXT NOT NULL, "
+                     "status TEXT NOT NULL, stage TEXT, stage_progress REAL NOT NULL DEFAULT 0, "
+                     "stage_started REAL, created REAL NOT NULL, started REAL, finished REAL, "
+                     "worker TEXT, heartbeat REAL, video_id TEXT, error TEXT)")
+        conn.execute("INSERT INTO jobs(id, youtube_url, voice, status, created) "
+                     "VALUES ('old', 'https://youtu.be/x', 'giahuy', 'completed', 1)")
+        conn.commit()
+        conn.close()
+
+        queue = JobQueue(db_path)
+        assert queue.get("old")["info"] == {}
+        job_id = queue.submit("https://youtu.be/y", "giahuy")
+        queue.set_info(job_id, language={"language": "vi", "probability": 0.98})
+        queue.set_info(job_id, translation="skipped")
+        assert queue.get(job_id)["info"] == {"language": {"language": "vi", "probability": 0.98},
+                                             "translation": "skipped"}
+
+
+def test_progress_and_eta():
+    """ETA giảm dần theo stage, thời lượng stage được lưu cho lần ước lượng sau"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue = JobQueue(os.path.join(tmp_dir, "jobs.db"))
+        job_id = queue.submit("https://youtu.be/x", "giahuy")
+        queued_eta = queue.get(job_id)["eta_seconds"]
+        assert queued_eta == sum(DEFAULT_STAGE_SECONDS.values())
+
+        queue.claim("w0")
+        queue.update_progress(job_id, "download")
+        queue.update_progress(job_id, "transcribe")
+        queue.update_progress(job_id, "tts", 0.5)
+        job = queue.get(job_id)
+        assert job["stage"] == "tts"
+        assert 0 < job["overall_progress"] < 1
+        assert job["eta_seconds"] < queued_eta
+
+        queue.complete(job_id, "video_1")
+        job = queue.get(job_id)
+        assert job["status"] == "completed"
+        assert job["overall_progress"] == 1.0
+        # download và transcribe gần như tức thì nên ước lượng lần sau giảm xuống
+        estimates = queue.stage_estimates()
+        assert estimates["download"] < DEFAULT_STAGE_SECONDS["download"]
+        assert estimates["transcribe"] < DEFAULT_STAGE_SECONDS["transcribe"]
+
+
+def test_stale_jobs_requeued():
+    """Job mất heartbeat (worker đã dừng) được đưa lại hàng đợi"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue = JobQueue(os.path.join(tmp_dir, "jobs.db"))
+        job_id = queue.submit("https://youtu.be/x", "giahuy")
+        queue.claim("w0")
+
+        assert queue.requeue_stale(max_age=60) == 0
+        time.sleep(0.05)
+        assert queue.requeue_stale(max_age=0.01) == 1
+        job = queue.get(job_id)
+        assert job["status"] == "queued"
+        assert job["worker"] is None
+        assert job["attempts"] == 1
+
+
+def test_crashing_job_fails_after_max_attempts():
+    """Job làm worker dừng nhiều lần không được chạy lại mãi"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue = JobQueue(os.path.join(tmp_dir, "jobs.db"))
+        job_id = queue.submit("https://youtu.be/x", "giahuy")
+
+        for attempt in range(1, 3):
+            assert queue.claim("w0")["attempts"] == attempt
+            time.sleep(0.02)
+            queue.requeue_stale(max_age=0.01, max_attempts=2)
+
+        job = queue.get(job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "Worker stopped during the job 2 times"
+        assert queue.claim("w1") is None
+
+
+def test_default_db_independent_of_cwd():
+    """File DB mặc định là tuyệt đối: UI và worker chạy từ thư mục khác vẫn dùng chung hàng đợi"""
+    assert os.path.isabs(DEFAULT_JOB_DB)
+
+
+def test_format_eta():
+    assert format_eta(None) == "không rõ"
+    assert format_eta(42) == "42 giây"
+    assert format_eta(200) == "3 phút 20 giây"
+
+
+if __name__ == "__main__":
+    test_jobs_claimed_once_in_order()
+    test_claim_batch_oldest_first()
+    test_job_info_merged_and_migrated()
+    test_progress_and_eta()
+    test_stale_jobs_requeued()
+    test_crashing_job_fails_after_max_attempts()
+    test_format_eta()
+    test_default_db_independent_of_cwd()
+    print("\n✅ Job queue test completed!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script cho job_worker: job lỗi, worker bị dừng giữa chừng và job được chạy lại
+Dùng pipeline giả lập (không tải video, không cần Whisper)
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import types
+
+from job_queue import JobQueue
+from job_worker import run_job, worker_loop
+
+
+def fake_pipeline_module(pipeline):
+    """Module thay cho thuyetminh_sync chỉ có hàm pipeline"""
+    module = types.ModuleType("thuyetminh_sync")
+    module.pipeline = pipeline
+    return module
+
+
+def _raise(youtube_url, voice, progress=None, report=None):
+    progress("download", 0.5)
+    raise RuntimeError("download failed")
+
+
+def _crash(youtube_url, voice, progress=None, report=None):
+    # Tiến trình worker chết giữa chừng (hết RAM, bị kill...)
+    progress("transcribe")
+    os._exit(1)
+
+
+def _crashing_worker(db_path):
+    os.environ["WHISPER_WARMUP"] = ""
+    sys.modules["thuyetminh_sync"] = fake_pipeline_module(_crash)
+    worker_loop("crashing", db_path=db_path, poll_interval=0.05, max_jobs=1)
+
+
+def test_run_job_failures(monkeypatch):
+    """Pipeline báo lỗi hoặc không trả về video thì job bị đánh dấu failed"""
+    print("🧪 Testing failed jobs...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue = JobQueue(os.path.join(tmp_dir, "jobs.db"))
+
+        monkeypatch.setitem(sys.modules, "thuyetminh_sync", fake_pipeline_module(_raise))
+        job_id = queue.submit("https://youtu.be/x", "giahuy")
+        assert run_job(queue.claim("w0"), queue) is None
+        job = queue.get(job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "download failed"
+
+        monkeypatch.setitem(sys.modules, "thuyetminh_sync",
+                            fake_pipeline_module(lambda *args, **kwargs: None))
+        job_id = queue.submit("https://youtu.be/y", "giahuy")
+        run_job(queue.claim("w0"), queue)
+        assert queue.get(job_id)["error"] == "Pipeline failed"
+
+
+def test_crashed_worker_job_requeued_then_failed():
+    """Worker chết giữa job: job được đưa lại hàng đợi, quá số lần thử thì failed"""
+    print("🧪 Testing worker crash...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "jobs.db")
+        queue = JobQueue(db_path)
+        job_id = queue.submit("https://youtu.be/x", "giahuy")
+        context = multiprocessing.get_context("spawn")
+
+        for attempt in range(1, 3):
+            process = context.Process(target=_crashing_worker, args=(db_path,))
+            process.start()
+            process.join(60)
+            assert process.exitcode == 1
+
+            job = queue.get(job_id)
+            print(f"   Attempt {attempt}: {job['status']} at {job['stage']}")
+            assert job["status"] == "running"
+            assert job["stage"] == "transcribe"
+            assert job["attempts"] == attempt
+
+            time.sleep(0.02)
+            queue.requeue_stale(max_age=0.01, max_attempts=2)
+
+        job = queue.get(job_id)
+        assert job["status"] == "failed"
+        assert "2 times" in job["error"]
+
+
+if __name__ == "__main__":
+    test_crashed_worker_job_requeued_then_failed()
+    print("\n✅ Job worker test completed!")
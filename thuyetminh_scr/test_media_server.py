@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script cho media server (Range request)
+"""
+
+import os
+import tempfile
+import urllib.error
+import urllib.request
+
+import pytest
+
+from media_server import MediaServer, parse_range
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    # Nhiều khoảng không hỗ trợ: phát cả file
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def request(url, headers=None, method="GET"):
+    req = urllib.request.Request(url, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), b""
+
+
+def test_serves_ranges_from_managed_files():
+    """Server trả 206 đúng đoạn được yêu cầu, 404 với video không có trong hệ thống"""
+    print("🧪 Testing media server...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data = os.urandom(300_000)
+        path = os.path.join(tmp_dir, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        def resolver(video_id, video_type):
+            return path if (video_id, video_type) == ("video_1", "transformed") else None
+
+        server = MediaServer("127.0.0.1", 0, resolver=resolver).start()
+        try:
+            url = server.url_for("video_1", "transformed")
+
+            status, headers, body = request(url)
+            assert status == 200 and body == data
+            assert headers["Accept-Ranges"] == "bytes"
+
+            status, headers, body = request(url, {"Range": "bytes=1000-1999"})
+            assert status == 206 and body == data[1000:2000]
+            assert headers["Content-Range"] == f"bytes 1000-1999/{len(data)}"
+
+            status, _, body = request(url, {"Range": "bytes=-500"})
+            assert status == 206 and body == data[-500:]
+
+            status, headers, _ = request(url, {"Range": f"bytes={len(data)}-"})
+            assert status == 416
+            assert headers["Content-Range"] == f"bytes */{len(data)}"
+
+            status, headers, body = request(url, method="HEAD")
+            assert status == 200 and body == b""
+            assert headers["Content-Length"] == str(len(data))
+
+            download_url = server.url_for("video_1", "transformed", download=True,
+                                          filename="narrated_Bài học.mp4")
+            status, headers, _ = request(download_url, {"Range": "bytes=0-0"})
+            assert "attachment" in headers["Content-Disposition"]
+            assert "narrated_B%C3%A0i%20h%E1%BB%8Dc.mp4" in headers["Content-Disposition"]
+
+            assert request(server.url_for("video_2", "transformed"))[0] == 404
+            assert request(server.base_url + "/../video.mp4")[0] == 404
+
+            print(f"   Stats: {server.stats}")
+            assert server.stats["range_requests"] == 3
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    test_parse_range()
+    test_serves_ranges_from_managed_files()
+    print("\n✅ Media server test completed!")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script cho ModelRegistry (không cần tải model Whisper thật)
+"""
+
+import gc
+import threading
+import time
+
+from model_registry import ModelRegistry, parse_warmup_spec
+
+
+class FakeModel:
+    pass
+
+
+def make_registry(memory_budget_mb=1000):
+    """Tạo registry với loader giả để đếm số lần load"""
+    registry = ModelRegistry(memory_budget_mb=memory_budget_mb)
+    calls = []
+
+    def fake_loader(model_size, device, compute_type):
+        calls.append((model_size, device, compute_type))
+        time.sleep(0.01)
+        return FakeModel()
+
+    registry.register_loader("fake", fake_loader)
+    return registry, calls
+
+
+def test_lazy_load_and_hits():
+    """Model chỉ được load một lần, các lần sau là hit"""
+    print("🧪 Testing lazy load...")
+    registry, calls = make_registry()
+
+    first = registry.get("fake", "base", device="cpu", compute_type="float32")
+    second = registry.get("fake", "base", device="cpu", compute_type="float32")
+
+    assert first is second
+    assert len(calls) == 1
+
+    stats = registry.get_stats()
+    print(f"   Stats: {stats}")
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["loads"] == 1
+    assert stats["load_time_total"] > 0
+
+
+def test_lru_eviction_by_memory_budget():
+    """Vượt ngân sách bộ nhớ thì model ít dùng nhất bị loại"""
+    print("🧪 Testing LRU eviction...")
+    # tiny float32 ~ 156 MB, base float32 ~ 296 MB, base int8 ~ 74 MB
+    registry, calls = make_registry(memory_budget_mb=500)
+
+    registry.get("fake", "tiny", device="cpu", compute_type="float32")
+    registry.get("fake", "base", device="cpu", compute_type="float32")
+    registry.get("fake", "tiny", device="cpu", compute_type="float32")
+    registry.get("fake", "base", device="cpu", compute_type="int8")
+
+    stats = registry.get_stats()
+    print(f"   Loaded: {stats['loaded_models']}")
+    assert stats["evictions"] == 1
+    assert "fake/base/cpu/float32" not in stats["loaded_models"]
+    assert "fake/tiny/cpu/float32" in stats["loaded_models"]
+    assert stats["memory_used_mb"] <= 500
+
+
+def test_concurrent_get_loads_once():
+    """Nhiều luồng cùng lấy một model thì chỉ load một lần"""
+    print("🧪 Testing concurrent get...")
+    registry, calls = make_registry()
+
+    threads = [
+        threading.Thread(target=registry.get, args=("fake", "small"),
+                         kwargs={"device": "cpu", "compute_type": "int8"})
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert registry.get_stats()["hits"] == 7
+
+
+def test_warm_up():
+    """Warm-up load sẵn model theo spec"""
+    print("🧪 Testing warm-up...")
+    registry, calls = make_registry()
+
+    specs = parse_warmup_spec("fake:base:cpu:float32, fake:tiny:cpu")
+    assert specs[1] == {"backend": "fake", "model_size": "tiny", "device": "cpu"}
+
+    registry.warm_up(specs)
+    assert len(calls) == 2
+
+    thread = registry.warm_up(specs, background=True)
+    thread.join()
+    assert registry.warm_up(specs, background=True) is None
+    assert len(calls) == 2
+
+
+def test_lock_for_model():
+    """Mỗi model một lock, model bị loại vẫn giữ lock cũ cho luồng đang dùng"""
+    print("🧪 Testing model locks...")
+    registry, _ = make_registry()
+    model = registry.get("fake", "base", device="cpu", compute_type="int8")
+    other = registry.get("fake", "tiny", device="cpu", compute_type="int8")
+
+    lock = registry.lock_for(model)
+    assert registry.lock_for(model) is lock
+    assert registry.lock_for(other) is not lock
+
+    assert registry.evict("fake", "base", device="cpu", compute_type="int8")
+    assert registry.lock_for(model) is lock
+    # Model bị loại đã được giải phóng thì lock của nó cũng được bỏ
+    del model
+    gc.collect()
+    assert len(registry._orphan_locks) == 0
+
+
+if __name__ == "__main__":
+    test_lazy_load_and_hits()
+    test_lru_eviction_by_memory_budget()
+    test_concurrent_get_loads_once()
+    test_warm_up()
+    test_lock_for_model()
+    print("\n✅ ModelRegistry test completed!")
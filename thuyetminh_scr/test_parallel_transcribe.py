@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script cho nhận dạng song song: cắt audio tại khoảng lặng và ghép timestamp
+Dùng model giả lập (không cần Whisper)
+"""
+
+import numpy as np
+
+from audio_stream import SAMPLE_RATE
+from parallel_transcribe import ParallelTranscriber, split_on_silence, stitch_segments
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def make_lecture():
+    # 3 câu, một khoảng lặng dài không có tiếng nói ở giữa
+    return np.concatenate([silence(2), tone(8), silence(1), tone(7), silence(15), tone(9), silence(1)])
+
+
+class FakeModel:
+    """Trả một segment phủ phần có tiếng nói của đoạn audio"""
+
+    def transcribe(self, audio, language="en", **options):
+        voiced = np.flatnonzero(np.abs(audio) > 0.01)
+        start, end = voiced[0] / SAMPLE_RATE, voiced[-1] / SAMPLE_RATE
+        return {"segments": [{"id": 0, "seek": 0, "start": start, "end": end,
+                              "text": f"{end - start:.0f}s", "words": [{"word": "x", "start": start, "end": end}]}]}
+
+
+def load_fake_model(model_size):
+    return FakeModel()
+
+
+def test_split_on_silence_cuts_in_pauses_and_skips_silence():
+    audio = make_lecture()
+    chunks = split_on_silence(audio, target_seconds=12)
+
+    assert len(chunks) == 3
+    for start, end in chunks:
+        assert end - start <= 12 * SAMPLE_RATE
+    # Cắt trong khoảng lặng 1 giây sau câu đầu, bỏ khoảng lặng 15 giây
+    assert 10 * SAMPLE_RATE <= chunks[0][1] <= 11 * SAMPLE_RATE
+    assert chunks[1][1] <= 21 * SAMPLE_RATE
+    assert chunks[2][0] >= 32 * SAMPLE_RATE
+    assert sum(end - start for start, end in chunks) < len(audio) * 0.7
+
+
+def test_split_without_pauses_still_bounded():
+    chunks = split_on_silence(tone(50), target_seconds=20)
+    assert chunks[0][0] == 0 and chunks[-1][1] == 50 * SAMPLE_RATE
+    assert all(end - start <= 20 * SAMPLE_RATE for start, end in chunks)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+
+
+def test_stitch_segments_global_timestamps():
+    stitched = stitch_segments([
+        (0.0, [{"id": 0, "seek": 0, "start": 0.5, "end": 2.0, "text": "a"}]),
+        (30.0, [{"id": 0, "seek": 0, "start": 1.0, "end": 3.5, "text": "b"},
+                {"id": 1, "seek": 0, "start": 3.5, "end": 4.0, "text": "c"}]),
+    ])
+    assert [s["id"] for s in stitched] == [0, 1, 2]
+    assert [(s["start"], s["end"]) for s in stitched] == [(0.5, 2.0), (31.0, 33.5), (33.5, 34.0)]
+    assert stitched[1]["seek"] == 3000
+
+
+def test_process_pool_transcription():
+    """Các đoạn chạy trên pool tiến trình, segment trả về theo thứ tự với timestamp toàn cục"""
+    print("🧪 Testing parallel transcription...")
+    transcriber = ParallelTranscriber(workers=2, chunk_seconds=12, loader=load_fake_model)
+    try:
+        segments = transcriber.transcribe(make_lecture())
+    finally:
+        transcriber.shutdown()
+
+    print(f"   Segments: {[(s['start'], s['end']) for s in segments]}")
+    expected = [(2, 10), (11, 18), (33, 42)]
+    assert len(segments) == len(expected)
+    for seg, (start, end) in zip(segments, expected):
+        assert abs(seg["start"] - start) < 0.05 and abs(seg["end"] - end) < 0.05
+        assert seg["words"][0]["start"] == seg["start"]
+
+
+if __name__ == "__main__":
+    test_split_on_silence_cuts_in_pauses_and_skips_silence()
+    test_split_without_pauses_still_bounded()
+    test_stitch_segments_global_timestamps()
+    test_process_pool_transcription()
+    print("\n✅ Parallel transcription test completed!")
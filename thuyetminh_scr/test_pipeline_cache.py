@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script cho PipelineCache (cache kết quả pipeline)
+"""
+
+import os
+import tempfile
+
+from pipeline_cache import DEFAULT_CACHE_DIR, PipelineCache, canonical_video_id, result_key, video_cache_id
+
+
+def test_canonical_video_id():
+    """Các dạng URL của cùng một video cho cùng một ID"""
+    for url in ("https://www.youtube.com/watch?v=HaRPzQdunww",
+                "https://youtu.be/HaRPzQdunww?si=D9QRVCQC8lfY-JPO",
+                "https://m.youtube.com/watch?feature=share&v=HaRPzQdunww&t=30",
+                "https://www.youtube.com/shorts/HaRPzQdunww",
+                "https://www.youtube.com/embed/HaRPzQdunww"):
+        assert canonical_video_id(url) == "HaRPzQdunww", url
+
+    assert canonical_video_id("https://www.youtube.com/watch?v=short") is None
+    assert canonical_video_id("https://example.com/video.mp4") is None
+    # Nguồn khác dùng hash của URL
+    assert video_cache_id("https://example.com/video.mp4").startswith("url_")
+    assert result_key("HaRPzQdunww", "giahuy", "base") != result_key("HaRPzQdunww", "ngoclam", "base")
+
+
+def test_result_key_settings():
+    """Tùy chọn làm đổi video kết quả nằm trong cache key"""
+    key = result_key("HaRPzQdunww", "giahuy", "base", language="auto")
+    assert key == result_key("HaRPzQdunww", "giahuy", "base", language="auto")
+    assert key != result_key("HaRPzQdunww", "giahuy", "base", language="en")
+    assert key != result_key("HaRPzQdunww", "giahuy", "base", version="0", language="auto")
+    assert result_key("HaRPzQdunww", "giahuy", "base", b=1, a=2) == \
+        result_key("HaRPzQdunww", "giahuy", "base", a=2, b=1)
+
+
+def test_default_dir_independent_of_cwd():
+    """Thư mục mặc định là tuyệt đối, chatbot chạy từ thư mục khác vẫn dùng chung cache"""
+    assert os.path.isabs(DEFAULT_CACHE_DIR)
+
+
+def test_artifacts_and_stage_stats():
+    """Segment được lưu theo video, thống kê hit/miss cộng dồn giữa các instance"""
+    print("🧪 Testing pipeline cache...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = PipelineCache(os.path.join(tmp_dir, "cache"))
+        assert cache.get_segments("vid", "base") is None
+
+        segments = [{"start": 0.0, "end": 1.5, "text": "Hello", "tokens": [1, 2]}]
+        cache.put_segments("vid", "base", segments)
+        assert cache.get_segments("vid", "base") == segments
+        # Model khác phải nhận dạng lại
+        assert cache.get_segments("vid", "small") is None
+
+        assert cache.get_language("vid", "base") is None
+        cache.put_language("vid", "base", {"language": "vi", "probability": 0.9})
+        assert cache.get_language("vid", "base")["language"] == "vi"
+
+        cache.record("result", misses=1)
+        cache.record("transcribe", hits=1)
+        cache.record("tts", hits=30, misses=10)
+
+        reopened = PipelineCache(os.path.join(tmp_dir, "cache"))
+        stats = reopened.get_stats()
+        print(f"   Stats: {stats}")
+        assert stats["result"] == {"hits": 0, "misses": 1, "hit_rate": 0.0}
+        assert stats["transcribe"]["hits"] == 1
+        assert stats["tts"]["hit_rate"] == 0.75
+        assert stats["download"]["hits"] == 0
+        cache._conn.close()
+        reopened._conn.close()
+
+
+def test_video_manager_finds_cached_result(monkeypatch):
+    """Tra kết quả theo cache key, bỏ qua bản ghi mất file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.chdir(tmp_dir)
+        monkeypatch.setenv("VIDEO_MANAGER_CLEAR_ON_START", "0")
+        from video_manager import VideoManager
+
+        source = os.path.join(tmp_dir, "source.mp4")
+        with open(source, "wb") as f:
+            f.write(b"\0" * 1024)
+
+        manager = VideoManager(base_dir=os.path.join(tmp_dir, "data"))
+        key = result_key("HaRPzQdunww", "giahuy", "base")
+        assert manager.find_cached_result(key) is None
+
+        video_id = manager.add_video(source, "https://youtu.be/HaRPzQdunww", voice="giahuy",
+                                     extra={"video_key": "HaRPzQdunww"})
+        assert manager.find_original("HaRPzQdunww")["id"] == video_id
+        # Chưa thuyết minh xong thì chưa phải kết quả
+        assert manager.find_cached_result(key) is None
+
+        assert manager.add_transformed_video(video_id, source, "giahuy", extra={"cache_key": key})
+        assert manager.find_cached_result(key)["id"] == video_id
+        assert manager.find_cached_result(result_key("HaRPzQdunww", "ngoclam", "base")) is None
+
+        _, transformed_path = manager.get_video_paths(video_id)
+        os.remove(transformed_path)
+        assert manager.find_cached_result(key) is None
+        manager.store.close()
+
+
+if __name__ == "__main__":
+    test_canonical_video_id()
+    test_result_key_settings()
+    test_default_dir_independent_of_cwd()
+    test_artifacts_and_stage_stats()
+    print("\n✅ Pipeline cache test completed!")
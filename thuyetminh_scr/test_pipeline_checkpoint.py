@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script cho StageManifest (checkpoint pipeline)
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from pipeline_checkpoint import StageManifest, workdir_for
+
+PARAMS = {"video_key": "HaRPzQdunww", "voice": "giahuy", "model_size": "base", "version": "1"}
+
+
+def test_workdir_for_key():
+    assert workdir_for("HaRPzQdunww:giahuy:base:v1", root="work") == \
+        workdir_for("HaRPzQdunww:giahuy:base:v1", root="work")
+    assert os.sep not in workdir_for("a/../b:c", root="work").name
+    # Mặc định tính từ thư mục mã nguồn, đổi cwd vẫn là thư mục video_manager dọn dẹp
+    assert workdir_for("HaRPzQdunww").is_absolute()
+
+
+def test_stages_survive_restart():
+    """Stage đã xong được đọc lại sau khi tiến trình dừng, params khác thì bắt đầu lại"""
+    print("🧪 Testing stage manifest...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = os.path.join(tmp_dir, "job")
+        manifest = StageManifest(workdir, PARAMS)
+        assert manifest.completed_stages() == []
+        manifest.complete("download", video_id="video_1")
+        manifest.complete("extract", audio_path="audio.wav")
+        manifest.release()
+
+        with StageManifest(workdir, PARAMS) as resumed:
+            assert resumed.completed_stages() == ["download", "extract"]
+            assert resumed.done("download") == {"video_id": "video_1"}
+            assert resumed.done("tts") is None
+            resumed.invalidate("extract")
+        with StageManifest(workdir, PARAMS) as resumed:
+            assert resumed.completed_stages() == ["download"]
+
+        with StageManifest(workdir, {**PARAMS, "model_size": "small"}) as changed:
+            assert changed.completed_stages() == []
+
+
+def test_segment_journal_resume():
+    """Nhật ký TTS bỏ qua dòng ghi dở và clip đã mất file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manifest = StageManifest(os.path.join(tmp_dir, "job"), PARAMS)
+        for index in range(3):
+            clip = manifest.file_path(f"voice_{index}.mp3")
+            with open(clip, "wb") as f:
+                f.write(b"ID3")
+            manifest.append_segment({"index": index, "file": clip, "text": f"câu {index}"})
+        os.remove(manifest.file_path("voice_1.mp3"))
+        # Tiến trình bị dừng khi đang ghi dòng cuối
+        with open(manifest.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"index": 3, "fi')
+        manifest.release()
+
+        resumed = StageManifest(os.path.join(tmp_dir, "job"), PARAMS)
+        segments = resumed.completed_segments()
+        assert sorted(segments) == [0, 2]
+        assert segments[2]["text"] == "câu 2"
+
+        resumed.cleanup()
+        assert not os.path.exists(resumed.workdir)
+
+
+def test_same_workdir_waits_for_owner():
+    """Job cùng key chờ job đang giữ thư mục, không xóa nhật ký/thư mục của nhau"""
+    print("🧪 Testing workdir lock...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = os.path.join(tmp_dir, "job")
+        owner = StageManifest(workdir, PARAMS)
+        owner.append_segment({"index": 0, "file": owner.file_path("voice_0.mp3")})
+        events = []
+
+        def second_job():
+            with StageManifest(workdir, {**PARAMS, "voice": "banmai"}) as manifest:
+                events.append(("acquired", manifest.waited, os.path.exists(manifest.journal_path)))
+
+        thread = threading.Thread(target=second_job)
+        thread.start()
+        time.sleep(0.3)
+        assert events == []
+        # Job đầu vẫn ghi được manifest/nhật ký của mình trong lúc job sau chờ
+        owner.complete("download", video_id="video_1")
+        assert os.path.exists(owner.journal_path)
+        owner.cleanup()
+        thread.join(10)
+        # Job sau nhận thư mục mới (thư mục cũ đã bị xóa khi job đầu xong)
+        assert events == [("acquired", True, False)]
+
+
+def test_manifest_writes_leave_no_temp_files():
+    """Manifest ghi qua file tạm tên riêng, không để lại file .part"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with StageManifest(os.path.join(tmp_dir, "job"), PARAMS) as manifest:
+            threads = [threading.Thread(target=manifest.complete, args=(f"stage_{i}",))
+                       for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(manifest.completed_stages()) == 8
+            assert not [name for name in os.listdir(manifest.workdir) if name.endswith(".part")]
+
+
+if __name__ == "__main__":
+    test_workdir_for_key()
+    test_stages_survive_restart()
+    test_segment_journal_resume()
+    test_same_workdir_waits_for_owner()
+    test_manifest_writes_leave_no_temp_files()
+    print("\n✅ Pipeline checkpoint test completed!")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script cho segment_planner (gộp/tách segment trước TTS)
+"""
+
+from segment_planner import plan_segments, plan_stats, split_tokens
+
+LONG_TEXT = ("The first sentence explains the topic in some detail. "
+             "The second one adds an example, a counter-example, and a short remark. "
+             "Then a third sentence closes the paragraph with a summary of the idea. "
+             "Finally a fourth sentence moves on to the next part of the lecture.")
+
+
+def make_segments():
+    return [
+        {"id": 0, "start": 0.0, "end": 0.6, "text": " Okay."},
+        {"id": 1, "start": 0.7, "end": 1.5, "text": " So today"},
+        {"id": 2, "start": 1.6, "end": 4.0, "text": " we look at speech synthesis."},
+        # Khoảng lặng dài: không gộp qua
+        {"id": 3, "start": 9.0, "end": 9.5, "text": " Right."},
+        {"id": 4, "start": 12.0, "end": 30.0, "text": " " + LONG_TEXT},
+    ]
+
+
+def test_merge_short_and_split_long():
+    print("🧪 Testing segment planner...")
+    segments = make_segments()
+    planned = plan_segments(segments, target_chars=80, min_chars=20, max_chars=120)
+    for item in planned:
+        print(f"   {item['start']:5.2f}-{item['end']:5.2f} {item['sources']} {item['text']}")
+
+    # Ba segment đầu gộp thành một, giữ mốc bắt đầu của segment đầu tiên
+    assert planned[0]["sources"] == [0, 1, 2]
+    assert (planned[0]["start"], planned[0]["end"]) == (0.0, 4.0)
+    assert planned[0]["text"] == "Okay. So today we look at speech synthesis."
+    assert planned[1]["sources"] == [3] and planned[1]["start"] == 9.0
+
+    # Segment dài tách tại dấu chấm, các đoạn nối liền nhau trong khoảng thời gian gốc
+    parts = [item for item in planned if item["sources"] == [4]]
+    assert len(parts) >= 3
+    assert all(len(item["text"]) <= 120 for item in parts)
+    assert all(item["text"].endswith(".") for item in parts)
+    assert parts[0]["start"] == 12.0 and parts[-1]["end"] == 30.0
+    assert all(a["end"] == b["start"] for a, b in zip(parts, parts[1:]))
+    assert " ".join(item["text"] for item in parts) == LONG_TEXT
+
+    stats = plan_stats(segments, planned, min_chars=20, max_chars=120)
+    print(f"   Stats: {stats}")
+    assert stats["segments"] == 5
+    assert stats["tts_requests"] == len(planned)
+    assert stats["merged"] == 1 and stats["split"] == 1
+    assert stats["short_before"] == 3 and stats["short_after"] == 1
+    assert stats["long_before"] == 1 and stats["long_after"] == 0
+
+
+def test_split_uses_word_timestamps():
+    words = ["One", "two", "three.", "Four", "five", "six."]
+    segment = {"id": 0, "start": 0.0, "end": 6.0, "text": " ".join(words),
+               "words": [{"word": f" {w}", "start": i * 1.0, "end": i * 1.0 + 0.5} for i, w in enumerate(words)]}
+    planned = plan_segments([segment], target_chars=12, min_chars=1, max_chars=15, max_gap=0)
+    assert [(item["start"], item["end"], item["text"]) for item in planned] == [
+        (0.0, 2.5, "One two three."), (3.0, 5.5, "Four five six.")]
+
+
+def test_split_tokens_prefers_clause_then_space():
+    tokens = "alpha beta, gamma delta epsilon zeta".split()
+    assert split_tokens(tokens, target_chars=20, max_chars=25)[0] == (0, 2)
+    # Không có dấu câu: cắt tại khoảng trắng gần độ dài mong muốn
+    assert split_tokens(["x" * 4] * 10, target_chars=9, max_chars=12)[0] == (0, 2)
+    # Từ dài hơn giới hạn vẫn được giữ nguyên
+    assert split_tokens(["y" * 30, "z"], target_chars=5, max_chars=10) == [(0, 1), (1, 2)]
+
+
+if __name__ == "__main__":
+    test_merge_short_and_split_long()
+    test_split_uses_word_timestamps()
+    test_split_tokens_prefers_clause_then_space()
+    print("\n✅ Segment planner test completed!")
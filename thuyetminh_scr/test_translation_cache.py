@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script cho TranslationCache (SQLite)
+"""
+
+import os
+import tempfile
+
+from translation_cache import DEFAULT_CACHE_PATH, TranslationCache, make_key
+
+
+def test_key_normalizes_whitespace():
+    """Key không phụ thuộc khoảng trắng thừa nhưng phân biệt cặp ngôn ngữ"""
+    assert make_key("en", "vi", "Hello   world\n") == make_key("en", "vi", "Hello world")
+    assert make_key("en", "vi", "Hello") != make_key("vi", "en", "Hello")
+
+
+def test_default_path_independent_of_cwd():
+    """Đường dẫn mặc định là tuyệt đối, đổi cwd (chatbot) không tạo DB ở chỗ khác"""
+    assert os.path.isabs(DEFAULT_CACHE_PATH)
+
+
+def test_persistent_hits_and_failures_not_cached():
+    """Bản dịch lưu qua các instance, bản dịch lỗi không được lưu"""
+    print("🧪 Testing persistence...")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        db_path = os.path.join(cache_dir, "cache.db")
+        cache = TranslationCache(db_path)
+        cache.put_many([("Hello", "Xin chào"), ("Broken", None), ("Empty", "")])
+
+        reopened = TranslationCache(db_path)
+        found = reopened.get_many(["Hello", "Broken", "Empty"])
+        assert found == {0: "Xin chào"}
+
+        stats = reopened.get_stats()
+        print(f"   Stats: {stats}")
+        assert stats["entries"] == 1
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["bytes_saved"] == len("Hello")
+        cache._conn.close()
+        reopened._conn.close()
+
+
+def test_size_bounded_eviction():
+    """Vượt dung lượng thì bản dịch ít dùng nhất bị xóa trước"""
+    print("🧪 Testing eviction...")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Mỗi cặp ~ 200 byte, giới hạn ~ 1000 byte
+        cache = TranslationCache(os.path.join(cache_dir, "cache.db"), max_mb=1000 / (1024 * 1024))
+        for i in range(4):
+            cache.put_many([(f"text {i} " + "a" * 90, "b" * 100)])
+        cache.get_many(["text 0 " + "a" * 90])
+        cache.put_many([("text 4 " + "a" * 90, "b" * 100), ("text 5 " + "a" * 90, "b" * 100)])
+
+        stats = cache.get_stats()
+        print(f"   Entries after eviction: {stats['entries']}, size: {stats['size_bytes']}")
+        assert stats["size_bytes"] <= 1000
+        assert 0 in cache.get_many(["text 0 " + "a" * 90])
+        assert cache.get_many(["text 1 " + "a" * 90]) == {}
+        cache._conn.close()
+
+
+if __name__ == "__main__":
+    test_key_normalizes_whitespace()
+    test_default_path_independent_of_cwd()
+    test_persistent_hits_and_failures_not_cached()
+    test_size_bounded_eviction()
+    print("\n✅ Translation cache test completed!")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script cho lớp dịch theo lô (dùng translator giả, không gọi Google)
+"""
+
+import tempfile
+
+import translator
+from translation_cache import TranslationCache
+
+
+class FakeGoogleTranslator:
+    """Giả lập GoogleTranslator: dịch bằng cách thêm tiền tố, ghi lại từng request"""
+
+    requests = []
+    merge_lines = False
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+
+    def translate(self, text):
+        FakeGoogleTranslator.requests.append(text)
+        lines = [f"[{self.target}] {line}" for line in text.split("\n")]
+        if FakeGoogleTranslator.merge_lines and len(lines) > 1:
+            # Giả lập provider gộp hai dòng làm một
+            lines = [lines[0] + " " + lines[1]] + lines[2:]
+        return "\n".join(lines)
+
+
+def run_with_fake(func):
+    """Chạy func với translator giả và cache tạm (không đụng cache thật)"""
+    original = translator.GoogleTranslator
+    original_cache = translator.translation_cache
+    translator.GoogleTranslator = FakeGoogleTranslator
+    FakeGoogleTranslator.requests = []
+    FakeGoogleTranslator.merge_lines = False
+    with tempfile.TemporaryDirectory() as cache_dir:
+        translator.translation_cache = TranslationCache(f"{cache_dir}/cache.db")
+        try:
+            return func()
+        finally:
+            translator.GoogleTranslator = original
+            translator.translation_cache._conn.close()
+            translator.translation_cache = original_cache
+
+
+def test_batches_scale_with_size_limit():
+    """Số request tỉ lệ với số lô, kết quả tách đúng theo từng đoạn"""
+    print("🧪 Testing batch translation...")
+
+    def run():
+        texts = [f"sentence number {i}\nwith a line break" for i in range(100)]
+        texts[7] = "   "
+        results = translator.translate_batch(texts, max_chars=500)
+
+        print(f"   {len(texts)} texts -> {len(FakeGoogleTranslator.requests)} requests")
+        assert len(FakeGoogleTranslator.requests) < 15
+        assert all(len(r) <= 500 for r in FakeGoogleTranslator.requests)
+        assert results[7] == ""
+        assert results[42] == "[vi] sentence number 42 with a line break"
+        assert len(results) == 100
+
+    run_with_fake(run)
+
+
+def test_fallback_when_split_mismatches():
+    """Provider gộp dòng thì dịch lại từng đoạn"""
+    print("🧪 Testing per-item fallback...")
+
+    def run():
+        FakeGoogleTranslator.merge_lines = True
+        results = translator.translate_batch(["one", "two", "three"], target="en")
+
+        assert results == ["[en] one", "[en] two", "[en] three"]
+        # 1 request theo lô + 3 request từng đoạn
+        assert len(FakeGoogleTranslator.requests) == 4
+
+    run_with_fake(run)
+
+
+def test_repeated_texts_served_from_cache():
+    """Lần dịch thứ hai lấy từ cache, không gọi provider"""
+    print("🧪 Testing translation cache read-through...")
+
+    def run():
+        texts = ["Welcome back to the channel", "Thanks for watching"]
+        first = translator.translate_batch(texts)
+        requests_after_first = len(FakeGoogleTranslator.requests)
+
+        second = translator.translate_batch(["Welcome  back to the channel\n"] + texts[1:])
+        assert second == first
+        assert len(FakeGoogleTranslator.requests) == requests_after_first
+
+        stats = translator.translation_cache.get_stats()
+        print(f"   Cache stats: {stats}")
+        assert stats["hits"] == 2
+        assert stats["bytes_saved"] == len("Welcome back to the channel") + len("Thanks for watching")
+
+    run_with_fake(run)
+
+
+def test_plan_batches():
+    """Các lô không vượt giới hạn ký tự"""
+    items = [(i, "x" * 40) for i in range(10)]
+    batches = translator.plan_batches(items, max_chars=100)
+    assert [len(b) for b in batches] == [2, 2, 2, 2, 2]
+    assert [i for b in batches for i, _ in b] == list(range(10))
+
+
+if __name__ == "__main__":
+    test_batches_scale_with_size_limit()
+    test_fallback_when_split_mismatches()
+    test_repeated_texts_served_from_cache()
+    test_plan_batches()
+    print("\n✅ Translator test completed!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script cho TTSCache
+"""
+
+import os
+import tempfile
+import threading
+
+import pytest
+
+import tts_cache
+from tts_cache import TTSCache, link_or_copy, make_key
+
+
+def write_clip(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\x00" * size)
+    return path
+
+
+def test_key_depends_on_voice_speed_and_provider():
+    """Key thay đổi theo giọng, tốc độ và provider"""
+    base = make_key("xin chào", "giahuy", 0, "fpt")
+    assert base == make_key("xin chào ", "giahuy", 0, "fpt")
+    assert base != make_key("xin chào", "ngoclam", 0, "fpt")
+    assert base != make_key("xin chào", "giahuy", 1, "fpt")
+    assert base != make_key("xin chào", "giahuy", 0, "edge")
+
+
+def test_default_dir_independent_of_cwd():
+    """Thư mục mặc định là tuyệt đối, app và worker chạy từ thư mục khác vẫn dùng chung cache"""
+    assert os.path.isabs(tts_cache.DEFAULT_CACHE_DIR)
+
+
+def test_lru_eviction_by_size():
+    """Vượt dung lượng thì clip ít dùng nhất bị xóa cả file lẫn index"""
+    print("🧪 Testing TTS cache eviction...")
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache = TTSCache(os.path.join(work_dir, "cache"), max_mb=3000 / (1024 * 1024))
+        for i in range(3):
+            clip = write_clip(os.path.join(work_dir, f"clip_{i}.mp3"), 900)
+            cache.store(f"text {i}", "giahuy", source_file=clip)
+
+        output = os.path.join(work_dir, "out.mp3")
+        assert cache.fetch("text 0", "giahuy", output_file=output)
+
+        clip = write_clip(os.path.join(work_dir, "clip_3.mp3"), 900)
+        cache.store("text 3", "giahuy", source_file=clip)
+
+        stats = cache.get_stats()
+        print(f"   Stats: {stats}")
+        assert stats["evictions"] == 1
+        assert stats["size_bytes"] <= 3000
+        assert not cache.fetch("text 1", "giahuy", output_file=output)
+        assert cache.fetch("text 0", "giahuy", output_file=output)
+        assert len([f for f in os.listdir(cache.cache_dir) if f.endswith(".mp3")]) == 3
+        cache._conn.close()
+
+
+def test_concurrent_link_or_copy(monkeypatch):
+    """Nhiều luồng ghi cùng một clip (copy khi không hardlink được) không để lại file dở"""
+    print("🧪 Testing concurrent clip writes...")
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = [write_clip(os.path.join(work_dir, f"src_{i}.mp3"), 64 * 1024) for i in range(8)]
+        dest = os.path.join(work_dir, "out", "clip.mp3")
+        os.makedirs(os.path.dirname(dest))
+
+        def no_link(src, dst):
+            raise OSError("cross-device link")
+
+        monkeypatch.setattr(tts_cache.os, "link", no_link)
+        threads = [threading.Thread(target=link_or_copy, args=(src, dest)) for src in sources]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert os.listdir(os.path.dirname(dest)) == ["clip.mp3"]
+        assert os.path.getsize(dest) == 64 * 1024
+
+        # Lỗi khi copy: không còn file tạm
+        with pytest.raises(OSError):
+            link_or_copy(os.path.join(work_dir, "missing.mp3"), dest)
+        assert os.listdir(os.path.dirname(dest)) == ["clip.mp3"]
+
+
+if __name__ == "__main__":
+    test_key_depends_on_voice_speed_and_provider()
+    test_default_dir_independent_of_cwd()
+    test_lru_eviction_by_size()
+    print("\n✅ TTS cache test completed!")
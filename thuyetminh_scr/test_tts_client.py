@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test script cho FptTTSClient với server giả lập FPT.AI
+"""
+
+import os
+import tempfile
+
+import pytest
+import requests
+
+from test_voice_engine import start_fake_fpt_server
+from tts_cache import TTSCache
+from tts_client import FptTTSClient, TTSRequestRejected
+from voice_engine import call_with_retry
+
+
+def test_polls_until_audio_ready():
+    """Client poll lại URL async cho tới khi audio sẵn sàng"""
+    print("🧪 Testing async polling...")
+    server = start_fake_fpt_server(not_ready_polls=3)
+    client = FptTTSClient(api_url=f"http://127.0.0.1:{server.server_port}/hmi/tts/v5",
+                          poll_initial=0.01, poll_max=0.05)
+
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_file = os.path.join(output_dir, "voice.mp3")
+            assert client.synthesize("xin chào", voice="giahuy", output_file=output_file)
+
+            with open(output_file, "rb") as f:
+                assert f.read() == "ID3-giahuy-xin chào".encode("utf-8")
+            assert not os.path.exists(output_file + ".part")
+
+        stats = client.get_stats()
+        print(f"   Stats: {stats['latency']['request']}")
+        assert stats["polls"] == 4
+        assert stats["latency"]["request"]["count"] == 1
+        assert stats["latency"]["poll_wait"]["count"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_deadline_exceeded():
+    """Hết deadline thì trả về False và không để lại file"""
+    print("🧪 Testing poll deadline...")
+    server = start_fake_fpt_server(not_ready_polls=1000)
+    client = FptTTSClient(api_url=f"http://127.0.0.1:{server.server_port}/hmi/tts/v5",
+                          poll_initial=0.01, poll_max=0.02, deadline=0.2)
+
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_file = os.path.join(output_dir, "voice.mp3")
+            assert not client.synthesize("xin chào", output_file=output_file)
+            assert not os.path.exists(output_file)
+
+        stats = client.get_stats()
+        assert stats["timeouts"] == 1
+        assert stats["failures"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_error_status_fails_fast():
+    """Lỗi khác 404 khi poll dừng ngay: 403 không được thử lại, 5xx trả về False để thử lại"""
+    print("🧪 Testing poll error status...")
+    for status, retryable in ((403, False), (503, True)):
+        server = start_fake_fpt_server(not_ready_polls=1000, not_ready_status=status)
+        client = FptTTSClient(api_url=f"http://127.0.0.1:{server.server_port}/hmi/tts/v5",
+                              poll_initial=0.01, poll_max=0.02, deadline=30)
+
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                output_file = os.path.join(output_dir, "voice.mp3")
+                if retryable:
+                    assert not client.synthesize("xin chào", output_file=output_file)
+                else:
+                    with pytest.raises(TTSRequestRejected):
+                        client.synthesize("xin chào", output_file=output_file)
+                assert not os.path.exists(output_file)
+
+            stats = client.get_stats()
+            assert stats["polls"] == 1
+            assert stats["timeouts"] == 0
+            assert stats["failures"] == 1
+        finally:
+            server.shutdown()
+
+
+def test_rejected_request_not_retried():
+    """voice_engine không gửi lại request bị từ chối (401/403)"""
+    server = start_fake_fpt_server(not_ready_polls=1000, not_ready_status=401)
+    client = FptTTSClient(api_url=f"http://127.0.0.1:{server.server_port}/hmi/tts/v5",
+                          poll_initial=0.01, poll_max=0.02, deadline=30)
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_file = os.path.join(output_dir, "voice.mp3")
+            ok = call_with_retry(client.synthesize, "xin chào", output_file=output_file, retries=3, backoff=0.01)
+        assert ok is None
+        assert server.posts == 1
+    finally:
+        server.shutdown()
+
+
+class BrokenResponse:
+    """Response bị ngắt kết nối sau chunk đầu tiên"""
+
+    def iter_content(self, chunk_size):
+        yield b"ID3"
+        raise requests.ConnectionError("connection reset")
+
+    def close(self):
+        pass
+
+
+def test_failed_download_removes_part_file():
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_file = os.path.join(output_dir, "voice.mp3")
+        with pytest.raises(requests.ConnectionError):
+            FptTTSClient._stream_to_file(BrokenResponse(), output_file)
+        assert os.listdir(output_dir) == []
+
+
+def test_cached_audio_needs_no_network():
+    """Text + giọng đã tổng hợp thì lấy từ cache, không gọi API"""
+    print("🧪 Testing TTS cache...")
+    server = start_fake_fpt_server()
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            cache = TTSCache(os.path.join(work_dir, "cache"))
+            client = FptTTSClient(api_url=f"http://127.0.0.1:{server.server_port}/hmi/tts/v5",
+                                  poll_initial=0.01, cache=cache)
+
+            first = os.path.join(work_dir, "voice_0_giahuy.mp3")
+            second = os.path.join(work_dir, "voice_7_giahuy.mp3")
+            other_voice = os.path.join(work_dir, "voice_0_ngoclam.mp3")
+            assert client.synthesize("xin chào", voice="giahuy", output_file=first)
+            assert client.synthesize("xin chào", voice="giahuy", output_file=second)
+            assert client.synthesize("xin chào", voice="ngoclam", output_file=other_voice)
+
+            with open(first, "rb") as f1, open(second, "rb") as f2:
+                assert f1.read() == f2.read()
+            assert server.posts == 2
+
+            stats = cache.get_stats()
+            print(f"   Cache stats: {stats}")
+            assert stats["hits"] == 1
+            assert stats["api_calls_saved"] == 1
+            assert stats["entries"] == 2
+            cache._conn.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_polls_until_audio_ready()
+    test_deadline_exceeded()
+    test_error_status_fails_fast()
+    test_rejected_request_not_retried()
+    test_failed_download_removes_part_file()
+    test_cached_audio_needs_no_network()
+    print("\n✅ TTS client test completed!")
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Test script cho SQLiteVideoStore và VideoManager dùng SQLite
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from video_store import SQLiteVideoStore, new_ulid
+
+
+def make_record(i, status="original_only", **extra):
+    return {
+        "id": f"video_{i}",
+        "title": f"Video {i}",
+        "youtube_url": f"https://youtu.be/{i}",
+        "original_path": f"video_data/videos/video_{i}.mp4",
+        "file_size": 1000 * i,
+        "created_time": f"2025-01-{i:02d}T00:00:00",
+        "voice": "giahuy",
+        "transformed_path": None,
+        "status": status,
+        **extra,
+    }
+
+
+def test_queries_and_stats():
+    """Truy vấn latest/status/stats trả về giống cách quét dict cũ"""
+    print("🧪 Testing video store queries...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = SQLiteVideoStore(os.path.join(tmp_dir, "videos.db"))
+        store.upsert_many([make_record(i) for i in (3, 1, 2)])
+        store.upsert(make_record(2, status="completed", transformed_path="t.mp4",
+                                 transformed_size=500, transformed_time="2025-02-01T00:00:00"))
+
+        assert [v["id"] for v in store.all()] == ["video_3", "video_1", "video_2"]
+        assert store.latest()["id"] == "video_3"
+        assert [v["id"] for v in store.by_status("completed")] == ["video_2"]
+        # Record chưa thuyết minh không có các trường transformed_* như file JSON cũ
+        assert "transformed_size" not in store.get("video_1")
+        assert store.get("video_2")["transformed_size"] == 500
+
+        assert store.stats() == {
+            "total_videos": 3,
+            "completed_videos": 1,
+            "original_only": 2,
+            "total_size": 6000,
+            "transformed_size": 500,
+            # Bản ghi không có ingest_method (dữ liệu cũ) được tính là copy
+            "ingest_methods": {"copy": 4},
+            "bytes_avoided": 0,
+        }
+
+        assert store.delete("video_3")
+        assert not store.delete("video_3")
+        assert store.latest()["id"] == "video_2"
+        store.close()
+
+
+def test_extra_fields_round_trip():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = SQLiteVideoStore(os.path.join(tmp_dir, "videos.db"))
+        store.upsert(make_record(1, duration=12.5))
+        assert store.get("video_1")["duration"] == 12.5
+        store.close()
+
+
+def test_json_migrated_once():
+    """video_metadata.json cũ được nhập một lần, file JSON giữ nguyên"""
+    print("🧪 Testing JSON migration...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "video_metadata.json")
+        records = {r["id"]: r for r in (make_record(1), make_record(2))}
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(records, f)
+
+        store = SQLiteVideoStore(os.path.join(tmp_dir, "videos.db"))
+        assert store.migrate_json(json_path) == 2
+        store.delete("video_1")
+        assert store.migrate_json(json_path) == 0
+        assert [v["id"] for v in store.all()] == ["video_2"]
+        assert os.path.exists(json_path)
+        store.close()
+
+
+def test_video_manager_uses_store(monkeypatch):
+    """VideoManager giữ nguyên API công khai khi lưu bằng SQLite"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Import trong thư mục tạm để instance global không đụng dữ liệu thật
+        monkeypatch.chdir(tmp_dir)
+        monkeypatch.setenv("VIDEO_MANAGER_CLEAR_ON_START", "0")
+        from video_manager import VideoManager
+
+        source = os.path.join(tmp_dir, "source.mp4")
+        with open(source, "wb") as f:
+            f.write(b"\0" * 2048)
+
+        manager = VideoManager(base_dir=os.path.join(tmp_dir, "data"), clear_on_start=False)
+        video_id = manager.add_video(source, "https://youtu.be/x", voice="giahuy")
+        assert manager.get_video_info(video_id)["status"] == "original_only"
+        assert manager.add_transformed_video(video_id, source, "ngoclam")
+
+        reopened = VideoManager(base_dir=os.path.join(tmp_dir, "data"), clear_on_start=False)
+        info = reopened.get_video_info(video_id)
+        assert info["status"] == "completed"
+        assert info["voice"] == "ngoclam"
+        assert reopened.get_video_stats()["completed_videos"] == 1
+        assert reopened.get_video_bytes(video_id, "transformed") == b"\0" * 2048
+
+        assert reopened.delete_video(video_id)
+        assert manager.get_all_videos() == []
+        manager.store.close()
+        reopened.store.close()
+
+
+def test_original_claimed_by_one_result(monkeypatch):
+    """Bản ghi chỉ có file gốc được dùng lại cho một cache key, không thêm bản ghi trùng"""
+    print("🧪 Testing claim of downloaded originals...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.chdir(tmp_dir)
+        from video_manager import VideoManager
+
+        source = os.path.join(tmp_dir, "source.mp4")
+        with open(source, "wb") as f:
+            f.write(b"\0" * 1024)
+
+        manager = VideoManager(base_dir=os.path.join(tmp_dir, "data"))
+        # Bản ghi do prefetch_transcripts tạo (chưa có giọng đọc)
+        video_id = manager.add_video(source, "https://youtu.be/HaRPzQdunww", move=True,
+                                     extra={"video_key": "HaRPzQdunww"})
+        assert manager.claim_original("HaRPzQdunww", "key_giahuy")["id"] == video_id
+        # Cùng key (job chạy lại) nhận lại được, key khác thì không
+        assert manager.claim_original("HaRPzQdunww", "key_giahuy")["id"] == video_id
+        assert manager.claim_original("HaRPzQdunww", "key_ngoclam") is None
+        assert manager.find_cached_result("key_giahuy") is None
+
+        original_path, _ = manager.get_video_paths(video_id)
+        assert manager.add_transformed_video(video_id, original_path, "giahuy")
+        assert manager.find_cached_result("key_giahuy")["id"] == video_id
+        # Đã có kết quả thì không còn bản ghi để nhận
+        assert manager.claim_original("HaRPzQdunww", "key_giahuy") is None
+        # Mỗi video của batch chỉ có một bản ghi, không có bản ghi original_only mồ côi
+        assert len(manager.store.find_by("video_key", "HaRPzQdunww")) == 1
+        assert manager.get_video_by_status("original_only") == []
+        manager.store.close()
+
+
+def test_ingest_avoids_copies(monkeypatch):
+    """File tạm được đổi tên, file gốc được link, bytes tránh copy có trong thống kê"""
+    print("🧪 Testing zero-copy ingest...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.chdir(tmp_dir)
+        monkeypatch.setenv("VIDEO_MANAGER_CLEAR_ON_START", "0")
+        from video_manager import VideoManager, ingest_file
+
+        source = os.path.join(tmp_dir, "source.mp4")
+        transformed = os.path.join(tmp_dir, "trans_source.mp4")
+        for path in (source, transformed):
+            with open(path, "wb") as f:
+                f.write(b"\1" * 4096)
+
+        manager = VideoManager(base_dir=os.path.join(tmp_dir, "data"), clear_on_start=False)
+        video_id = manager.add_video(source, "https://youtu.be/x", voice="giahuy")
+        assert manager.add_transformed_video(video_id, transformed, "giahuy", move=True)
+
+        info = manager.get_video_info(video_id)
+        assert info["ingest_method"] in ("reflink", "hardlink")
+        assert info["transformed_ingest_method"] == "rename"
+        # File gốc vẫn còn cho các bước sau của pipeline, file tạm đã được chuyển đi
+        assert os.path.exists(source)
+        assert not os.path.exists(transformed)
+
+        stats = manager.get_video_stats()
+        assert stats["ingest_methods"]["rename"] == 1
+        assert stats["bytes_avoided_mb"] * 1024 * 1024 == 8192
+
+        # Chế độ copy giữ cách cũ
+        copied = os.path.join(tmp_dir, "copied.mp4")
+        assert ingest_file(source, copied, mode="copy") == "copy"
+        assert os.stat(copied).st_ino != os.stat(source).st_ino
+        manager.store.close()
+
+
+def test_ulid_monotonic_and_unique():
+    ids = [new_ulid() for _ in range(10000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(len(i) == 26 for i in ids)
+
+
+def _register_videos(tmp_dir, worker, count):
+    # Chạy trong tiến trình con: mỗi worker có VideoManager (kết nối SQLite) riêng
+    os.chdir(tmp_dir)
+    os.environ["VIDEO_MANAGER_CLEAR_ON_START"] = "0"
+    from video_manager import VideoManager
+
+    manager = VideoManager(base_dir=os.path.join(tmp_dir, "data"), clear_on_start=False)
+    for i in range(count):
+        source = os.path.join(tmp_dir, f"w{worker}_{i}.mp4")
+        with open(source, "wb") as f:
+            f.write(b"\0" * 1024)
+        video_id = manager.add_video(source, f"https://youtu.be/{worker}-{i}", voice="giahuy")
+        assert manager.add_transformed_video(video_id, source, "giahuy")
+    manager.store.close()
+
+
+def test_concurrent_registration_no_lost_writes():
+    """Nhiều tiến trình đăng ký video cùng lúc: không trùng ID, không mất bản ghi"""
+    print("🧪 Testing concurrent registration...")
+    workers, per_worker = 6, 25
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=_register_videos, args=(tmp_dir, w, per_worker))
+                     for w in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=120)
+            assert process.exitcode == 0
+
+        store = SQLiteVideoStore(os.path.join(tmp_dir, "data", "videos.db"))
+        videos = store.all()
+        assert len(videos) == workers * per_worker
+        assert len({v["id"] for v in videos}) == workers * per_worker
+        assert len({v["youtube_url"] for v in videos}) == workers * per_worker
+        assert all(v["status"] == "completed" for v in videos)
+        store.close()
+
+
+def test_update_keeps_other_fields():
+    """update chỉ đổi trường được truyền, giữ các trường extra đã có"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = SQLiteVideoStore(os.path.join(tmp_dir, "videos.db"))
+        store.insert(make_record(1, ingest_method="hardlink"))
+        assert store.update("video_1", {"status": "completed", "transformed_ingest_method": "rename"})
+        assert not store.update("video_9", {"status": "completed"})
+
+        record = store.get("video_1")
+        assert record["status"] == "completed"
+        assert record["ingest_method"] == "hardlink"
+        assert record["transformed_ingest_method"] == "rename"
+        assert record["title"] == "Video 1"
+        store.close()
+
+
+def test_reconcile_keeps_data_and_fixes_drift(monkeypatch):
+    """Khởi động lại không xóa dữ liệu, chỉ sửa bản ghi lệch với file trên đĩa"""
+    print("🧪 Testing startup reconcile...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.chdir(tmp_dir)
+        monkeypatch.setenv("VIDEO_MANAGER_CLEAR_ON_START", "0")
+        from video_manager import VideoManager
+
+        data_dir = os.path.join(tmp_dir, "data")
+        manager = VideoManager(base_dir=data_dir)
+        ids = []
+        for i in range(3):
+            source = os.path.join(tmp_dir, f"source_{i}.mp4")
+            with open(source, "wb") as f:
+                f.write(b"\0" * 1024)
+            video_id = manager.add_video(source, f"https://youtu.be/{i}", voice="giahuy")
+            assert manager.add_transformed_video(video_id, source, "giahuy")
+            ids.append(video_id)
+        manager.store.close()
+
+        original_0, _ = manager.get_video_paths(ids[0])
+        _, transformed_1 = manager.get_video_paths(ids[1])
+        original_2, _ = manager.get_video_paths(ids[2])
+        os.remove(original_0)
+        os.remove(transformed_1)
+        with open(original_2, "ab") as f:
+            f.write(b"\0" * 1024)
+        orphan = os.path.join(data_dir, "videos", "orphan.mp4")
+        with open(orphan, "wb") as f:
+            f.write(b"\0")
+
+        reopened = VideoManager(base_dir=data_dir)
+        # File thừa vừa tạo nằm trong thời gian chờ nên chưa bị xóa
+        assert os.path.exists(orphan)
+        assert reopened.startup_report["videos"] == 2
+        assert reopened.startup_report["removed"] == 1
+        assert reopened.startup_report["updated"] == 2
+        assert reopened.get_video_info(ids[0]) is None
+        info = reopened.get_video_info(ids[1])
+        assert info["status"] == "original_only" and info["transformed_path"] is None
+        assert reopened.get_video_info(ids[2])["file_size"] == 2048
+
+        # File thuyết minh của bản ghi đã bị xóa cũng thành file thừa
+        assert reopened.reconcile(grace_seconds=0)["orphans_removed"] == 2
+        assert not os.path.exists(orphan)
+        reopened.store.close()
+
+
+def test_startup_is_explicit(monkeypatch):
+    """Tạo VideoManager không đụng tới đĩa, startup() chạy một lần và luôn có báo cáo"""
+    print("🧪 Testing explicit startup...")
+    import video_manager as video_manager_module
+    assert os.path.isabs(video_manager_module.DEFAULT_BASE_DIR)
+    assert all(os.path.isabs(path) for path in video_manager_module.ARTIFACT_DIRS)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = os.path.join(tmp_dir, "data")
+        manager = video_manager_module.VideoManager(base_dir=data_dir, reconcile_on_start=False)
+        assert not os.path.exists(data_dir)
+        assert manager.startup_report is None
+
+        source = os.path.join(tmp_dir, "source.mp4")
+        with open(source, "wb") as f:
+            f.write(b"\0" * 1024)
+        video_id = manager.add_video(source, "https://youtu.be/x")
+        original_path, _ = manager.get_video_paths(video_id)
+
+        # VIDEO_MANAGER_CLEAR_ON_START=1: xóa sạch nhưng vẫn trả về báo cáo cho giao diện
+        monkeypatch.setattr(video_manager_module, "video_manager", manager)
+        monkeypatch.setattr(video_manager_module, "BASE_DIR", tmp_dir)
+        monkeypatch.setattr(video_manager_module, "CLEAR_ON_START", True)
+        monkeypatch.setattr(video_manager_module, "_started", False)
+        report = video_manager_module.startup()
+        assert report["cleared"] and report["videos"] == 0
+        assert not os.path.exists(original_path)
+        assert video_manager_module.gc_report is None
+        assert video_manager_module.startup() is report
+
+        assert manager.get_all_videos() == []
+        manager.store.close()
+
+
+def test_collect_garbage_by_age_and_size():
+    """Dọn file trung gian cũ nhất trước khi vượt dung lượng, bỏ qua file trong thời gian chờ"""
+    from video_manager import collect_garbage
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scratch = os.path.join(tmp_dir, "voice_segments")
+        os.makedirs(scratch)
+        paths = []
+        for i in range(4):
+            path = os.path.join(scratch, f"segment_{i}.wav")
+            with open(path, "wb") as f:
+                f.write(b"\0" * 1000)
+            paths.append(path)
+            time.sleep(0.01)
+
+        assert collect_garbage([scratch], max_mb=0)["files_removed"] == 0
+
+        report = collect_garbage([scratch], max_mb=2500 / (1024 * 1024), grace_seconds=0)
+        assert report == {"files_removed": 2, "bytes_freed": 2000, "bytes_kept": 2000}
+        assert [os.path.exists(p) for p in paths] == [False, False, True, True]
+
+        assert collect_garbage([scratch], max_age_days=0, grace_seconds=0)["files_removed"] == 2
+
+
+if __name__ == "__main__":
+    test_queries_and_stats()
+    test_extra_fields_round_trip()
+    test_json_migrated_once()
+    test_ulid_monotonic_and_unique()
+    test_concurrent_registration_no_lost_writes()
+    test_update_keeps_other_fields()
+    test_collect_garbage_by_age_and_size()
+    print("\n✅ Video store test completed!")
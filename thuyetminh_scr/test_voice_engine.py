@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test script cho engine dịch + TTS song song
+Dùng HTTP server giả lập FPT.AI chạy local, không gọi API thật
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tts_client
+from voice_engine import RateLimiter, generate_voice_segments_concurrently
+
+
+class FakeFptHandler(BaseHTTPRequestHandler):
+    """Giả lập API FPT.AI: POST trả về URL async, GET trả về file MP3"""
+
+    def do_POST(self):
+        server = self.server
+        text = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.posts += 1
+            # Lần gọi đầu tiên cho text "fail" trả về lỗi để kiểm tra retry
+            should_fail = "fail" in text.lower() and text not in server.failed
+            if should_fail:
+                server.failed.add(text)
+
+        time.sleep(0.05)
+
+        with server.lock:
+            server.in_flight -= 1
+            audio_id = len(server.audio)
+            server.audio[audio_id] = f"ID3-{self.headers['voice']}-{text}".encode("utf-8")
+
+        if should_fail:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b'{"error": 1}')
+            return
+
+        body = json.dumps({
+            "async": f"http://127.0.0.1:{server.server_port}/audio/{audio_id}.mp3",
+            "error": 0
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        audio_id = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+
+        # Giả lập audio chưa tạo xong trong `not_ready_polls` lần poll đầu
+        with self.server.lock:
+            polls = self.server.polls.get(audio_id, 0) + 1
+            self.server.polls[audio_id] = polls
+        if polls <= self.server.not_ready_polls:
+            self.send_response(self.server.not_ready_status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        data = self.server.audio[audio_id]
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_fpt_server(not_ready_polls=0, not_ready_status=404):
+    """Chạy server giả lập trong luồng nền"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFptHandler)
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.posts = 0
+    server.failed = set()
+    server.audio = {}
+    server.polls = {}
+    server.not_ready_polls = not_ready_polls
+    server.not_ready_status = not_ready_status
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_concurrent_segments_with_fake_fpt():
+    """Các segment được xử lý song song và metadata giữ đúng thứ tự"""
+    print("🧪 Testing concurrent voice segments...")
+    server = start_fake_fpt_server()
+    original_url = tts_client.FPT_TTS_URL
+    tts_client.FPT_TTS_URL = f"http://127.0.0.1:{server.server_port}/hmi/tts/v5"
+
+    segments = [
+        {"start": i * 2.0, "end": i * 2.0 + 1.5, "text": f"sentence {i}"}
+        for i in range(12)
+    ]
+    segments[3]["text"] = "fail once"
+    segments[5]["text"] = "   "
+
+    original_limiter = tts_client.fpt_client.limiter
+    original_cache = tts_client.fpt_client.cache
+    tts_client.fpt_client.limiter = RateLimiter(1000)
+    tts_client.fpt_client.cache = None
+
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            metadata = generate_voice_segments_concurrently(
+                segments, "ngoclam",
+                translate=lambda texts: [text.strip().upper() for text in texts],
+                synthesize=tts_client.fpt_tts,
+                output_dir=output_dir,
+                max_workers=6,
+                backoff=0.01
+            )
+
+            print(f"   Segments: {len(metadata)}, max in flight: {server.max_in_flight}")
+            assert [item["index"] for item in metadata] == [i for i in range(12) if i != 5]
+            assert server.max_in_flight > 1
+            # 11 segment hợp lệ + 1 lần retry
+            assert server.posts == 12
+
+            for item in metadata:
+                assert item["start"] == item["index"] * 2.0
+                with open(item["file"], "rb") as f:
+                    assert f.read() == f"ID3-ngoclam-{item['text']}".encode("utf-8")
+            assert metadata[3]["text"] == "FAIL ONCE"
+            assert not os.path.exists(os.path.join(output_dir, "voice_5_ngoclam.mp3"))
+    finally:
+        tts_client.FPT_TTS_URL = original_url
+        tts_client.fpt_client.limiter = original_limiter
+        tts_client.fpt_client.cache = original_cache
+        server.shutdown()
+
+
+def test_resume_skips_completed_segments():
+    """Segment đã xong ở lần chạy trước không được dịch/TTS lại"""
+    print("🧪 Testing voice segment resume...")
+    segments = [{"start": float(i), "end": i + 0.5, "text": f"sentence {i}"} for i in range(6)]
+    translated, synthesized, journal, reported = [], [], [], []
+
+    def translate(texts):
+        translated.extend(texts)
+        return [text.upper() for text in texts]
+
+    def synthesize(text, voice, output_file):
+        synthesized.append(text)
+        with open(output_file, "wb") as f:
+            f.write(text.encode("utf-8"))
+        return True
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        completed = {i: {"index": i, "file": os.path.join(output_dir, f"voice_{i}_giahuy.mp3"),
+                         "start": float(i), "end": i + 0.5, "text": f"SENTENCE {i}", "voice": "giahuy"}
+                     for i in (0, 1, 4)}
+        metadata = generate_voice_segments_concurrently(
+            segments, "giahuy", translate=translate, synthesize=synthesize,
+            output_dir=output_dir, max_workers=2, completed=completed,
+            on_segment=journal.append,
+            progress_callback=lambda done, total: reported.append((done, total)))
+
+    assert [item["index"] for item in metadata] == list(range(6))
+    assert translated == ["sentence 2", "sentence 3", "sentence 5"]
+    assert sorted(synthesized) == ["SENTENCE 2", "SENTENCE 3", "SENTENCE 5"]
+    assert sorted(item["index"] for item in journal) == [2, 3, 5]
+    # Tiến độ tính cả segment đã xong trước đó
+    assert reported[-1] == (6, 6)
+
+
+def test_rate_limiter():
+    """Rate limiter không cho vượt quá số lượt mỗi giây"""
+    print("🧪 Testing rate limiter...")
+    limiter = RateLimiter(20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+    print(f"   5 calls at 20/s took {elapsed:.2f}s")
+    assert elapsed >= 0.19
+
+
+if __name__ == "__main__":
+    test_concurrent_segments_with_fake_fpt()
+    test_resume_skips_completed_segments()
+    test_rate_limiter()
+    print("\n✅ Voice engine test completed!")
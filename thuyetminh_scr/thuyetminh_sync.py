@@ -1,148 +1,101 @@
 import os
+import shutil
 import subprocess
 import json
 from pytube import YouTube
 from gtts import gTTS
 import whisper
-from deep_translator import GoogleTranslator
-from pydub import AudioSegment
 import yt_dlp
 import uuid
 import pyttsx3
 import edge_tts
 import asyncio
-from downloader import download_youtube_video
+from downloader import VIDEO_INFO_FIELDS, AudioFirstDownload, download_video
 from video_manager import video_manager
-import time
-import requests
-from tqdm import tqdm
-
-
-def extract_audio(video_path, audio_dir="audio"):
-    # Tạo thư mục audio nếu chưa có
-    os.makedirs(audio_dir, exist_ok=True)
-
-    # Lấy tên file từ đường dẫn video (không kèm phần mở rộng)
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
-    audio_path = os.path.join(audio_dir, f"{base_name}.wav")
-
-    command = [
-        "ffmpeg", "-y",
-        "-i", video_path,
-        "-vn",
-        "-acodec", "pcm_s16le",
-        "-ar", "16000",
-        audio_path
-    ]
-
-    subprocess.run(command, stdout=subprocess.DEVNULL,
-                   stderr=subprocess.DEVNULL)
-    return audio_path
-
-
-def transcribe_with_timestamps(audio_path, model_size="base"):
-    model = whisper.load_model(model_size)
-    result = model.transcribe(audio_path, language="en")
-    return result["segments"]
+from asr_backends import (ASR_BACKEND, ASR_LANGUAGE, DEFAULT_LANGUAGE, asr_model_id, detect_language,
+                          transcribe as asr_transcribe)
+from tts_client import AVAILABLE_VOICES, fpt_tts, fpt_client
+from voice_engine import generate_voice_segments_concurrently, DEFAULT_MAX_WORKERS
+from translator import GOOGLE_LANGUAGE_CODES, translate_batch, translate_text
+from tts_cache import tts_cache
+from pipeline_cache import PIPELINE_VERSION, pipeline_cache, video_cache_id, result_key
+from pipeline_checkpoint import StageManifest, WorkdirLock, workdir_for
+from audio_stream import load_audio
+from parallel_transcribe import TRANSCRIBE_WORKERS, get_transcriber
+from segment_planner import MAX_CHARS, MAX_MERGE_GAP, MIN_CHARS, TARGET_CHARS, plan_segments, plan_stats
+from audio_mixer import (MAX_TEMPO, build_timeline, mix_timeline, mix_timeline_pydub,
+                         mux_audio_file_with_video, mux_timeline_with_video)
+
+# Ghép thuyết minh vào video trong một lần chạy ffmpeg (đặt 0 để dùng cách hai bước cũ)
+SINGLE_PASS_MUX = os.environ.get("NARRATOR_SINGLE_PASS_MUX", "1") != "0"
+# Tải stream audio trước để nhận dạng trong lúc video còn đang tải (đặt 0 để tải cả video trước)
+AUDIO_FIRST_DOWNLOAD = os.environ.get("NARRATOR_AUDIO_FIRST", "1") != "0"
+# Gộp segment ngắn/tách segment dài trước TTS (segment_planner), đặt 0 để đọc từng segment Whisper
+PLAN_TTS_SEGMENTS = os.environ.get("NARRATOR_PLAN_SEGMENTS", "1") != "0"
+# Chạy tải video, nhận dạng và TTS chồng lên nhau (streaming_pipeline)
+STREAMING_PIPELINE = os.environ.get("NARRATOR_STREAMING", "0") == "1"
+
+
+def extract_audio(video_path):
+    """Decode audio của video thành mảng float32 16 kHz trong bộ nhớ (không ghi WAV)"""
+    return load_audio(video_path)
+
+
+def transcribe_with_timestamps(audio, model_size="base", workers=TRANSCRIBE_WORKERS, backend=ASR_BACKEND,
+                               language=DEFAULT_LANGUAGE):
+    """Nhận dạng audio (mảng float32 hoặc đường dẫn file), trả về segment Whisper
+
+    backend: "openai-whisper" hoặc "faster-whisper" (int8), segment có cùng định dạng.
+    workers > 1: cắt audio tại khoảng lặng và nhận dạng song song trên pool tiến trình.
+    """
+    if workers > 1 and not isinstance(audio, str):
+        return get_transcriber(model_size, workers, backend).transcribe(audio, language=language)
+    return asr_transcribe(audio, model_size, backend, language=language)
 
 
 def translate_text_to_vietnamese(text):
-    try:
-        return GoogleTranslator(source="en", target="vi").translate(text)
-    except Exception as e:
-        print(f"Translation error: {e}")
+    translated = translate_text(text, source="en", target="vi")
+    if translated is None:
+        print(f"Translation error, using original text: {text}")
         return text
+    return translated
 
 
-# Danh sách giọng đọc có sẵn (chỉ 2 giọng chính)
-AVAILABLE_VOICES = {
-    "giahuy": "Giá Huy (Nam)",
-    "ngoclam": "Ngọc Lâm (Nữ)"
-}
-
-# Hàm gọi FPT.AI TTS API
+def translate_segments_to_vietnamese(texts, source="en"):
+    # Video tiếng Việt: đọc lại nguyên văn, không gọi dịch
+    if source == "vi":
+        return list(texts)
+    return translate_batch(texts, source=GOOGLE_LANGUAGE_CODES.get(source, source), target="vi")
 
 
-def fpt_tts(text, voice='giahuy', speed=0, output_file='fpt_tts.mp3'):
-    # Kiểm tra giọng đọc hợp lệ
-    if voice not in AVAILABLE_VOICES:
-        print(f"Invalid voice: {voice}. Using default: giahuy")
-        voice = 'giahuy'
-
-    api_key = "FXxgmQp6tOUAwH2vcvGccDTt32dfBl2r"
-
-    headers = {
-        "api-key": api_key,
-        "speed": str(speed),
-        "voice": voice
-    }
-
-    response = requests.post(
-        url="https://api.fpt.ai/hmi/tts/v5",
-        headers=headers,
-        data=text.encode('utf-8')
-    )
-
-    if response.status_code == 200:
-        audio_url = response.json()['async']
-        time.sleep(2)  # Giảm thời gian chờ
-        audio_data = requests.get(audio_url).content
-        with open(output_file, "wb") as f:
-            f.write(audio_data)
-        return True
-    else:
-        print(f"TTS Error: {response.text}")
-        return False
-
 # Hàm chính sinh voice từ segment + dịch
 
 
-def generate_voice_segments(segments, voice, output_dir="voice_segments"):
-    os.makedirs(output_dir, exist_ok=True)
-    metadata = []
-
+def generate_voice_segments(segments, voice, output_dir="voice_segments", max_workers=DEFAULT_MAX_WORKERS,
+                            progress_callback=None, completed=None, on_segment=None, source_language="en"):
     print(f"Using voice: {voice} ({AVAILABLE_VOICES.get(voice, 'Unknown')})")
 
-    for i, seg in enumerate(tqdm(segments, desc=f"Generating voice segments with {voice}")):
-        vi_text = translate_text_to_vietnamese(seg['text'])
-        if not vi_text or not vi_text.strip():
-            continue
-
-        voice_path = os.path.join(output_dir, f"voice_{i}_{voice}.mp3")
-
-        try:
-            ok = fpt_tts(vi_text, voice=voice, output_file=voice_path)
-            if not ok:
-                print(f"Failed to generate voice for segment {i}")
-                continue
-
-            metadata.append({
-                "file": voice_path,
-                "start": seg["start"],
-                "end": seg["end"],
-                "text": vi_text,
-                "voice": voice
-            })
-
-        except Exception as e:
-            print(f"Error TTS at segment {i}: {e}")
-
-    return metadata
+    # Dịch + TTS song song, metadata vẫn giữ thứ tự segment
+    return generate_voice_segments_concurrently(
+        segments, voice,
+        translate=lambda texts: translate_segments_to_vietnamese(texts, source_language),
+        synthesize=fpt_tts,
+        output_dir=output_dir,
+        max_workers=max_workers,
+        progress_callback=progress_callback,
+        completed=completed,
+        on_segment=on_segment
+    )
 
 
-def create_audio_timeline(metadata, total_duration, output_dir="voice_segments", output_filename="combined_voice.mp3"):
+def create_audio_timeline(metadata, total_duration, output_dir="voice_segments", output_filename="combined_voice.mp3", engine="numpy", stats=None):
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, output_filename)
 
-    timeline = AudioSegment.silent(duration=int(total_duration * 1000))
-
-    for item in metadata:
-        voice = AudioSegment.from_file(item["file"])
-        start = int(item["start"] * 1000)
-        timeline = timeline.overlay(voice, position=start)
-
-    timeline.export(output_path, format="mp3")
-    return output_path
+    # "numpy": decode mỗi clip một lần vào buffer chung, "pydub": overlay như cũ
+    if engine == "pydub":
+        return mix_timeline_pydub(metadata, total_duration, output_path)
+    return mix_timeline(metadata, total_duration, output_path, max_tempo=MAX_TEMPO, stats=stats)
 
 
 def merge_video_and_voice(video_path, voice_path, output_dir="video_transform"):
@@ -154,77 +107,396 @@ def merge_video_and_voice(video_path, voice_path, output_dir="video_transform"):
     output_path = os.path.join(output_dir, output_filename)
 
     # Câu lệnh ffmpeg để ghép video + giọng đọc
-    command = [
-        "ffmpeg", "-y",
-        "-i", video_path,
-        "-i", voice_path,
-        "-c:v", "copy",
-        "-map", "0:v:0",
-        "-map", "1:a:0",
-        "-shortest",
-        output_path
-    ]
-    subprocess.run(command, stdout=subprocess.DEVNULL,
-                   stderr=subprocess.DEVNULL)
-    return output_path
-
-
-def pipeline(youtube_url, voice='giahuy'):
-    # Kiểm tra giọng đọc hợp lệ
-    if voice not in AVAILABLE_VOICES:
-        print(f"Invalid voice: {voice}. Using default: giahuy")
-        voice = 'giahuy'
-
-    print(f"Starting pipeline with voice: {voice} ({AVAILABLE_VOICES[voice]})")
-
-    print("Downloading video...")
-    video_path = download_youtube_video(youtube_url)
-
-    if not video_path:
-        print("Failed to download video")
-        return None
-
-    # Thêm video gốc vào VideoManager
-    video_id = video_manager.add_video(video_path, youtube_url, voice=voice)
-    if not video_id:
-        print("Failed to add video to manager")
-        return None
+    return mux_audio_file_with_video(video_path, voice_path, output_path)
 
-    print("Extracting audio...")
-    audio_path = extract_audio(video_path)
 
-    print("Transcribing with timestamps...")
-    segments = transcribe_with_timestamps(audio_path)
-    if not segments:
-        print("Failed to transcribe audio")
-        return None
+def merge_video_with_timeline(video_path, metadata, total_duration, output_dir="video_transform", stats=None):
+    """Ghép timeline thuyết minh vào video trong một lần chạy ffmpeg
 
-    total_duration = segments[-1]["end"] if segments else 60
+    Không tạo combined_voice.mp3: PCM từ buffer timeline đi thẳng vào ffmpeg, audio
+    chỉ encode một lần sang AAC. stats (dict) nhận thống kê của timeline nếu truyền vào.
+    Clip dài hơn khoảng trống tới clip sau được nén, tối đa MAX_TEMPO lần (NARRATOR_MAX_TEMPO).
+    """
+    os.makedirs(output_dir, exist_ok=True)
 
-    print(f"Generating voice segments with {voice}...")
-    metadata = generate_voice_segments(segments, voice)
-    if not metadata:
-        print("Failed to generate voice segments")
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    output_path = os.path.join(output_dir, f"trans_{base_name}.mp4")
+
+    timeline, timeline_stats = build_timeline(metadata, total_duration, max_tempo=MAX_TEMPO)
+    if timeline_stats["clipped_samples"]:
+        print(f"Clipped {timeline_stats['clipped_samples']} samples where voice segments overlap")
+    fit = timeline_stats.get("fit")
+    if fit:
+        print(f"{fit['overflowing_before']} clips overran their slot, {fit['stretched']} sped up "
+              f"(up to {fit['max_tempo']}x), {fit['overflowing_after']} still overrun "
+              f"({fit['overflow_seconds_after']}s in total)")
+    print(f"{timeline_stats['overlapping_clips']} clips overlap the next one "
+          f"({timeline_stats['overlap_seconds']}s in total)")
+    if stats is not None:
+        stats.update(timeline_stats)
+    return mux_timeline_with_video(timeline, video_path, output_path)
+
+
+def _load_voice_metadata(path):
+    """Metadata TTS đã lưu của lần chạy trước, None nếu thiếu file hoặc clip"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
         return None
+    if metadata and all(os.path.exists(item["file"]) for item in metadata):
+        return metadata
+    return None
+
+
+def pipeline_result_key(video_key, voice, asr_model, language=ASR_LANGUAGE, plan_tts=PLAN_TTS_SEGMENTS):
+    """Cache key của video kết quả, gồm các tùy chọn làm đổi video thuyết minh
+    (ngôn ngữ chỉ định khác "auto" có thể cho bản nhận dạng/dịch khác, cách gộp/tách segment TTS,
+    mức nén clip tối đa NARRATOR_MAX_TEMPO)"""
+    plan = f"{TARGET_CHARS}-{MIN_CHARS}-{MAX_CHARS}-{MAX_MERGE_GAP}" if plan_tts else "off"
+    return result_key(video_key, voice, asr_model, language=language, plan=plan, tempo=MAX_TEMPO)
+
+
+def pipeline(youtube_url, voice='giahuy', single_pass_mux=SINGLE_PASS_MUX, streaming=STREAMING_PIPELINE,
+             progress=None, model_size="base", use_cache=True, audio_first=AUDIO_FIRST_DOWNLOAD,
+             asr_backend=ASR_BACKEND, language=ASR_LANGUAGE, report=None, plan_tts=PLAN_TTS_SEGMENTS):
+    # progress(stage, fraction) báo tiến độ cho hàng đợi job (job_worker),
+    # report(**fields) ghi thông tin của lần chạy (ngôn ngữ, có dịch hay không) vào job
+    if progress is None:
+        def progress(stage, fraction=0.0):
+            pass
+    if report is None:
+        def report(**fields):
+            pass
 
-    print("Saving metadata...")
-    with open("voice_segments_metadata.json", "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
-
-    print("Creating audio timeline...")
-    voice_path = create_audio_timeline(metadata, total_duration=total_duration)
+    # Kiểm tra giọng đọc hợp lệ
+    if voice not in AVAILABLE_VOICES:
+        print(f"Invalid voice: {voice}. Using default: giahuy")
+        voice = 'giahuy'
 
-    print("Merging final voiceover with video...")
-    final_video = merge_video_and_voice(video_path, voice_path)
+    # Cùng video + giọng + model + phiên bản pipeline: trả luôn kết quả đã có
+    # (model gồm cả backend/compute type khi không dùng openai-whisper)
+    video_key = video_cache_id(youtube_url)
+    asr_model = asr_model_id(model_size, asr_backend)
+    cache_key = pipeline_result_key(video_key, voice, asr_model, language, plan_tts)
+    if use_cache:
+        cached = video_manager.find_cached_result(cache_key)
+        pipeline_cache.record("result", hits=int(bool(cached)), misses=int(not cached))
+        if cached:
+            print(f"Cache hit ({cache_key}): {cached['id']}")
+            return cached["id"]
+
+    cached_segments = pipeline_cache.get_segments(video_key, asr_model) if use_cache else None
+    # Ngôn ngữ nguồn lưu cùng segment, segment lưu trước khi có nhận diện ngôn ngữ là tiếng Anh
+    language_info = None
+    if cached_segments:
+        language_info = pipeline_cache.get_language(video_key, asr_model) or {"language": DEFAULT_LANGUAGE}
+        if language != "auto" and language_info["language"] != language:
+            # Chỉ định ngôn ngữ khác với lần nhận dạng trước: nhận dạng lại
+            cached_segments = language_info = None
+    if streaming and not cached_segments:
+        from streaming_pipeline import streaming_pipeline
+        return streaming_pipeline(youtube_url, voice=voice, model_size=model_size, asr_backend=asr_backend,
+                                  language=language, report=report)
 
-    # Thêm video đã thuyết minh vào VideoManager
-    success = video_manager.add_transformed_video(video_id, final_video, voice)
-    if not success:
-        print("Failed to add transformed video to manager")
-        return None
+    print(f"Starting pipeline with voice: {voice} ({AVAILABLE_VOICES[voice]})")
 
-    print(f"Done! Final video with {voice} voiceover: {final_video}")
-    return video_id
+    # Thư mục làm việc riêng cho lần chạy này, manifest ghi lại stage đã xong:
+    # chạy lại cùng video/giọng/model sau khi lỗi sẽ tiếp tục từ stage cuối cùng.
+    # Job cùng key chờ tới khi job đang giữ thư mục làm việc xong (không dùng chung workdir)
+    with StageManifest(workdir_for(cache_key), {
+            "video_key": video_key, "voice": voice, "model_size": asr_model, "language": language,
+            "plan_chars": TARGET_CHARS if plan_tts else None,
+            "version": PIPELINE_VERSION}) as manifest:
+        if manifest.waited and use_cache:
+            cached = video_manager.find_cached_result(cache_key)
+            if cached:
+                print(f"Cache hit after waiting ({cache_key}): {cached['id']}")
+                return cached["id"]
+        resumed = manifest.completed_stages()
+        if resumed:
+            print(f"Resuming pipeline in {manifest.workdir} after: {', '.join(resumed)}")
+
+        # Stage nào được bỏ qua nhờ cache/manifest, lưu cùng bản ghi video
+        cache_report = {}
+
+        # Segment đã có (cache hoặc lần chạy trước) thì không cần audio
+        segments = cached_segments
+        if segments is None and manifest.done("transcribe"):
+            segments = pipeline_cache.get_segments(video_key, asr_model)
+            language_info = (manifest.done("detect") or pipeline_cache.get_language(video_key, asr_model)
+                             or {"language": DEFAULT_LANGUAGE})
+
+        def register_original(path, info, move):
+            # Thêm video gốc vào VideoManager (file vừa tải trong workdir được chuyển hẳn vào),
+            # metadata YouTube (ID, thời lượng, format) lưu cùng bản ghi
+            info = dict(info)
+            video_id = video_manager.add_video(
+                path, youtube_url, title=info.pop("title", None), voice=voice, move=move,
+                extra={"video_key": video_key, **info})
+            if video_id:
+                manifest.complete("download", video_id=video_id)
+            else:
+                print("Failed to add video to manager")
+            return video_id
+
+        progress("download")
+        done = manifest.done("download")
+        video_id = done["video_id"] if done and video_manager.get_video_info(done["video_id"]) else None
+        # Tải audio trước: nhận dạng chạy trong lúc video còn đang tải ở luồng nền
+        pending_video = None
+        if video_id:
+            cache_report["download"] = "resume"
+        else:
+            # Đã có file gốc của video này (tải trước hoặc chạy với giọng/model khác): không tải lại.
+            # Bản ghi chưa thuyết minh được dùng luôn, bản ghi đã giữ kết quả khác thì thêm bản ghi mới
+            claimed = video_manager.claim_original(video_key, cache_key) if use_cache else None
+            original = claimed or (video_manager.find_original(video_key) if use_cache else None)
+            cache_report["download"] = "hit" if original else "miss"
+            video_path = info = None
+            if claimed:
+                print(f"Reusing downloaded video: {claimed['original_path']}")
+                video_id = claimed["id"]
+                manifest.complete("download", video_id=video_id)
+            elif original:
+                print(f"Reusing downloaded video: {original['original_path']}")
+                video_path = original["original_path"]
+                info = {field: original[field] for field in VIDEO_INFO_FIELDS if original.get(field) is not None}
+            elif audio_first and not segments:
+                print("Downloading audio stream first...")
+                try:
+                    pending_video = AudioFirstDownload(youtube_url, output_dir=str(manifest.workdir)).start()
+                except Exception as e:
+                    print(f"Audio-first download failed, downloading full video: {e}")
+
+            if not original and not pending_video:
+                print("Downloading video...")
+                try:
+                    # Metadata chỉ lấy một lần, dùng luôn cho bước tải
+                    video_path, info = download_video(youtube_url, output_dir=str(manifest.workdir))
+                except Exception as e:
+                    print(f"[ERROR] Failed to download: {e}")
+
+            if not pending_video and not claimed:
+                if not video_path:
+                    print("Failed to download video")
+                    return None
+                video_id = register_original(video_path, info, move=not original)
+                if not video_id:
+                    return None
+        if video_id:
+            video_path, _ = video_manager.get_video_paths(video_id)
+
+        progress("extract")
+        audio = None
+        if not segments:
+            # Audio chỉ nằm trong bộ nhớ để đưa thẳng vào Whisper
+            print("Extracting audio...")
+            audio = extract_audio(pending_video.audio_path if pending_video else video_path)
+
+        progress("detect")
+        if language_info is None:
+            # Nhận diện trên 30 giây đầu trước khi nhận dạng cả file với đúng ngôn ngữ
+            language_info = detect_language(audio, model_size, asr_backend, language=language)
+            manifest.complete("detect", **language_info)
+        source_language = language_info["language"]
+        translation = "skipped" if source_language == "vi" else f"{source_language}->vi"
+        print(f"Source language: {language_info}, translation: {translation}")
+        report(language=language_info, translation=translation)
+
+        progress("transcribe")
+        if segments:
+            cache_report["transcribe"] = "resume" if manifest.done("transcribe") else "hit"
+            print(f"Reusing {len(segments)} transcribed segments")
+        else:
+            cache_report["transcribe"] = "miss"
+            print("Transcribing with timestamps...")
+            segments = transcribe_with_timestamps(audio, model_size, backend=asr_backend, language=source_language)
+            del audio
+            if not segments:
+                print("Failed to transcribe audio")
+                return None
+            pipeline_cache.put_segments(video_key, asr_model, segments)
+            pipeline_cache.put_language(video_key, asr_model, language_info)
+        manifest.complete("transcribe",
+                          segments_path=str(pipeline_cache.segments_path(video_key, asr_model)))
+
+        total_duration = segments[-1]["end"] if segments else 60
+
+        # Đoạn đọc cho TTS: segment ngắn được gộp, segment dài được tách tại ranh giới câu
+        tts_segments = segments
+        if plan_tts:
+            tts_segments = plan_segments(segments)
+            segment_plan = plan_stats(segments, tts_segments)
+            print(f"Planned {segment_plan['segments']} segments into {segment_plan['tts_requests']} TTS requests: "
+                  f"{segment_plan}")
+            report(segment_plan=segment_plan)
+
+        progress("tts")
+        metadata_path = manifest.file_path("voice_segments_metadata.json")
+        metadata = _load_voice_metadata(metadata_path) if manifest.done("tts") else None
+        if metadata:
+            cache_report["tts"] = "resume"
+        else:
+            print(f"Generating voice segments with {voice}...")
+            # Segment đã sinh giọng ở lần chạy trước (nhật ký trong workdir) không làm lại,
+            # clip TTS còn lại được lấy từ tts_cache theo nội dung nếu có
+            completed = manifest.completed_segments()
+            tts_before = dict(tts_cache.stats)
+            metadata = generate_voice_segments(
+                tts_segments, voice, output_dir=manifest.file_path("voice_segments"),
+                progress_callback=lambda done, total: progress("tts", done / total),
+                completed=completed, on_segment=manifest.append_segment, source_language=source_language)
+            if not metadata:
+                print("Failed to generate voice segments")
+                return None
+            tts_hits = tts_cache.stats["hits"] - tts_before["hits"]
+            tts_misses = tts_cache.stats["misses"] - tts_before["misses"]
+            pipeline_cache.record("tts", hits=tts_hits, misses=tts_misses)
+            cache_report["tts"] = (f"{tts_hits}/{tts_hits + tts_misses} clips cached, "
+                                   f"{len(completed)} resumed")
+
+            latency = fpt_client.get_stats()["latency"]["request"]
+            print(f"TTS latency: p50={latency['p50']}s p95={latency['p95']}s "
+                  f"over {latency['count']} requests")
+
+            with open(metadata_path, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            manifest.complete("tts", metadata_path=metadata_path)
+
+        for stage in ("download", "transcribe"):
+            pipeline_cache.record(stage, hits=int(cache_report[stage] != "miss"),
+                                  misses=int(cache_report[stage] == "miss"))
+        print(f"Cache: {cache_report}")
+
+        # Chatbot đọc metadata của video vừa xử lý ở thư mục chạy
+        print("Saving metadata...")
+        with open("voice_segments_metadata.json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+        # Video chỉ cần cho bước ghép: dịch + TTS đã chạy trong lúc video tải
+        if pending_video:
+            print("Waiting for video download...")
+            try:
+                video_path = pending_video.wait_video()
+            except Exception as e:
+                print(f"[ERROR] Failed to download: {e}")
+                video_path = None
+            if not video_path:
+                print("Failed to download video")
+                return None
+            video_id = register_original(video_path, pending_video.metadata, move=True)
+            if not video_id:
+                return None
+            video_path, _ = video_manager.get_video_paths(video_id)
+
+        progress("mux")
+        done = manifest.done("mux")
+        final_video = done["output_path"] if done and os.path.exists(done["output_path"]) else None
+        if not final_video:
+            output_dir = str(manifest.workdir)
+            timeline_stats = {}
+            if single_pass_mux:
+                print("Mixing voiceover and muxing with video in one pass...")
+                final_video = merge_video_with_timeline(video_path, metadata, total_duration,
+                                                        output_dir=output_dir, stats=timeline_stats)
+            else:
+                print("Creating audio timeline...")
+                voice_path = create_audio_timeline(metadata, total_duration=total_duration,
+                                                   output_dir=output_dir, stats=timeline_stats)
+
+                print("Merging final voiceover with video...")
+                final_video = merge_video_and_voice(video_path, voice_path, output_dir=output_dir)
+            if timeline_stats:
+                # Thống kê tràn khoảng trống của từng job (đọc nhanh hơn/chồng lên câu sau)
+                report(tts_clips=timeline_stats["clips"], overlapping_clips=timeline_stats["overlapping_clips"],
+                       overlap_seconds=timeline_stats["overlap_seconds"], slot_fit=timeline_stats.get("fit"))
+            manifest.complete("mux", output_path=final_video, timeline=timeline_stats)
+            done = manifest.done("mux")
+
+        # Thêm video đã thuyết minh vào VideoManager
+        success = video_manager.add_transformed_video(
+            video_id, final_video, voice, move=True,
+            extra={"cache_key": cache_key, "model_size": model_size, "asr_model": asr_model,
+                   "language": language_info, "cache_stages": cache_report,
+                   "segment_plan": segment_plan if plan_tts else None, "timeline": done.get("timeline")})
+        if not success:
+            print("Failed to add transformed video to manager")
+            return None
+
+        # File kết quả đã được chuyển vào video_data/transformed, audio/segment nằm trong cache
+        manifest.cleanup()
+        _, final_video = video_manager.get_video_paths(video_id)
+
+        print(f"Done! Final video with {voice} voiceover: {final_video}")
+        return video_id
+
+
+def prefetch_transcripts(youtube_urls, model_size="base", asr_backend=ASR_BACKEND, progress=None,
+                         language=ASR_LANGUAGE):
+    """Tải và nhận dạng nhiều video trong một batch trước khi chạy pipeline từng video
+
+    Video gốc được thêm vào VideoManager và segment lưu vào pipeline_cache, nên pipeline()
+    sau đó bỏ qua bước tải và nhận dạng: bản ghi video tạo ở đây (chưa có giọng đọc) được
+    pipeline() nhận lại qua claim_original, không thêm bản ghi thứ hai.
+    progress(index, stage) báo tiến độ theo video.
+    Trả về số video đã nhận dạng.
+    """
+    from batch_transcribe import iter_transcribe_files
+
+    if progress is None:
+        def progress(index, stage, fraction=0.0):
+            pass
+
+    asr_model = asr_model_id(model_size, asr_backend)
+    pending = {}
+    for index, url in enumerate(youtube_urls):
+        video_key = video_cache_id(url)
+        if video_key in pending or pipeline_cache.get_segments(video_key, asr_model) is not None:
+            continue
+        progress(index, "download")
+        original = video_manager.find_original(video_key)
+        if original:
+            video_path = original["original_path"]
+        else:
+            workdir = workdir_for(f"{video_key}_prefetch")
+            with WorkdirLock(workdir):
+                try:
+                    path, info = download_video(url, output_dir=str(workdir))
+                except Exception as e:
+                    print(f"[ERROR] Failed to download {url}: {e}")
+                    continue
+                video_id = video_manager.add_video(path, url, title=info.pop("title", None), move=True,
+                                                   extra={"video_key": video_key, **info})
+                shutil.rmtree(workdir, ignore_errors=True)
+            if not video_id:
+                continue
+            video_path, _ = video_manager.get_video_paths(video_id)
+        progress(index, "extract")
+        audio = extract_audio(video_path)
+        progress(index, "detect")
+        pending[video_key] = (index, audio, detect_language(audio, model_size, asr_backend, language=language))
+
+    # Một batch decode với một ngôn ngữ: nhóm các video theo ngôn ngữ nhận diện được
+    groups = {}
+    for key, (_, _, language_info) in pending.items():
+        groups.setdefault(language_info["language"], []).append(key)
+    done = 0
+    for source_language, keys in groups.items():
+        for key in keys:
+            progress(pending[key][0], "transcribe")
+        print(f"Transcribing {len(keys)} videos ({source_language}) in one batch...")
+        audios = [pending[key][1] for key in keys]
+        for position, segments in iter_transcribe_files(audios, model_size, asr_backend,
+                                                        language=source_language):
+            # Giải phóng audio của video đã xong
+            audios[position] = None
+            _, _, language_info = pending.pop(keys[position])
+            if segments:
+                pipeline_cache.put_segments(keys[position], asr_model, segments)
+                pipeline_cache.put_language(keys[position], asr_model, language_info)
+                done += 1
+    return done
 
 
 if __name__ == "__main__":
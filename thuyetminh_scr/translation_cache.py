@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Cache bản dịch lưu trên đĩa (SQLite), key là hash của (ngôn ngữ nguồn, ngôn ngữ đích, text)
+Giới hạn dung lượng, loại bỏ bản dịch ít dùng nhất khi vượt ngưỡng
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Đường dẫn tương đối tính từ thư mục mã nguồn (chatbot đổi cwd trước khi dịch)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, os.environ.get("TRANSLATION_CACHE_PATH",
+                                                           "cache/translation_cache.db"))
+DEFAULT_MAX_MB = float(os.environ.get("TRANSLATION_CACHE_MAX_MB", "64"))
+
+
+def make_key(source, target, text):
+    """Hash nội dung (source, target, text đã chuẩn hóa như khi dịch)"""
+    # translator import module này nên chỉ import khi tính key
+    from translator import normalize_text
+    payload = f"{source}\x00{target}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_MAX_MB):
+        self.db_path = Path(db_path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # Thống kê trong tiến trình hiện tại
+        self.session_stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+
+    def _connect(self):
+        # Mở kết nối lười để import module không tạo file
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _bump_stats(self, conn, hits, misses, bytes_saved):
+        # Cộng dồn thống kê vào DB để dashboard thấy số liệu của mọi tiến trình
+        conn.executemany(
+            "INSERT INTO cache_stats(name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [("hits", hits), ("misses", misses), ("bytes_saved", bytes_saved)])
+
+    def get_many(self, texts, source="en", target="vi"):
+        """Tra cache cho list text, trả về dict {index: bản dịch} của các đoạn có trong cache"""
+        keys = {i: make_key(source, target, text) for i, text in enumerate(texts)}
+        if not keys:
+            return {}
+
+        with self._lock:
+            conn = self._connect()
+            found = {}
+            unique_keys = list(set(keys.values()))
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, translation in conn.execute(
+                        f"SELECT key, translation FROM translations WHERE key IN ({placeholders})",
+                        chunk):
+                    found[key] = translation
+
+            now = time.time()
+            conn.executemany("UPDATE translations SET last_used = ? WHERE key = ?",
+                             [(now, key) for key in found])
+
+            results = {i: found[key] for i, key in keys.items() if key in found}
+            hits = len(results)
+            misses = len(keys) - hits
+            # Số byte text nguồn không phải gửi lên provider
+            bytes_saved = sum(len(texts[i].encode("utf-8")) for i in results)
+            self._bump_stats(conn, hits, misses, bytes_saved)
+            conn.commit()
+
+            self.session_stats["hits"] += hits
+            self.session_stats["misses"] += misses
+            self.session_stats["bytes_saved"] += bytes_saved
+            return results
+
+    def put_many(self, pairs, source="en", target="vi"):
+        """Lưu list (text, bản dịch) vào cache, bỏ qua bản dịch rỗng"""
+        rows = []
+        now = time.time()
+        for text, translation in pairs:
+            if not translation:
+                continue
+            size = len(text.encode("utf-8")) + len(translation.encode("utf-8"))
+            rows.append((make_key(source, target, text), source, target, translation, size, now))
+        if not rows:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations(key, source, target, translation, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            self._evict_if_needed(conn)
+
+    def _evict_if_needed(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Xóa bản dịch ít dùng nhất tới khi còn 90% dung lượng cho phép
+        target_size = int(self.max_bytes * 0.9)
+        removed = 0
+        for key, size in conn.execute(
+                "SELECT key, size FROM translations ORDER BY last_used ASC").fetchall():
+            if total <= target_size:
+                break
+            conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        conn.commit()
+        self.session_stats["evictions"] += removed
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM translations")
+            conn.execute("DELETE FROM cache_stats")
+            conn.commit()
+
+    def get_stats(self):
+        """Lấy hit rate, số byte tiết kiệm và dung lượng cache"""
+        with self._lock:
+            conn = self._connect()
+            totals = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations").fetchone()
+
+        hits = totals.get("hits", 0)
+        lookups = hits + totals.get("misses", 0)
+        session_lookups = self.session_stats["hits"] + self.session_stats["misses"]
+        return {
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": totals.get("misses", 0),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bytes_saved": totals.get("bytes_saved", 0),
+            "session": {
+                **self.session_stats,
+                "hit_rate": self.session_stats["hits"] / session_lookups if session_lookups else 0.0,
+            },
+        }
+
+
+# Cache dùng chung cho toàn tiến trình
+translation_cache = TranslationCache()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Lớp dịch theo lô dùng chung cho pipeline, chatbot và search
+Gộp nhiều đoạn vào một request tới giới hạn ký tự của provider, tách kết quả theo từng đoạn
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from deep_translator import GoogleTranslator
+
+from translation_cache import translation_cache
+from voice_engine import RATE_LIMITS, call_with_retry
+
+# Google Translate giới hạn 5000 ký tự mỗi request, chừa lại một khoảng an toàn
+MAX_BATCH_CHARS = int(os.environ.get("TRANSLATE_MAX_BATCH_CHARS", "4500"))
+MAX_BATCH_WORKERS = int(os.environ.get("TRANSLATE_MAX_WORKERS", "4"))
+
+# Ký tự phân tách giữa các đoạn trong một request, Google giữ nguyên xuống dòng
+SEPARATOR = "\n"
+
+# Mã ngôn ngữ Whisper khác với mã của Google Translate
+GOOGLE_LANGUAGE_CODES = {"zh": "zh-CN", "he": "iw", "jw": "jv"}
+
+_stats_lock = threading.Lock()
+stats = {
+    "items": 0,
+    "requests": 0,
+    "batches": 0,
+    "batch_fallbacks": 0,
+    "failures": 0,
+}
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        stats[name] += n
+
+
+def normalize_text(text):
+    """Gộp khoảng trắng (kể cả xuống dòng) để không lẫn với ký tự phân tách"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _translate_request(text, source, target):
+    _count("requests")
+    return GoogleTranslator(source=source, target=target).translate(text)
+
+
+def plan_batches(items, max_chars=MAX_BATCH_CHARS):
+    """Chia list (index, text) thành các lô có tổng độ dài không vượt max_chars"""
+    batches = []
+    current = []
+    size = 0
+    for index, text in items:
+        extra = len(text) + (len(SEPARATOR) if current else 0)
+        if current and size + extra > max_chars:
+            batches.append(current)
+            current = []
+            size = 0
+            extra = len(text)
+        current.append((index, text))
+        size += extra
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_items_one_by_one(batch, source, target, limiter):
+    results = {}
+    for index, text in batch:
+        translated = call_with_retry(_translate_request, text, source, target,
+                                     limiter=limiter, retries=2)
+        if translated is None:
+            _count("failures")
+        results[index] = translated
+    return results
+
+
+def _translate_one_batch(batch, source, target, limiter):
+    _count("batches")
+    if len(batch) == 1:
+        return _translate_items_one_by_one(batch, source, target, limiter)
+
+    joined = SEPARATOR.join(text for _, text in batch)
+    translated = call_with_retry(_translate_request, joined, source, target,
+                                 limiter=limiter, retries=2)
+    if translated:
+        parts = [part.strip() for part in translated.split(SEPARATOR)]
+        if len(parts) == len(batch) and all(parts):
+            return {index: part for (index, _), part in zip(batch, parts)}
+
+    # Provider gộp/tách dòng hoặc request lỗi: dịch lại từng đoạn
+    _count("batch_fallbacks")
+    return _translate_items_one_by_one(batch, source, target, limiter)
+
+
+def translate_batch(texts, source="en", target="vi", max_chars=MAX_BATCH_CHARS,
+                    max_workers=MAX_BATCH_WORKERS, cache=None):
+    """Dịch list text, trả về list cùng độ dài (None với đoạn dịch thất bại)
+
+    Đọc/ghi qua cache trên đĩa, chỉ gửi lên provider các đoạn chưa có trong cache.
+    Bản dịch lỗi không được lưu vào cache.
+    """
+    cache = cache or translation_cache
+    results = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        normalized = normalize_text(text)
+        if normalized:
+            pending.append((i, normalized))
+        else:
+            results[i] = ""
+    _count("items", len(pending))
+
+    try:
+        cached = cache.get_many([text for _, text in pending], source, target)
+    except Exception as e:
+        print(f"Translation cache read error: {e}")
+        cached = {}
+    for pos, translation in cached.items():
+        results[pending[pos][0]] = translation
+    pending = [item for pos, item in enumerate(pending) if pos not in cached]
+
+    batches = plan_batches(pending, max_chars)
+    limiter = RATE_LIMITS.get("google_translate")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for translated in executor.map(
+                lambda batch: _translate_one_batch(batch, source, target, limiter), batches):
+            for index, value in translated.items():
+                results[index] = value
+
+    try:
+        cache.put_many([(text, results[i]) for i, text in pending], source, target)
+    except Exception as e:
+        print(f"Translation cache write error: {e}")
+
+    return results
+
+
+def translate_text(text, source="en", target="vi"):
+    """Dịch một đoạn text, trả về None nếu thất bại"""
+    return translate_batch([text], source=source, target=target)[0]
+
+
+def get_stats():
+    """Lấy thống kê số đoạn, số request, số lần fallback và thống kê cache"""
+    with _stats_lock:
+        result = dict(stats)
+    result["cache"] = translation_cache.get_stats()
+    return result
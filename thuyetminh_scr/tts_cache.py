@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Cache audio TTS theo nội dung: key là hash của (text, giọng đọc, tốc độ, provider)
+Mỗi file MP3 chỉ lưu một lần, giới hạn dung lượng và loại bỏ theo LRU
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Đường dẫn tương đối tính từ thư mục mã nguồn, app và worker dùng chung cache
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, os.environ.get("TTS_CACHE_DIR", "cache/tts"))
+DEFAULT_MAX_MB = float(os.environ.get("TTS_CACHE_MAX_MB", "1024"))
+
+
+def make_key(text, voice, speed=0, provider="fpt"):
+    """Hash nội dung (text, voice, speed, provider)"""
+    payload = f"{provider}\x00{voice}\x00{speed}\x00{text.strip()}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src, dest):
+    """Hardlink nếu cùng filesystem, ngược lại copy
+
+    Mỗi lần gọi ghi vào file tạm riêng rồi đổi tên, nhiều worker ghi cùng dest không
+    đụng nhau và không ai thấy clip dở dang.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest) or ".",
+                                    prefix=f"{os.path.basename(dest)}.", suffix=".part")
+    os.close(fd)
+    try:
+        try:
+            # Tên tạm đã là của riêng lần gọi này, bỏ file rỗng để hardlink vào đúng tên đó
+            os.remove(tmp_path)
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class TTSCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes_served": 0}
+
+    def _connect(self):
+        # Mở kết nối lười để import module không tạo thư mục
+        if self._conn is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.cache_dir / "index.db"), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    key TEXT PRIMARY KEY,
+                    voice TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_clips_last_used ON clips(last_used)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _clip_path(self, key):
+        return self.cache_dir / f"{key}.mp3"
+
+    def fetch(self, text, voice, speed=0, provider="fpt", output_file=None):
+        """Ghi audio từ cache ra output_file, trả về True nếu hit"""
+        key = make_key(text, voice, speed, provider)
+        clip_path = self._clip_path(key)
+
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+            if row is None or not clip_path.exists():
+                self.stats["misses"] += 1
+                return False
+            conn.execute("UPDATE clips SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.stats["hits"] += 1
+            self.stats["bytes_served"] += row[0]
+
+        link_or_copy(clip_path, output_file)
+        return True
+
+    def store(self, text, voice, speed=0, provider="fpt", source_file=None):
+        """Lưu file MP3 vừa tổng hợp vào cache"""
+        key = make_key(text, voice, speed, provider)
+        clip_path = self._clip_path(key)
+        size = os.path.getsize(source_file)
+
+        with self._lock:
+            conn = self._connect()
+            link_or_copy(source_file, clip_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO clips(key, voice, provider, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)", (key, voice, provider, size, time.time()))
+            conn.commit()
+            self.stats["stores"] += 1
+            self._evict_if_needed(conn)
+
+    def _evict_if_needed(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Xóa clip ít dùng nhất tới khi còn 90% dung lượng cho phép
+        target_size = int(self.max_bytes * 0.9)
+        for key, size in conn.execute(
+                "SELECT key, size FROM clips ORDER BY last_used ASC").fetchall():
+            if total <= target_size:
+                break
+            conn.execute("DELETE FROM clips WHERE key = ?", (key,))
+            clip_path = self._clip_path(key)
+            if clip_path.exists():
+                clip_path.unlink()
+            total -= size
+            self.stats["evictions"] += 1
+        conn.commit()
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            conn = self._connect()
+            for (key,) in conn.execute("SELECT key FROM clips").fetchall():
+                clip_path = self._clip_path(key)
+                if clip_path.exists():
+                    clip_path.unlink()
+            conn.execute("DELETE FROM clips")
+            conn.commit()
+
+    def get_stats(self):
+        """Lấy hit rate, số lượt gọi API tiết kiệm được và dung lượng cache"""
+        with self._lock:
+            conn = self._connect()
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM clips").fetchone()
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "api_calls_saved": self.stats["hits"],
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": entries,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Cache dùng chung cho toàn tiến trình
+tts_cache = TTSCache()
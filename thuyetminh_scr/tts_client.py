@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Client FPT.AI TTS dùng chung connection pool
+Poll URL async với backoff tăng dần thay vì sleep cố định, ghi MP3 thẳng xuống đĩa
+Audio đã tổng hợp được lấy lại từ cache theo nội dung, không gọi lại API
+"""
+
+import bisect
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tts_cache import tts_cache
+from voice_engine import RATE_LIMITS, PermanentError
+
+# Danh sách giọng đọc có sẵn (chỉ 2 giọng chính)
+AVAILABLE_VOICES = {
+    "giahuy": "Giá Huy (Nam)",
+    "ngoclam": "Ngọc Lâm (Nữ)"
+}
+
+FPT_TTS_URL = os.environ.get("FPT_TTS_URL", "https://api.fpt.ai/hmi/tts/v5")
+FPT_API_KEY = os.environ.get("FPT_API_KEY", "FXxgmQp6tOUAwH2vcvGccDTt32dfBl2r")
+
+
+def is_retryable_status(status):
+    """429 (quá giới hạn) và lỗi phía server có thể qua khỏi, lỗi 4xx khác gửi lại vẫn lỗi"""
+    return status == 429 or status >= 500
+
+
+class TTSRequestRejected(PermanentError):
+    """FPT.AI từ chối request (401/403/400...), voice_engine không thử lại"""
+
+
+class LatencyHistogram:
+    """Histogram độ trễ (giây) với các bucket cố định"""
+
+    BUCKETS = [0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Ước lượng percentile theo cận trên của bucket"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.BUCKETS[i] if i < len(self.BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self):
+        labels = [f"<={b}s" for b in self.BUCKETS] + [f">{self.BUCKETS[-1]}s"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class FptTTSClient:
+    def __init__(self, api_url=None, api_key=None, pool_size=16,
+                 poll_initial=0.2, poll_max=2.0, poll_factor=1.5, deadline=60.0,
+                 timeout=30.0, cache=None, limiter=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.cache = cache
+        # Chỉ giới hạn tốc độ các request thật, cache hit không phải chờ
+        self.limiter = limiter
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.deadline = deadline
+        self.timeout = timeout
+
+        # Session giữ kết nối keep-alive, tránh bắt tay TCP/TLS cho mỗi request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.histograms = {
+            "request": LatencyHistogram(),
+            "synthesis": LatencyHistogram(),
+            "poll_wait": LatencyHistogram(),
+            "download": LatencyHistogram(),
+        }
+        self.counters = {"requests": 0, "failures": 0, "polls": 0, "timeouts": 0}
+
+    def _observe(self, name, seconds):
+        with self._lock:
+            self.histograms[name].observe(seconds)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def synthesize(self, text, voice='giahuy', speed=0, output_file='fpt_tts.mp3'):
+        """Gửi text lên FPT.AI, chờ audio sẵn sàng rồi ghi vào output_file"""
+        # Kiểm tra giọng đọc hợp lệ
+        if voice not in AVAILABLE_VOICES:
+            print(f"Invalid voice: {voice}. Using default: giahuy")
+            voice = 'giahuy'
+
+        if self.cache and self.cache.fetch(text, voice, speed, "fpt", output_file):
+            return True
+
+        headers = {
+            "api-key": self.api_key or FPT_API_KEY,
+            "speed": str(speed),
+            "voice": voice
+        }
+
+        if self.limiter:
+            self.limiter.acquire()
+
+        start = time.perf_counter()
+        self._count("requests")
+        try:
+            response = self.session.post(
+                url=self.api_url or FPT_TTS_URL,
+                headers=headers,
+                data=text.encode('utf-8'),
+                timeout=self.timeout
+            )
+            self._observe("synthesis", time.perf_counter() - start)
+
+            if response.status_code != 200:
+                print(f"TTS Error: {response.text}")
+                if not is_retryable_status(response.status_code):
+                    raise TTSRequestRejected(f"TTS request failed with HTTP {response.status_code}")
+                self._count("failures")
+                return False
+
+            audio_url = response.json()['async']
+            ok = self._poll_and_download(audio_url, output_file)
+        except TTSRequestRejected:
+            self._count("failures")
+            raise
+        except requests.RequestException as e:
+            print(f"TTS request error: {e}")
+            ok = False
+
+        if ok:
+            self._observe("request", time.perf_counter() - start)
+            if self.cache:
+                try:
+                    self.cache.store(text, voice, speed, "fpt", output_file)
+                except OSError as e:
+                    print(f"TTS cache write error: {e}")
+        else:
+            self._count("failures")
+        return ok
+
+    def _poll_and_download(self, audio_url, output_file):
+        """Poll URL async với backoff tăng dần cho tới khi có file hoặc hết hạn"""
+        poll_start = time.perf_counter()
+        deadline = poll_start + self.deadline
+        delay = self.poll_initial
+
+        while True:
+            self._count("polls")
+            response = self.session.get(audio_url, stream=True, timeout=self.timeout)
+            if response.status_code == 200:
+                self._observe("poll_wait", time.perf_counter() - poll_start)
+                download_start = time.perf_counter()
+                ok = self._stream_to_file(response, output_file)
+                self._observe("download", time.perf_counter() - download_start)
+                return ok
+            status = response.status_code
+            response.close()
+
+            # FPT.AI trả về 404 cho tới khi audio được tạo xong, lỗi khác dừng poll ngay:
+            # 401/403... không thử lại, 429/5xx để voice_engine gửi lại request
+            if status != 404:
+                message = f"TTS download failed with HTTP {status}: {audio_url}"
+                if not is_retryable_status(status):
+                    raise TTSRequestRejected(message)
+                raise requests.HTTPError(message, response=response)
+            if time.perf_counter() + delay > deadline:
+                print(f"TTS timeout waiting for {audio_url}")
+                self._count("timeouts")
+                return False
+            time.sleep(delay)
+            delay = min(delay * self.poll_factor, self.poll_max)
+
+    @staticmethod
+    def _stream_to_file(response, output_file):
+        # Ghi vào file tạm rồi đổi tên để không để lại file MP3 dở dang
+        tmp_path = f"{output_file}.part"
+        written = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    written += len(chunk)
+        except BaseException:
+            # Tải hỏng giữa chừng: không để lại file .part
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+
+        if not written:
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, output_file)
+        return True
+
+    def get_stats(self):
+        """Lấy histogram độ trễ và bộ đếm request"""
+        with self._lock:
+            return {
+                **self.counters,
+                "latency": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+
+# Client dùng chung cho toàn tiến trình
+fpt_client = FptTTSClient(cache=tts_cache, limiter=RATE_LIMITS["fpt_tts"])
+
+# Hàm gọi FPT.AI TTS API
+
+
+def fpt_tts(text, voice='giahuy', speed=0, output_file='fpt_tts.mp3'):
+    return fpt_client.synthesize(text, voice=voice, speed=speed, output_file=output_file)
@@ -4,25 +4,238 @@ import time
 from pathlib import Path
 from datetime import datetime
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline_checkpoint import LOCK_FILE, WORK_DIR
+from video_store import SQLiteVideoStore, new_ulid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Đường dẫn dữ liệu tính từ thư mục mã nguồn, không phụ thuộc thư mục hiện tại
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASE_DIR = os.path.join(BASE_DIR, "video_data")
+
+# "auto": rename/reflink/hardlink trước, copy khi không được; "copy": luôn copy như cũ
+INGEST_MODE = os.environ.get("VIDEO_INGEST_MODE", "auto")
+
+# Mặc định giữ dữ liệu cũ khi khởi động, đặt VIDEO_MANAGER_CLEAR_ON_START=1 để xóa sạch như trước
+CLEAR_ON_START = os.environ.get("VIDEO_MANAGER_CLEAR_ON_START", "0") == "1"
+
+# File trung gian của pipeline được dọn theo tuổi và tổng dung lượng
+ARTIFACT_DIRS = [os.path.join(BASE_DIR, name)
+                 for name in ["audio", "voice_segments", "videos", "video_transform", WORK_DIR]]
+ARTIFACT_MAX_AGE_DAYS = float(os.environ.get("ARTIFACT_MAX_AGE_DAYS", "7"))
+ARTIFACT_MAX_MB = float(os.environ.get("ARTIFACT_MAX_MB", "2048"))
+# File vừa sửa có thể đang được job dùng, không dọn
+ARTIFACT_GRACE_SECONDS = 3600
+STAT_WORKERS = 8
+
+# ioctl FICLONE của Linux (btrfs, xfs, ...): file mới dùng chung block, copy-on-write
+FICLONE = 0x40049409
+
+
+def _reflink(src, dest):
+    if fcntl is None:
+        raise OSError("reflink not supported")
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dest_file.close()
+            os.remove(dest)
+            raise
+    shutil.copystat(src, dest)
+
+
+def ingest_file(src, dest, move=False, mode=None):
+    """Đưa file vào thư mục quản lý mà không ghi lại dữ liệu nếu có thể
+
+    move=True khi src là file tạm của pipeline (không dùng lại): đổi tên.
+    Ngược lại thử reflink, rồi hardlink (cùng filesystem), cuối cùng mới copy.
+    Trả về cách đã dùng: "rename", "reflink", "hardlink" hoặc "copy".
+    """
+    mode = mode or INGEST_MODE
+    if mode != "copy":
+        if move:
+            try:
+                os.rename(src, dest)
+                return "rename"
+            except OSError:
+                pass
+        try:
+            _reflink(src, dest)
+            return "reflink"
+        except OSError:
+            pass
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError:
+            pass
+
+    shutil.copy2(src, dest)
+    return "copy"
+
+
+def _last_change(stat):
+    # yt-dlp đặt mtime theo ngày đăng video, link/copy2 giữ mtime cũ: lấy thêm ctime
+    return max(stat.st_mtime, stat.st_ctime)
+
+
+def _stat_size(path):
+    try:
+        return os.stat(path).st_size
+    except (OSError, TypeError):
+        return None
+
+
+def collect_garbage(dirs=None, max_age_days=None, max_mb=None, grace_seconds=ARTIFACT_GRACE_SECONDS):
+    """Dọn file trung gian: xóa file quá hạn, rồi xóa file cũ nhất tới khi dưới ngưỡng dung lượng"""
+    dirs = ARTIFACT_DIRS if dirs is None else dirs
+    max_age = (ARTIFACT_MAX_AGE_DAYS if max_age_days is None else max_age_days) * 86400
+    max_bytes = (ARTIFACT_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    now = time.time()
+
+    files = []
+    for dir_name in dirs:
+        for root, _, names in os.walk(dir_name):
+            for name in names:
+                # File khóa thư mục làm việc đang được job giữ, xóa đi thì job khác vào được
+                if name == LOCK_FILE:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((_last_change(stat), stat.st_size, path))
+    files.sort()
+
+    total = sum(size for _, size, _ in files)
+    removed = freed = 0
+    for mtime, size, path in files:
+        age = now - mtime
+        if age < grace_seconds:
+            continue
+        if age <= max_age and total <= max_bytes:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+        freed += size
+        total -= size
+
+    return {"files_removed": removed, "bytes_freed": freed, "bytes_kept": total}
 
 
 class VideoManager:
-    def __init__(self, base_dir="video_data", clear_on_start=True):
+    def __init__(self, base_dir=DEFAULT_BASE_DIR, clear_on_start=False, reconcile_on_start=True):
         self.base_dir = Path(base_dir)
         self.videos_dir = self.base_dir / "videos"
         self.transformed_dir = self.base_dir / "transformed"
         self.metadata_file = self.base_dir / "video_metadata.json"
-
-        # Xóa hết file cũ nếu clear_on_start = True
-        if clear_on_start:
+        self.db_file = self.base_dir / "videos.db"
+        self._store = None
+        self._store_lock = threading.Lock()
+
+        self.startup_report = None
+        if clear_on_start or reconcile_on_start:
+            self.startup(clear=clear_on_start)
+
+    @property
+    def store(self):
+        # Mở lười: tạo instance (import module) không tạo thư mục hay DB
+        with self._store_lock:
+            if self._store is None:
+                self.videos_dir.mkdir(parents=True, exist_ok=True)
+                self.transformed_dir.mkdir(parents=True, exist_ok=True)
+                # Metadata lưu trong SQLite, file JSON cũ nếu còn được nhập vào một lần
+                self._store = SQLiteVideoStore(self.db_file)
+                migrated = self._store.migrate_json(self.metadata_file)
+                if migrated:
+                    print(f"Migrated {migrated} videos from {self.metadata_file}")
+            return self._store
+
+    def startup(self, clear=False):
+        """Xóa hết dữ liệu cũ (clear=True) hoặc đối chiếu metadata với file thực tế
+
+        Trả về báo cáo (cũng lưu ở startup_report), cleared=True nếu dữ liệu đã bị xóa.
+        """
+        if clear:
+            with self._store_lock:
+                if self._store is not None:
+                    self._store.close()
+                    self._store = None
             self.clear_all_data()
-
-        # Tạo thư mục mới
-        self.videos_dir.mkdir(parents=True, exist_ok=True)
-        self.transformed_dir.mkdir(parents=True, exist_ok=True)
-
-        # Load metadata (sẽ trống nếu clear_on_start = True)
-        self.metadata = self.load_metadata()
+            self.startup_report = {"videos": 0, "removed": 0, "updated": 0, "orphans_removed": 0,
+                                   "seconds": 0.0, "cleared": True}
+        else:
+            self.startup_report = self.reconcile()
+        return self.startup_report
+
+    def reconcile(self, remove_orphans=True, grace_seconds=ARTIFACT_GRACE_SECONDS):
+        """Đối chiếu metadata với file trên đĩa (stat song song)
+
+        Bỏ bản ghi mất file gốc, đưa video mất file thuyết minh về original_only,
+        cập nhật dung lượng đã thay đổi và xóa file cũ trong video_data không thuộc bản ghi nào.
+        """
+        start = time.perf_counter()
+        videos = self.store.all()
+        paths = [p for v in videos for p in (v["original_path"], v.get("transformed_path")) if p]
+        with ThreadPoolExecutor(max_workers=STAT_WORKERS) as executor:
+            sizes = dict(zip(paths, executor.map(_stat_size, paths)))
+
+        removed = updated = 0
+        for video in videos:
+            original_size = sizes.get(video["original_path"])
+            if original_size is None:
+                self.store.delete(video["id"])
+                removed += 1
+                continue
+
+            updates = {}
+            if original_size != video["file_size"]:
+                updates["file_size"] = original_size
+            transformed_path = video.get("transformed_path")
+            if transformed_path:
+                transformed_size = sizes.get(transformed_path)
+                if transformed_size is None:
+                    updates.update({"transformed_path": None, "status": "original_only",
+                                    "transformed_size": None, "transformed_time": None})
+                elif transformed_size != video.get("transformed_size"):
+                    updates["transformed_size"] = transformed_size
+            if updates:
+                self.store.update(video["id"], updates)
+                updated += 1
+
+        orphans = 0
+        if remove_orphans:
+            # File vừa tạo có thể đang được worker khác đưa vào (chưa kịp ghi metadata)
+            known = {os.path.abspath(p) for p in paths}
+            cutoff = time.time() - grace_seconds
+            for directory in (self.videos_dir, self.transformed_dir):
+                for entry in os.scandir(directory):
+                    if (entry.is_file() and os.path.abspath(entry.path) not in known
+                            and _last_change(entry.stat()) < cutoff):
+                        os.remove(entry.path)
+                        orphans += 1
+
+        report = {
+            "videos": len(videos) - removed,
+            "removed": removed,
+            "updated": updated,
+            "orphans_removed": orphans,
+            "seconds": time.perf_counter() - start,
+        }
+        if removed or updated or orphans:
+            print(f"Reconciled video store: {report}")
+        return report
 
     def clear_all_data(self):
         """Xóa hết dữ liệu cũ"""
@@ -33,32 +246,40 @@ class VideoManager:
             shutil.rmtree(self.base_dir)
             print(f"Deleted directory: {self.base_dir}")
 
+        root = Path(BASE_DIR)
+
         # Xóa thư mục videos gốc
-        original_videos_dir = Path("videos")
+        original_videos_dir = root / "videos"
         if original_videos_dir.exists():
             shutil.rmtree(original_videos_dir)
             print(f"Deleted directory: {original_videos_dir}")
 
         # Xóa thư mục video_transform gốc
-        original_transform_dir = Path("video_transform")
+        original_transform_dir = root / "video_transform"
         if original_transform_dir.exists():
             shutil.rmtree(original_transform_dir)
             print(f"Deleted directory: {original_transform_dir}")
 
         # Xóa thư mục audio
-        audio_dir = Path("audio")
+        audio_dir = root / "audio"
         if audio_dir.exists():
             shutil.rmtree(audio_dir)
             print(f"Deleted directory: {audio_dir}")
 
         # Xóa thư mục voice_segments
-        voice_segments_dir = Path("voice_segments")
+        voice_segments_dir = root / "voice_segments"
         if voice_segments_dir.exists():
             shutil.rmtree(voice_segments_dir)
             print(f"Deleted directory: {voice_segments_dir}")
 
+        # Xóa thư mục làm việc của các lần chạy pipeline
+        work_dir = root / WORK_DIR
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+            print(f"Deleted directory: {work_dir}")
+
         # Xóa thư mục rag_chatbot
-        rag_chatbot_dir = Path("rag_chatbot")
+        rag_chatbot_dir = root / "rag_chatbot"
         if rag_chatbot_dir.exists():
             shutil.rmtree(rag_chatbot_dir)
             print(f"Deleted directory: {rag_chatbot_dir}")
@@ -69,7 +290,7 @@ class VideoManager:
             print(f"Deleted file: {self.metadata_file}")
 
         # Xóa file voice_segments_metadata.json
-        voice_metadata_file = Path("voice_segments_metadata.json")
+        voice_metadata_file = root / "voice_segments_metadata.json"
         if voice_metadata_file.exists():
             voice_metadata_file.unlink()
             print(f"Deleted file: {voice_metadata_file}")
@@ -77,27 +298,31 @@ class VideoManager:
         print("Finished clearing old data!")
 
     def load_metadata(self):
-        """Load metadata từ file JSON"""
-        if self.metadata_file.exists():
-            try:
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-
-    def save_metadata(self):
-        """Lưu metadata vào file JSON"""
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
-
-    def add_video(self, video_path, youtube_url, title=None, voice=None):
-        """Thêm video gốc vào hệ thống"""
+        """Lấy toàn bộ metadata dạng {video_id: thông tin}"""
+        return {video["id"]: video for video in self.store.all()}
+
+    @property
+    def metadata(self):
+        # Giữ thuộc tính cũ cho code đọc trực tiếp (chỉ đọc)
+        return self.load_metadata()
+
+    def export_metadata(self, path=None):
+        """Xuất metadata ra file JSON (định dạng video_metadata.json cũ)"""
+        path = Path(path or self.metadata_file)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.load_metadata(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def add_video(self, video_path, youtube_url, title=None, voice=None, move=False, extra=None):
+        """Thêm video gốc vào hệ thống (move=True nếu file gốc không cần giữ lại)
+
+        extra: trường bổ sung lưu cùng bản ghi (ví dụ video_key của cache pipeline)
+        """
         if not Path(video_path).exists():
             return None
 
-        # Tạo ID duy nhất cho video
-        video_id = f"video_{int(time.time())}"
+        # Tạo ID duy nhất cho video (ULID: tăng dần, không trùng giữa các worker)
+        video_id = f"video_{new_ulid()}"
 
         # Lấy thông tin file
         file_path = Path(video_path)
@@ -108,11 +333,12 @@ class VideoManager:
         new_filename = f"{video_id}_{file_path.name}"
         new_path = self.videos_dir / new_filename
 
-        # Copy file vào thư mục videos
-        shutil.copy2(video_path, new_path)
+        # Đưa file vào thư mục videos (rename/reflink/hardlink, copy khi cần)
+        self.videos_dir.mkdir(parents=True, exist_ok=True)
+        ingest_method = ingest_file(video_path, new_path, move=move)
 
-        # Lưu metadata
-        self.metadata[video_id] = {
+        # Lưu metadata (insert: không bao giờ ghi đè video khác)
+        self.store.insert({
             "id": video_id,
             "title": title or file_path.stem,
             "youtube_url": youtube_url,
@@ -121,15 +347,16 @@ class VideoManager:
             "created_time": created_time.isoformat(),
             "voice": voice,
             "transformed_path": None,
-            "status": "original_only"
-        }
-
-        self.save_metadata()
+            "status": "original_only",
+            "ingest_method": ingest_method,
+            **(extra or {})
+        })
         return video_id
 
-    def add_transformed_video(self, video_id, transformed_path, voice):
-        """Thêm video đã thuyết minh vào hệ thống"""
-        if video_id not in self.metadata:
+    def add_transformed_video(self, video_id, transformed_path, voice, move=False, extra=None):
+        """Thêm video đã thuyết minh vào hệ thống (move=True nếu là file tạm của pipeline)"""
+        video_info = self.store.get(video_id)
+        if not video_info:
             return False
 
         if not Path(transformed_path).exists():
@@ -143,47 +370,69 @@ class VideoManager:
         new_filename = f"{video_id}_transformed_{voice}_{file_path.name}"
         new_path = self.transformed_dir / new_filename
 
-        # Copy file vào thư mục transformed
-        shutil.copy2(transformed_path, new_path)
-
-        # Cập nhật metadata
-        self.metadata[video_id]["transformed_path"] = str(new_path)
-        self.metadata[video_id]["voice"] = voice
-        self.metadata[video_id]["status"] = "completed"
-        self.metadata[video_id]["transformed_size"] = file_size
-        self.metadata[video_id]["transformed_time"] = datetime.now().isoformat()
+        # Đưa file vào thư mục transformed (rename/reflink/hardlink, copy khi cần)
+        ingest_method = ingest_file(transformed_path, new_path, move=move)
 
-        self.save_metadata()
-        return True
+        # Cập nhật metadata (chỉ các trường thay đổi, trong một transaction)
+        return self.store.update(video_id, {
+            "transformed_path": str(new_path),
+            "voice": voice,
+            "status": "completed",
+            "transformed_size": file_size,
+            "transformed_time": datetime.now().isoformat(),
+            "transformed_ingest_method": ingest_method,
+            **(extra or {})
+        })
+
+    def find_cached_result(self, cache_key):
+        """Video đã thuyết minh với cùng cache key và file còn trên đĩa"""
+        for video in self.store.find_by("cache_key", cache_key, status="completed"):
+            if video.get("transformed_path") and Path(video["transformed_path"]).exists():
+                return video
+        return None
+
+    def find_original(self, video_key):
+        """Bản ghi có file gốc của cùng video (để không phải tải lại)"""
+        for video in self.store.find_by("video_key", video_key):
+            if Path(video["original_path"]).exists():
+                return video
+        return None
+
+    def claim_original(self, video_key, cache_key):
+        """Bản ghi chỉ có file gốc (tải trước hoặc lần chạy trước) để thuyết minh vào với cache_key
+
+        Mỗi bản ghi giữ một video kết quả, nên chỉ một cache key nhận được bản ghi;
+        None nếu không còn bản ghi nào chưa thuyết minh.
+        """
+        for video in self.store.find_by("video_key", video_key, status="original_only"):
+            if Path(video["original_path"]).exists() and \
+                    self.store.claim(video["id"], "cache_key", cache_key, status="original_only"):
+                return video
+        return None
 
     def get_video_info(self, video_id):
         """Lấy thông tin video theo ID"""
-        return self.metadata.get(video_id)
+        return self.store.get(video_id)
 
     def get_all_videos(self):
         """Lấy danh sách tất cả video"""
-        return list(self.metadata.values())
+        return self.store.all()
 
     def get_latest_video(self):
         """Lấy video mới nhất"""
-        if not self.metadata:
-            return None
-
-        # Sắp xếp theo thời gian tạo, lấy video mới nhất
-        latest = max(self.metadata.values(), key=lambda x: x["created_time"])
-        return latest
+        # Lấy theo index created_time, không quét toàn bộ
+        return self.store.latest()
 
     def get_video_by_status(self, status):
         """Lấy video theo trạng thái"""
-        return [v for v in self.metadata.values() if v["status"] == status]
+        return self.store.by_status(status)
 
     def delete_video(self, video_id):
         """Xóa video và metadata"""
-        if video_id not in self.metadata:
+        video_info = self.store.get(video_id)
+        if not video_info:
             return False
 
-        video_info = self.metadata[video_id]
-
         # Xóa file trong hệ thống quản lý
         if video_info["original_path"] and Path(video_info["original_path"]).exists():
             Path(video_info["original_path"]).unlink()
@@ -192,29 +441,27 @@ class VideoManager:
             Path(video_info["transformed_path"]).unlink()
 
         # Xóa metadata
-        del self.metadata[video_id]
-        self.save_metadata()
+        self.store.delete(video_id)
 
         return True
 
     def get_video_paths(self, video_id):
         """Lấy đường dẫn file video gốc và đã thuyết minh"""
-        if video_id not in self.metadata:
+        video_info = self.store.get(video_id)
+        if not video_info:
             return None, None
 
-        video_info = self.metadata[video_id]
         original_path = video_info["original_path"]
         transformed_path = video_info.get("transformed_path")
 
         return original_path, transformed_path
 
     def get_video_bytes(self, video_id, video_type="original"):
-        """Lấy bytes của video để hiển thị trong Streamlit"""
-        if video_id not in self.metadata:
+        """Lấy bytes của video (đọc cả file vào bộ nhớ, giao diện dùng media_server thay thế)"""
+        video_info = self.store.get(video_id)
+        if not video_info:
             return None
 
-        video_info = self.metadata[video_id]
-
         if video_type == "original":
             file_path = video_info["original_path"]
         elif video_type == "transformed":
@@ -233,24 +480,40 @@ class VideoManager:
 
     def get_video_stats(self):
         """Lấy thống kê video"""
-        total_videos = len(self.metadata)
-        completed_videos = len(
-            [v for v in self.metadata.values() if v["status"] == "completed"])
-        original_only = len(
-            [v for v in self.metadata.values() if v["status"] == "original_only"])
-
-        total_size = sum(v["file_size"] for v in self.metadata.values())
-        transformed_size = sum(v.get("transformed_size", 0)
-                               for v in self.metadata.values() if v.get("transformed_size"))
+        stats = self.store.stats()
 
         return {
-            "total_videos": total_videos,
-            "completed_videos": completed_videos,
-            "original_only": original_only,
-            "total_size_mb": total_size / (1024 * 1024),
-            "transformed_size_mb": transformed_size / (1024 * 1024)
+            "total_videos": stats["total_videos"],
+            "completed_videos": stats["completed_videos"],
+            "original_only": stats["original_only"],
+            "total_size_mb": stats["total_size"] / (1024 * 1024),
+            "transformed_size_mb": stats["transformed_size"] / (1024 * 1024),
+            "ingest_methods": stats["ingest_methods"],
+            "bytes_avoided_mb": stats["bytes_avoided"] / (1024 * 1024)
         }
 
 
-# Tạo instance global với clear_on_start=True
-video_manager = VideoManager(clear_on_start=True)
+# Instance global: import không đụng tới đĩa, giao diện gọi startup() khi khởi động
+video_manager = VideoManager(reconcile_on_start=False)
+gc_report = None
+_startup_lock = threading.Lock()
+_started = False
+
+
+def startup():
+    """Khởi động dữ liệu một lần cho tiến trình (Streamlit chạy lại script mỗi lần tương tác)
+
+    VIDEO_MANAGER_CLEAR_ON_START=1 thì xóa sạch như trước, ngược lại giữ dữ liệu cũ, đối chiếu
+    với file trên đĩa và dọn file trung gian hết hạn. Trả về video_manager.startup_report.
+    """
+    global gc_report, _started
+    with _startup_lock:
+        if not _started:
+            _started = True
+            video_manager.startup(clear=CLEAR_ON_START)
+            if not CLEAR_ON_START:
+                gc_report = collect_garbage()
+                if gc_report["files_removed"]:
+                    print(f"Removed {gc_report['files_removed']} expired artifacts "
+                          f"({gc_report['bytes_freed'] / (1024 * 1024):.1f} MB)")
+    return video_manager.startup_report
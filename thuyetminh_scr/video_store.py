@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Lưu metadata video của VideoManager trong SQLite (WAL)
+Mỗi thay đổi chỉ ghi một dòng, truy vấn theo thời gian tạo/trạng thái dùng index
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Các trường có cột riêng, trường khác (nếu có) lưu chung trong cột extra dạng JSON
+COLUMNS = [
+    "id", "title", "youtube_url", "original_path", "file_size", "created_time",
+    "voice", "transformed_path", "status", "transformed_size", "transformed_time",
+]
+
+# Trường chỉ xuất hiện sau khi video được thuyết minh (giữ dạng record như file JSON cũ)
+OPTIONAL_FIELDS = ("transformed_size", "transformed_time")
+
+# Trường trong cột extra có index (tra cứu cache kết quả pipeline)
+INDEXED_EXTRA_FIELDS = ("cache_key", "video_key")
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+class ULIDGenerator:
+    """Sinh ULID: 48 bit thời gian (ms) + 80 bit ngẫu nhiên, 26 ký tự base32
+
+    ID tăng dần theo thời gian (sắp xếp được), phần ngẫu nhiên đủ lớn để nhiều
+    tiến trình sinh cùng lúc không trùng. Trong một tiến trình, các ID cùng một
+    ms được tăng phần ngẫu nhiên để vẫn đơn điệu.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self):
+        ms = time.time_ns() // 1_000_000
+        with self._lock:
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                random_part = self._last_random + 1
+                if random_part >> 80:
+                    ms += 1
+                    random_part = int.from_bytes(os.urandom(10), "big")
+            else:
+                random_part = int.from_bytes(os.urandom(10), "big")
+            self._last_ms, self._last_random = ms, random_part
+
+        value = (ms << 80) | random_part
+        chars = []
+        for _ in range(26):
+            chars.append(_CROCKFORD[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+
+_ulid = ULIDGenerator()
+
+
+def new_ulid():
+    return _ulid.new()
+
+
+class SQLiteVideoStore:
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # Mở kết nối lười để VideoManager có thể xóa thư mục dữ liệu trước khi dùng
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    id TEXT PRIMARY KEY,
+                    title TEXT,
+                    youtube_url TEXT,
+                    original_path TEXT,
+                    file_size INTEGER NOT NULL DEFAULT 0,
+                    created_time TEXT NOT NULL,
+                    voice TEXT,
+                    transformed_path TEXT,
+                    status TEXT NOT NULL,
+                    transformed_size INTEGER,
+                    transformed_time TEXT,
+                    extra TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_created_time ON videos(created_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_status ON videos(status)")
+            for field in INDEXED_EXTRA_FIELDS:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_videos_{field} "
+                             f"ON videos(json_extract(extra, '$.{field}'))")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_info (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def _to_row(record):
+        extra = {k: v for k, v in record.items() if k not in COLUMNS}
+        return [record.get(column) for column in COLUMNS] + [json.dumps(extra, ensure_ascii=False) if extra else None]
+
+    @staticmethod
+    def _to_record(row):
+        record = {column: row[column] for column in COLUMNS}
+        for field in OPTIONAL_FIELDS:
+            if record[field] is None:
+                del record[field]
+        if row["extra"]:
+            record.update(json.loads(row["extra"]))
+        return record
+
+    def insert(self, record):
+        """Thêm video mới, ném sqlite3.IntegrityError nếu ID đã tồn tại (không ghi đè)"""
+        columns = COLUMNS + ["extra"]
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT INTO videos({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                self._to_row(record))
+            conn.commit()
+
+    def update(self, video_id, fields):
+        """Cập nhật một số trường của video trong một transaction ghi
+
+        Chỉ các trường được truyền vào bị thay đổi, nên nhiều tiến trình cùng cập nhật
+        một video không làm mất thay đổi của nhau. Trả về False nếu video không tồn tại.
+        """
+        columns = {k: v for k, v in fields.items() if k in COLUMNS and k != "id"}
+        extra_fields = {k: v for k, v in fields.items() if k not in COLUMNS}
+        with self._lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE lấy khóa ghi của DB ngay từ đầu: đọc-sửa-ghi cột extra
+            # không bị tiến trình khác chen vào
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT extra FROM videos WHERE id = ?", (video_id,)).fetchone()
+                if row is None:
+                    conn.rollback()
+                    return False
+                if extra_fields:
+                    extra = json.loads(row["extra"]) if row["extra"] else {}
+                    extra.update(extra_fields)
+                    columns["extra"] = json.dumps(extra, ensure_ascii=False)
+                if columns:
+                    assignments = ", ".join(f"{column} = ?" for column in columns)
+                    conn.execute(f"UPDATE videos SET {assignments} WHERE id = ?",
+                                 list(columns.values()) + [video_id])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return True
+
+    def upsert(self, record):
+        """Thêm hoặc cập nhật một video"""
+        self.upsert_many([record])
+
+    def upsert_many(self, records):
+        """Thêm hoặc cập nhật nhiều video trong một transaction"""
+        columns = COLUMNS + ["extra"]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                f"INSERT INTO videos({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                [self._to_row(record) for record in records])
+            conn.commit()
+
+    def claim(self, video_id, field, value, status):
+        """Đặt trường extra field = value nếu video còn ở status và trường chưa có (hoặc đã bằng value)
+
+        Kiểm tra và ghi trong cùng một câu lệnh, nên hai tiến trình không cùng nhận một video.
+        """
+        if field not in INDEXED_EXTRA_FIELDS:
+            raise ValueError(f"Field is not indexed: {field}")
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                f"UPDATE videos SET extra = json_set(COALESCE(extra, '{{}}'), '$.{field}', ?) "
+                f"WHERE id = ? AND status = ? AND (json_extract(extra, '$.{field}') IS NULL "
+                f"OR json_extract(extra, '$.{field}') = ?)",
+                (value, video_id, status, value))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def delete(self, video_id):
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute("DELETE FROM videos WHERE id = ?", (video_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def get(self, video_id):
+        records = self._query("SELECT * FROM videos WHERE id = ?", (video_id,))
+        return records[0] if records else None
+
+    def all(self):
+        # rowid giữ thứ tự thêm vào như dict trong file JSON cũ
+        return self._query("SELECT * FROM videos ORDER BY rowid")
+
+    def latest(self):
+        records = self._query("SELECT * FROM videos ORDER BY created_time DESC LIMIT 1")
+        return records[0] if records else None
+
+    def by_status(self, status):
+        return self._query("SELECT * FROM videos WHERE status = ? ORDER BY rowid", (status,))
+
+    def find_by(self, field, value, status=None):
+        """Video có trường extra field = value (thêm sau trước), dùng index biểu thức"""
+        if field not in INDEXED_EXTRA_FIELDS:
+            raise ValueError(f"Field is not indexed: {field}")
+        sql = f"SELECT * FROM videos WHERE json_extract(extra, '$.{field}') = ?"
+        params = [value]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        return self._query(sql + " ORDER BY rowid DESC", params)
+
+    def count(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def stats(self):
+        """Đếm và cộng dung lượng bằng một truy vấn tổng hợp"""
+        with self._lock:
+            row = self._connect().execute("""
+                SELECT COUNT(*) AS total_videos,
+                       COALESCE(SUM(status = 'completed'), 0) AS completed_videos,
+                       COALESCE(SUM(status = 'original_only'), 0) AS original_only,
+                       COALESCE(SUM(file_size), 0) AS total_size,
+                       COALESCE(SUM(transformed_size), 0) AS transformed_size
+                FROM videos
+            """).fetchone()
+            # Cách đưa file vào (ingest_method lưu trong extra), bản ghi cũ coi như copy
+            ingest_rows = self._connect().execute("""
+                SELECT method, COUNT(*) AS files, COALESCE(SUM(size), 0) AS bytes FROM (
+                    SELECT COALESCE(json_extract(extra, '$.ingest_method'), 'copy') AS method,
+                           file_size AS size
+                    FROM videos
+                    UNION ALL
+                    SELECT COALESCE(json_extract(extra, '$.transformed_ingest_method'), 'copy'),
+                           transformed_size
+                    FROM videos WHERE transformed_path IS NOT NULL
+                ) GROUP BY method
+            """).fetchall()
+
+        stats = dict(row)
+        stats["ingest_methods"] = {r["method"]: r["files"] for r in ingest_rows}
+        # Mọi cách trừ copy đều không ghi lại dữ liệu video
+        stats["bytes_avoided"] = sum(r["bytes"] for r in ingest_rows if r["method"] != "copy")
+        return stats
+
+    def migrate_json(self, json_path):
+        """Nhập dữ liệu từ video_metadata.json cũ, chỉ một lần cho mỗi DB (file JSON giữ nguyên)"""
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+
+        with self._lock:
+            done = self._connect().execute(
+                "SELECT value FROM store_info WHERE name = 'json_migrated'").fetchone()
+        if done:
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            records = {}
+
+        self.upsert_many(records.values())
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO store_info(name, value) VALUES ('json_migrated', ?)",
+                         (str(json_path),))
+            conn.commit()
+        return len(records)
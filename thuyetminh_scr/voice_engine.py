@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Engine dịch + TTS chạy song song nhiều segment
+Giới hạn tốc độ theo từng provider, retry với backoff, giữ thứ tự theo index segment
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("VOICE_MAX_WORKERS", "8"))
+
+
+class RateLimiter:
+    """Token bucket: tối đa `rate` lượt gọi mỗi giây, cho phép dồn `burst` lượt"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Chờ tới khi có token"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens +
+                                   (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Giới hạn tốc độ mặc định cho từng provider (lượt/giây)
+RATE_LIMITS = {
+    "google_translate": RateLimiter(float(os.environ.get("GOOGLE_TRANSLATE_RPS", "5"))),
+    "fpt_tts": RateLimiter(float(os.environ.get("FPT_TTS_RPS", "4"))),
+}
+
+
+class PermanentError(Exception):
+    """Lỗi gọi lại cũng không khỏi (API key sai, request bị từ chối): call_with_retry dừng ngay"""
+
+
+def call_with_retry(func, *args, limiter=None, retries=3, backoff=1.0, **kwargs):
+    """Gọi func, retry khi lỗi hoặc kết quả rỗng/False
+
+    Trả về kết quả hợp lệ, hoặc None nếu hết số lần thử hoặc func ném PermanentError
+    """
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+            if result:
+                return result
+            error = "empty result"
+        except PermanentError as e:
+            print(f"{func.__name__} failed, not retrying: {e}")
+            return None
+        except Exception as e:
+            error = e
+
+        if attempt < retries:
+            # Backoff lũy thừa kèm jitter để các luồng không retry cùng lúc
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            print(f"Retry {func.__name__} ({attempt + 1}/{retries}) after {delay:.1f}s: {error}")
+            time.sleep(delay)
+
+    return None
+
+
+def generate_voice_segments_concurrently(segments, voice, translate, synthesize,
+                                         output_dir="voice_segments",
+                                         max_workers=DEFAULT_MAX_WORKERS,
+                                         retries=3, backoff=1.0, index_offset=0,
+                                         progress_callback=None, completed=None, on_segment=None):
+    """Dịch và sinh giọng nói cho các segment song song
+
+    translate(texts) dịch cả list text theo lô và trả về list cùng độ dài (None với
+    đoạn lỗi), synthesize(text, voice=..., output_file=...) trả về True khi thành công.
+    Metadata trả về giữ thứ tự theo index segment. Giới hạn tốc độ (RATE_LIMITS) do
+    client của từng provider áp dụng để request lấy từ cache không phải chờ.
+    index_offset dùng khi segment đến theo từng nhóm (pipeline dạng luồng),
+    progress_callback(done, total) được gọi mỗi khi xong một segment.
+    completed: {index: metadata} các segment đã xong ở lần chạy trước (không dịch/TTS lại),
+    on_segment(metadata) được gọi mỗi khi một segment mới xong (ghi nhật ký để chạy tiếp).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    completed = completed or {}
+    pending = [i for i in range(len(segments)) if i + index_offset not in completed]
+
+    # Dịch theo lô trước: số request tỉ lệ với số lô chứ không phải số segment
+    translations = {}
+    if pending:
+        translations = dict(zip(pending, translate([segments[i]["text"] for i in pending])))
+
+    def process(i, seg):
+        vi_text = translations[i]
+        if vi_text is None:
+            print(f"Translation failed for segment {i + index_offset}, using original text")
+            vi_text = seg["text"]
+        if not vi_text or not vi_text.strip():
+            return None
+
+        index = i + index_offset
+        voice_path = os.path.join(output_dir, f"voice_{index}_{voice}.mp3")
+        ok = call_with_retry(synthesize, vi_text, voice=voice, output_file=voice_path,
+                             retries=retries, backoff=backoff)
+        if not ok:
+            print(f"Failed to generate voice for segment {index}")
+            return None
+
+        return {
+            "index": index,
+            "file": voice_path,
+            "start": seg["start"],
+            "end": seg["end"],
+            "text": vi_text,
+            "voice": voice
+        }
+
+    results = [completed.get(i + index_offset) for i in range(len(segments))]
+    skipped = len(segments) - len(pending)
+    if skipped:
+        print(f"Resuming voice segments: {skipped}/{len(segments)} already done")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process, i, segments[i]): i for i in pending}
+        for done, future in enumerate(tqdm(as_completed(futures), total=len(futures),
+                                           desc=f"Generating voice segments with {voice}"), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                print(f"Error TTS at segment {i}: {e}")
+            if results[i] and on_segment:
+                on_segment(results[i])
+            if progress_callback:
+                progress_callback(skipped + done, len(segments))
+
+    return [item for item in results if item]